@@ -0,0 +1,168 @@
+"""K shortest loopless routes with Yen's algorithm.
+
+Spur searches reuse work in three ways:
+
+- A reverse shortest path tree rooted at the destination gives the exact
+  distance from every airport to it. When the tree path from a spur node
+  avoids the removed nodes and edges it is the spur path and no search runs
+  at all; otherwise it is a consistent A* heuristic for the restricted search.
+- Following Lawler, a path only spawns spur searches from the node where it
+  deviated from its parent onwards; earlier prefixes were already explored.
+- Spur paths are cached by (root prefix, removed edges), so identical spur
+  problems met again are answered from the cache.
+"""
+import heapq
+
+from graph import ShortestPathTree, get_scratch, path_totals
+
+
+def _restricted_search(graph, source, weights, to_target, banned_nodes, banned_edges, target):
+    """A* from ``source`` avoiding ``banned_nodes``/``banned_edges``, guided by exact distances."""
+    scratch = get_scratch(graph)
+    gen = scratch.next_generation()
+    dist = scratch.dist
+    prev = scratch.prev
+    prev_edge = scratch.prev_edge
+    reached = scratch.reached
+    settled = scratch.settled
+
+    offsets = graph.offsets
+    targets = graph.targets
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+    inf = float("inf")
+
+    dist[source] = 0.0
+    reached[source] = gen
+    queue = [(to_target[source], source)]
+    settled_count = 0
+
+    while queue:
+        _, u = heappop(queue)
+        if settled[u] == gen:
+            continue
+        settled[u] = gen
+        settled_count += 1
+        if u == target:
+            break
+
+        current_distance = dist[u]
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            if settled[v] == gen or v in banned_nodes or e in banned_edges or to_target[v] == inf:
+                continue
+            distance = current_distance + weights[e]
+            if reached[v] != gen or distance < dist[v]:
+                reached[v] = gen
+                dist[v] = distance
+                prev[v] = u
+                prev_edge[v] = e
+                heappush(queue, (distance + to_target[v], v))
+
+    if reached[target] != gen:
+        return None, settled_count
+
+    nodes = [target]
+    edges = []
+    node = target
+    while node != source:
+        edges.append(prev_edge[node])
+        node = prev[node]
+        nodes.append(node)
+    nodes.reverse()
+    edges.reverse()
+    return (nodes, edges, dist[target]), settled_count
+
+
+def k_shortest_paths(graph, source, target, metric, k):
+    """Return up to ``k`` loopless routes between two node indices, shortest first.
+
+    Each route is ``(nodes, edges, weight)``. Also returns the number of nodes
+    settled across all searches.
+    """
+    weights = graph.weights[metric]
+    # A reverse tree rooted at the destination gives distances *to* it; on an
+    # undirected graph that is the ordinary one
+    tree = ShortestPathTree(graph, target, metric, reverse=True)
+    tree.settle()
+    to_target = tree.dist
+    settled_count = len(tree.order)
+
+    if not tree.reached(source):
+        return [], settled_count
+
+    def tree_path(node):
+        nodes, _ = tree.path_to(node)
+        nodes.reverse()
+        edges = [graph.edge_index(nodes[i], nodes[i + 1]) for i in range(len(nodes) - 1)]
+        return nodes, edges
+
+    nodes, edges = tree_path(source)
+    found = [(nodes, edges, to_target[source])]
+    # Index where each found route deviates from the route it was spun off
+    deviations = [0]
+    candidates = []
+    seen = {tuple(nodes)}
+    spur_cache = {}
+
+    while len(found) < k:
+        nodes, edges, _ = found[-1]
+        deviation = deviations[-1]
+        root_weight = sum(weights[e] for e in edges[:deviation])
+
+        for i in range(deviation, len(nodes) - 1):
+            if i > deviation:
+                root_weight += weights[edges[i - 1]]
+
+            spur = nodes[i]
+            root = nodes[:i + 1]
+            banned_nodes = set(root[:-1])
+            banned_edges = frozenset(
+                path_edges[i] for path_nodes, path_edges, _ in found
+                if len(path_nodes) > i + 1 and path_nodes[:i + 1] == root
+            )
+
+            key = (tuple(root), banned_edges)
+            if key in spur_cache:
+                spur_path = spur_cache[key]
+            else:
+                # The unrestricted shortest route from the spur node is
+                # optimal whenever it avoids everything that was removed
+                spur_nodes, spur_edges = tree_path(spur)
+                if (spur_edges and spur_edges[0] not in banned_edges
+                        and banned_nodes.isdisjoint(spur_nodes)):
+                    spur_path = (spur_nodes, spur_edges, to_target[spur])
+                else:
+                    spur_path, searched = _restricted_search(
+                        graph, spur, weights, to_target, banned_nodes, banned_edges, target)
+                    settled_count += searched
+                spur_cache[key] = spur_path
+
+            if spur_path is None:
+                continue
+            spur_nodes, spur_edges, spur_weight = spur_path
+            candidate_nodes = root[:-1] + spur_nodes
+            signature = tuple(candidate_nodes)
+            if signature in seen:
+                continue
+            seen.add(signature)
+            heapq.heappush(candidates, (
+                root_weight + spur_weight, len(seen), candidate_nodes, edges[:i] + spur_edges, i))
+
+        if not candidates:
+            break
+        weight, _, candidate_nodes, candidate_edges, deviation = heapq.heappop(candidates)
+        found.append((candidate_nodes, candidate_edges, weight))
+        deviations.append(deviation)
+
+    return found, settled_count
+
+
+def alternative_routes(graph, start, end, metric, k):
+    """Top-``k`` routes between airport IDs as ``(path, cost, distance, time)`` tuples."""
+    routes, settled_count = k_shortest_paths(graph, graph.index[start], graph.index[end], metric, k)
+    results = []
+    for nodes, edges, _ in routes:
+        path = [graph.ids[node] for node in nodes]
+        results.append((path, *path_totals(graph, edges)))
+    return results, settled_count
@@ -0,0 +1,292 @@
+"""Offline network analytics: hub betweenness, route importance and detour factors.
+
+Brandes' algorithm runs one single-source search per airport, counting the
+shortest routes to every other airport and then, walking back from the
+farthest, how many of them pass through each airport and route. The same
+searches give each airport's closeness and the average detour factor of its
+shortest routes: route distance over great-circle distance.
+
+Sources are split into chunks across a process pool. The graph's arrays are
+copied once into shared memory (see search_pool.py), each worker maps them
+read-only, and workers send back only their per-airport and per-route
+totals, so the job scales with the number of cores. ``--sample K`` searches
+from K random airports and scales the totals up, an unbiased estimate of
+betweenness at a fraction of the cost (Brandes and Pich); closeness and
+detour factors are then only given for the sampled airports.
+
+Betweenness is the share of the shortest routes between ordered pairs of
+other airports that pass through an airport, or that use a route. A route
+of an undirected graph is one row covering both directions.
+
+Writes airports.csv and routes.csv, or .parquet files with ``--format
+parquet``, which needs pyarrow (``pip install pyarrow``).
+
+Usage: python analytics.py [--data FILE] [--output-dir DIR] [--metric cost|distance|time]
+                           [--workers N] [--sample K] [--seed N] [--format csv|parquet]
+"""
+import argparse
+import csv
+import heapq
+import logging
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional
+    pyarrow = None
+
+from graph import METRICS
+from reduce_connections import calculate_distance
+from route_table import DATA_DIR, DEFAULT_DATA_FILE, load_graph
+from search_pool import SharedGraph, attach_shared_graph
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT_DIR = os.path.join(DATA_DIR, "analytics")
+
+FORMATS = ("csv", "parquet")
+
+# Chunks of sources per worker; more chunks even out uneven search costs
+CHUNKS_PER_WORKER = 8
+
+
+def single_source(graph, source, metric, node_load, edge_load):
+    """Add one source's dependencies to ``node_load``/``edge_load``.
+
+    Returns ``(reached, total, detour_sum, detour_count)``: airports reached
+    including the source, their summed distance by ``metric`` and the summed
+    detour factors of the routes to them.
+    """
+    n = len(graph)
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights[metric]
+    route_km = graph.weights["distance"]
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+    inf = float("inf")
+
+    dist = [inf] * n
+    # Number of shortest routes to each airport, and the (node, edge) pairs
+    # they arrive over, flattened
+    sigma = [0.0] * n
+    preds = [None] * n
+    km = [0.0] * n
+    settled = bytearray(n)
+    order = []
+
+    dist[source] = 0.0
+    sigma[source] = 1.0
+    preds[source] = []
+    queue = [(0.0, source)]
+    while queue:
+        d, u = heappop(queue)
+        if settled[u]:
+            continue
+        settled[u] = 1
+        order.append(u)
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            distance = d + weights[e]
+            if distance < dist[v]:
+                dist[v] = distance
+                sigma[v] = sigma[u]
+                preds[v] = [u, e]
+                km[v] = km[u] + route_km[e]
+                heappush(queue, (distance, v))
+            elif distance == dist[v]:
+                sigma[v] += sigma[u]
+                preds[v] += (u, e)
+
+    # Dependencies accumulate from the farthest airport back to the source
+    delta = [0.0] * n
+    for w in reversed(order):
+        coefficient = (1.0 + delta[w]) / sigma[w]
+        pred = preds[w]
+        for i in range(0, len(pred), 2):
+            u = pred[i]
+            share = sigma[u] * coefficient
+            edge_load[pred[i + 1]] += share
+            delta[u] += share
+        if w != source:
+            node_load[w] += delta[w]
+
+    lat, lng = graph.lat, graph.lng
+    source_lat, source_lng = lat[source], lng[source]
+    detour_sum = 0.0
+    detour_count = 0
+    for v in order:
+        arc = calculate_distance(source_lat, source_lng, lat[v], lng[v])
+        if arc > 0:
+            detour_sum += km[v] / arc
+            detour_count += 1
+    return len(order), sum(dist[v] for v in order), detour_sum, detour_count
+
+
+def analyse_sources(graph, sources, metric):
+    """Run ``single_source`` for each of ``sources``.
+
+    Returns ``(node_load, edge_load, per_source)`` where ``per_source`` maps
+    each source to its ``single_source`` figures.
+    """
+    node_load = array("d", bytes(8 * len(graph)))
+    edge_load = array("d", bytes(8 * graph.num_edges))
+    per_source = {source: single_source(graph, source, metric, node_load, edge_load) for source in sources}
+    return node_load, edge_load, per_source
+
+
+_worker_graph = None
+
+
+def _init_worker(spec):
+    global _worker_graph
+    _worker_graph = attach_shared_graph(spec)
+
+
+def _analyse_chunk(args):
+    sources, metric = args
+    node_load, edge_load, per_source = analyse_sources(_worker_graph, sources, metric)
+    return node_load.tobytes(), edge_load.tobytes(), per_source
+
+
+def run_analytics(graph, metric="cost", workers=None, sample=None, seed=None):
+    """Betweenness, closeness and detour figures of ``graph``; see ``airport_rows``/``route_rows``.
+
+    Returns ``(node_load, edge_load, per_source, sources)`` with loads
+    scaled up when only ``sample`` sources were searched.
+    """
+    n = len(graph)
+    sources = list(range(n))
+    if sample is not None and sample < n:
+        sources = sorted(random.Random(seed).sample(sources, sample))
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Searching from {len(sources)} of {n} airports by {metric} with {workers} workers")
+
+    if workers == 1:
+        node_load, edge_load, per_source = analyse_sources(graph, sources, metric)
+    else:
+        node_load = array("d", bytes(8 * n))
+        edge_load = array("d", bytes(8 * graph.num_edges))
+        per_source = {}
+        chunk_size = max(1, -(-len(sources) // (workers * CHUNKS_PER_WORKER)))
+        tasks = [(sources[i:i + chunk_size], metric) for i in range(0, len(sources), chunk_size)]
+        shared = SharedGraph(graph)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(shared.spec,)) as pool:
+                for node_bytes, edge_bytes, chunk in pool.map(_analyse_chunk, tasks):
+                    for i, value in enumerate(array("d", node_bytes)):
+                        node_load[i] += value
+                    for e, value in enumerate(array("d", edge_bytes)):
+                        edge_load[e] += value
+                    per_source.update(chunk)
+        finally:
+            shared.retire()
+
+    if len(sources) < n:
+        scale = n / len(sources)
+        node_load = array("d", (value * scale for value in node_load))
+        edge_load = array("d", (value * scale for value in edge_load))
+    return node_load, edge_load, per_source, sources
+
+
+def airport_rows(graph, node_load, per_source):
+    """Columns of the per-airport table."""
+    n = len(graph)
+    pairs = (n - 1) * (n - 2)
+    columns = {name: [] for name in ("id", "lat", "lng", "out_degree", "in_degree", "betweenness",
+                                      "reachable", "closeness", "detour_factor")}
+    for v in range(n):
+        figures = per_source.get(v)
+        reached, total, detour_sum, detour_count = figures if figures is not None else (None,) * 4
+        columns["id"].append(graph.ids[v])
+        columns["lat"].append(graph.lat[v])
+        columns["lng"].append(graph.lng[v])
+        columns["out_degree"].append(graph.offsets[v + 1] - graph.offsets[v])
+        columns["in_degree"].append(graph.rev_offsets[v + 1] - graph.rev_offsets[v])
+        columns["betweenness"].append(node_load[v] / pairs if pairs else 0.0)
+        columns["reachable"].append(reached - 1 if reached is not None else None)
+        # Wasserman and Faust closeness, which allows for unreachable airports
+        closeness = None
+        if reached is not None:
+            closeness = (reached - 1) ** 2 / (total * (n - 1)) if total > 0 else 0.0
+        columns["closeness"].append(closeness)
+        columns["detour_factor"].append(detour_sum / detour_count if detour_count else None)
+    return columns
+
+
+def route_rows(graph, edge_load):
+    """Columns of the per-route table; an undirected route sums its two directions."""
+    n = len(graph)
+    pairs = n * (n - 1)
+    columns = {name: [] for name in ("source", "target", *METRICS, "betweenness")}
+    for u in range(n):
+        for e in range(graph.offsets[u], graph.offsets[u + 1]):
+            v = graph.targets[e]
+            load = edge_load[e]
+            if not graph.directed:
+                if v < u:
+                    continue
+                load += edge_load[graph.edge_index(v, u)]
+            columns["source"].append(graph.ids[u])
+            columns["target"].append(graph.ids[v])
+            for metric in METRICS:
+                columns[metric].append(graph.weights[metric][e])
+            columns["betweenness"].append(load / pairs if pairs else 0.0)
+    return columns
+
+
+def write_table(columns, path, fmt):
+    if fmt == "parquet":
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        writer.writerows(zip(*columns.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute hub and route analytics of the route graph")
+    parser.add_argument("--data", default=DEFAULT_DATA_FILE, help="route data JSON file")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="directory to write the tables to")
+    parser.add_argument("--metric", choices=METRICS, default="cost", help="weight shortest routes minimise")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--sample", type=int, default=None, help="search from this many random airports only")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for --sample")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.format == "parquet" and pyarrow is None:
+        print("Error: --format parquet needs pyarrow (pip install pyarrow)")
+        return
+
+    graph = load_graph(args.data)
+    start = time.perf_counter()
+    node_load, edge_load, per_source, sources = run_analytics(
+        graph, args.metric, workers=args.workers, sample=args.sample, seed=args.seed)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    airports = airport_rows(graph, node_load, per_source)
+    routes = route_rows(graph, edge_load)
+    for name, columns in (("airports", airports), ("routes", routes)):
+        write_table(columns, os.path.join(args.output_dir, f"{name}.{args.format}"), args.format)
+
+    print(f"Searched from {len(sources)} of {len(graph)} airports in {elapsed:.1f}s; "
+          f"wrote {len(airports['id'])} airports and {len(routes['source'])} routes to {args.output_dir}")
+    hubs = sorted(range(len(graph)), key=airports["betweenness"].__getitem__, reverse=True)[:10]
+    print("Top hubs: " + ", ".join(f"{graph.ids[v]} ({airports['betweenness'][v]:.3f})" for v in hubs))
+    detours = [factor for factor in airports["detour_factor"] if factor is not None]
+    if detours:
+        print(f"Mean detour factor: {sum(detours) / len(detours):.3f}")
+
+
+if __name__ == "__main__":
+    main()
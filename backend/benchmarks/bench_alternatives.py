@@ -0,0 +1,106 @@
+"""Benchmark Yen's k shortest paths: naive restarts versus shared spur work.
+
+Usage: python -m benchmarks.bench_alternatives [--size 5000] [--k 5 20] [--queries 20]
+"""
+import argparse
+import heapq
+import random
+import time
+
+from alternatives import k_shortest_paths
+from benchmarks.synthetic import generate_network
+from graph import Graph
+
+
+def _restricted_dijkstra(graph, source, target, weights, banned_nodes, banned_edges):
+    dist = {source: 0.0}
+    prev = {}
+    queue = [(0.0, source)]
+    done = set()
+    settled = 0
+    while queue:
+        distance, u = heapq.heappop(queue)
+        if u in done:
+            continue
+        done.add(u)
+        settled += 1
+        if u == target:
+            break
+        for e in graph.neighbors(u):
+            v = graph.targets[e]
+            if v in banned_nodes or e in banned_edges:
+                continue
+            candidate = distance + weights[e]
+            if candidate < dist.get(v, float("inf")):
+                dist[v] = candidate
+                prev[v] = (u, e)
+                heapq.heappush(queue, (candidate, v))
+    if target not in done:
+        return None, settled
+    nodes = [target]
+    edges = []
+    while nodes[-1] != source:
+        u, e = prev[nodes[-1]]
+        edges.append(e)
+        nodes.append(u)
+    return (nodes[::-1], edges[::-1], dist[target]), settled
+
+
+def naive_yen(graph, source, target, metric, k):
+    """Textbook Yen: a fresh Dijkstra for every spur node of every path."""
+    weights = graph.weights[metric]
+    first, settled = _restricted_dijkstra(graph, source, target, weights, set(), set())
+    if first is None:
+        return [], settled
+    found = [first]
+    candidates = []
+    seen = {tuple(first[0])}
+    while len(found) < k:
+        nodes, edges, _ = found[-1]
+        for i in range(len(nodes) - 1):
+            root = nodes[:i + 1]
+            banned_edges = {p[1][i] for p in found if len(p[0]) > i + 1 and p[0][:i + 1] == root}
+            spur, spur_settled = _restricted_dijkstra(
+                graph, nodes[i], target, weights, set(root[:-1]), banned_edges)
+            settled += spur_settled
+            if spur is None:
+                continue
+            candidate = root[:-1] + spur[0]
+            if tuple(candidate) in seen:
+                continue
+            seen.add(tuple(candidate))
+            weight = sum(weights[e] for e in edges[:i]) + spur[2]
+            heapq.heappush(candidates, (weight, len(seen), candidate, edges[:i] + spur[1]))
+        if not candidates:
+            break
+        weight, _, candidate, candidate_edges = heapq.heappop(candidates)
+        found.append((candidate, candidate_edges, weight))
+    return found, settled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 20])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = generate_network(args.size, seed=args.seed)
+    graph = Graph.from_routes(data["airports"], data["routes"])
+    rng = random.Random(args.seed)
+    pairs = [(rng.randrange(args.size), rng.randrange(args.size)) for _ in range(args.queries)]
+
+    print(f"{'k':>4} {'implementation':>14} {'settled':>10} {'ms/query':>10}")
+    for k in args.k:
+        for name, search in (("naive", naive_yen), ("shared", k_shortest_paths)):
+            settled = 0
+            start = time.perf_counter()
+            for source, target in pairs:
+                settled += search(graph, source, target, "cost", k)[1]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"{k:>4} {name:>14} {settled / len(pairs):>10.0f} {elapsed_ms / len(pairs):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark the analytics job: scaling with workers and accuracy of sampling.
+
+For each size the exact job is timed with a growing number of worker
+processes, reporting the speedup over one worker. Sampled runs are then
+compared with the exact betweenness by the overlap of their top hubs.
+
+Usage: python -m benchmarks.bench_analytics [--sizes 1000 3000] [--workers 1 2 4] [--samples 100 300]
+"""
+import argparse
+import os
+import time
+
+from analytics import run_analytics
+from benchmarks.synthetic import generate_network
+from graph import Graph
+
+# Hubs compared between sampled and exact betweenness
+TOP_HUBS = 20
+
+
+def top_hubs(node_load):
+    return set(sorted(range(len(node_load)), key=node_load.__getitem__, reverse=True)[:TOP_HUBS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 3000])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--samples", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--metric", default="cost")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'run':<16} {'seconds':>8} {'speedup':>8} {f'top {TOP_HUBS} overlap':>15}")
+    for size in args.sizes:
+        network = generate_network(size, seed=args.seed)
+        graph = Graph.from_routes(network["airports"], network["routes"])
+
+        exact = None
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            node_load = run_analytics(graph, args.metric, workers=workers)[0]
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = elapsed
+                exact = top_hubs(node_load)
+            print(f"{size:>8} {f'{workers} workers':<16} {elapsed:>8.2f} {baseline / elapsed:>8.2f} {'':>15}")
+
+        for sample in args.samples:
+            if sample >= size:
+                continue
+            start = time.perf_counter()
+            node_load = run_analytics(graph, args.metric, workers=args.workers[-1], sample=sample,
+                                      seed=args.seed)[0]
+            elapsed = time.perf_counter() - start
+            overlap = len(top_hubs(node_load) & exact) / TOP_HUBS
+            print(f"{size:>8} {f'sample {sample}':<16} {elapsed:>8.2f} {baseline / elapsed:>8.2f} {overlap:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
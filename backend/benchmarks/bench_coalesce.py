@@ -0,0 +1,98 @@
+"""Benchmark /find-path under bursts of identical requests, with and without coalescing.
+
+The app is loaded on a synthetic network with the result cache off and
+driven in-process. ``burst`` sends the same route ``--burst`` times at once
+before moving to the next route, as when a popular search is shared;
+``unique`` never repeats a route, so coalescing can only add overhead. Each
+runs once with concurrent identical searches shared and once with every
+request searching on its own, reporting the searches run, throughput and
+latency percentiles.
+
+Usage: python -m benchmarks.bench_coalesce [--size 2000] [--requests 960] [--burst 16]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import tempfile
+
+from benchmarks import report
+from benchmarks.load import run_load, running
+from benchmarks.synthetic import generate_network
+
+
+class Uncoalesced:
+    """Stands in for ``SingleFlight``, running every call on its own."""
+
+    async def do(self, key, fn):
+        return await fn(), False
+
+    def stats(self):
+        return {"in_flight": 0, "started": 0, "coalesced": 0}
+
+
+async def run(data_file, tmp, args):
+    os.environ.update({
+        "DATA_FILE": data_file,
+        "SNAPSHOT_FILE": "",
+        "ROUTE_TABLE_FILE": os.path.join(tmp, "route_table.bin"),
+        "HIERARCHY_FILE": os.path.join(tmp, "contraction.bin"),
+        "ROUTE_CACHE_SIZE": "0",
+        "RATE_LIMIT": "0",
+        "SEARCH_QUEUE_SIZE": str(max(64, args.burst * 4)),
+    })
+    main = importlib.import_module("main")
+    logging.getLogger().setLevel(logging.WARNING)
+    from graph import search_counters
+
+    rng = random.Random(args.seed)
+    pairs = [rng.sample(main.snapshots.current.graph.ids, 2) for _ in range(args.requests)]
+
+    def find_path(route):
+        def make_request(i):
+            source, destination = pairs[route(i)]
+            return "POST", "/find-path", {"source": source, "destination": destination, "metric": "cost"}, ()
+        return make_request
+
+    scenarios = {"burst": find_path(lambda i: i // args.burst), "unique": find_path(lambda i: i)}
+    single_flight = main.in_flight
+    rows = []
+    async with running(main.app) as app:
+        for name, make_request in scenarios.items():
+            for coalesce in (True, False):
+                main.in_flight = single_flight if coalesce else Uncoalesced()
+                before = search_counters.totals()["searches"]
+                samples, elapsed, errors = await run_load(app, make_request, args.requests, args.burst)
+                searches = search_counters.totals()["searches"] - before
+                rows.append((name, coalesce, searches, errors, report.summarize(samples, elapsed)))
+    main.in_flight = single_flight
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000, help="airports in the synthetic network")
+    parser.add_argument("--requests", type=int, default=960, help="requests per run")
+    parser.add_argument("--burst", type=int, default=16, help="identical requests sent at once, and the concurrency")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    network = generate_network(args.size, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "data.json")
+        with open(data_file, "w") as f:
+            json.dump(network, f)
+        rows = asyncio.run(run(data_file, tmp, args))
+
+    print(f"{'scenario':<10} {'coalesce':<9} {'searches':>9} {'errors':>7} {'ops/s':>10} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, coalesce, searches, errors, summary in rows:
+        print(f"{name:<10} {'on' if coalesce else 'off':<9} {searches:>9} {errors:>7} {summary['throughput']:>10.1f} "
+              f"{summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Contraction Hierarchies: preprocessing cost and query speed against Dijkstra.
+
+Every CH answer is checked against Dijkstra's path weight.
+
+Usage: python -m benchmarks.bench_contraction [--sizes 500 2000] [--queries 200]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_network
+from contraction import CORE_DEGREE, ContractionHierarchy, build_hierarchy
+from graph import METRICS, Graph
+from search import STRATEGIES
+
+
+def run(size, queries, seed, core_degree, workers):
+    data = generate_network(size, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "data.json")
+        hierarchy_file = os.path.join(tmp, "contraction.bin")
+        with open(data_file, "w") as f:
+            json.dump(data, f)
+
+        start = time.perf_counter()
+        build_hierarchy(data_file, hierarchy_file, workers=workers, force=True, core_degree=core_degree)
+        build_s = time.perf_counter() - start
+        file_kb = os.path.getsize(hierarchy_file) / 1024
+        print(f"{size:>8} {'(build)':>9} {'all metrics':>14} {build_s:>10.1f}s {file_kb:>10.0f} KiB")
+
+        graph = Graph.from_routes(data["airports"], data["routes"])
+        graph.derived["contraction"] = ContractionHierarchy(hierarchy_file)
+        rng = random.Random(seed)
+        pairs = [(rng.randrange(size), rng.randrange(size)) for _ in range(queries)]
+
+        for metric in METRICS:
+            weights = graph.weights[metric]
+            answers = {}
+            for name in ("dijkstra", "bidirectional", "ch"):
+                search = STRATEGIES[name]
+                settled = 0
+                results = []
+                start = time.perf_counter()
+                for source, target in pairs:
+                    nodes, edges, count = search(graph, source, target, metric)
+                    settled += count
+                    results.append(sum(weights[e] for e in edges) if nodes else None)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                answers[name] = results
+                print(f"{size:>8} {metric:>9} {name:>14} {settled / queries:>12.0f} {elapsed_ms / queries:>10.3f}")
+
+            mismatches = sum(
+                1 for a, b in zip(answers["dijkstra"], answers["ch"])
+                if (a is None) != (b is None) or (a is not None and abs(a - b) > 1e-6 * max(1.0, a))
+            )
+            if mismatches:
+                print(f"{size:>8} {metric:>9} {mismatches} CH answers differ from Dijkstra")
+        del graph.derived["contraction"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--core-degree", type=float, default=CORE_DEGREE)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'metric':>9} {'strategy':>14} {'settled':>12} {'ms/query':>10}")
+    for size in args.sizes:
+        run(size, args.queries, args.seed, args.core_degree, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compare peak memory and run time of ingest.py against loading the whole dump.
+
+Raw dumps of growing size are written to a temporary directory, as a JSON
+array and as NDJSON, and each run happens in a fresh process so its peak
+resident set size can be read back. The "load all" row does what
+extract_airports.py does: ``json.load`` the dump and write the routes back
+out with ``indent=2``.
+
+Usage: python -m benchmarks.bench_ingest [--records 100000 1000000] [--airports 2000]
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import LAT_RANGE, LNG_RANGE
+
+# Each child reports its own run time and peak RSS (KiB, Linux only) on stdout
+CHILD = """
+import json, sys, time
+
+def peak_rss():
+    # ru_maxrss survives exec and would report the parent's peak; VmHWM does not
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+
+start = time.perf_counter()
+{body}
+print(time.perf_counter() - start, peak_rss())
+"""
+
+LOAD_ALL = """
+with open(sys.argv[1]) as f:
+    data = json.load(f)
+airports = {}
+routes = []
+for record in data:
+    airports.setdefault(record['origin_airport'], record['origin_state'])
+    airports.setdefault(record['destination_airport'], record['destination_state'])
+    routes.append({'source': record['origin_airport'], 'target': record['destination_airport'],
+                   'distance': record['distance_km'], 'cost': record['flight_price_inr'],
+                   'direct': record['direct_flight'] == 'Yes'})
+with open(sys.argv[2], 'w') as f:
+    json.dump({'airports': list(airports), 'routes': routes}, f, indent=2)
+"""
+
+INGEST = """
+import ingest
+ingest.ingest(sys.argv[1], sys.argv[2], reduce_network=len(sys.argv) > 3)
+"""
+
+
+def raw_records(count, num_airports, seed):
+    """Yield raw dump records between random synthetic airports."""
+    rng = random.Random(seed)
+    airports = [(f"S{i}", round(rng.uniform(*LAT_RANGE), 4), round(rng.uniform(*LNG_RANGE), 4))
+                for i in range(num_airports)]
+    for i in range(count):
+        (origin, origin_lat, origin_lng), (destination, destination_lat, destination_lng) = rng.sample(airports, 2)
+        departure = rng.randrange(24 * 60)
+        yield {
+            "origin_airport": origin, "origin_state": "Synthetic",
+            "origin_lat": origin_lat, "origin_lng": origin_lng,
+            "destination_airport": destination, "destination_state": "Synthetic",
+            "destination_lat": destination_lat, "destination_lng": destination_lng,
+            "distance_km": round(rng.uniform(100, 2500), 1),
+            "direct_flight": "Yes",
+            "flight_price_inr": rng.randrange(2000, 20000),
+            "flight_number": f"SX{i % 9000 + 1000}",
+            "departure_time": f"{departure // 60:02d}:{departure % 60:02d}",
+            "arrival_time": f"{(departure + 90) // 60 % 24:02d}:{(departure + 90) % 60:02d}",
+        }
+
+
+def write_dumps(directory, count, num_airports, seed):
+    """Write the same records as a pretty-printed JSON array and as NDJSON."""
+    array_file = os.path.join(directory, f"raw_{count}.json")
+    ndjson_file = os.path.join(directory, f"raw_{count}.ndjson")
+    with open(array_file, "w") as array, open(ndjson_file, "w") as ndjson:
+        array.write("[\n")
+        for i, record in enumerate(raw_records(count, num_airports, seed)):
+            array.write((",\n" if i else "") + json.dumps(record, indent=2))
+            ndjson.write(json.dumps(record) + "\n")
+        array.write("\n]\n")
+    return array_file, ndjson_file
+
+
+def measure(body, *args):
+    """``(seconds, peak MiB)`` of running ``body`` in a fresh interpreter."""
+    output = subprocess.run([sys.executable, "-c", CHILD.format(body=body), *args],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[-2]), int(output[-1]) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--airports", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-load-all", action="store_true", help="skip the json.load baseline")
+    args = parser.parse_args()
+
+    print(f"{'records':>9} {'dump MiB':>9} {'run':>20} {'seconds':>8} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "out.json")
+        for count in args.records:
+            array_file, ndjson_file = write_dumps(tmp, count, args.airports, args.seed)
+            size = os.path.getsize(array_file) / (1 << 20)
+            runs = [
+                ("ingest array", INGEST, array_file, output),
+                ("ingest ndjson", INGEST, ndjson_file, output),
+                ("ingest --reduce", INGEST, ndjson_file, output, "reduce"),
+            ]
+            if not args.skip_load_all:
+                runs.insert(0, ("load all", LOAD_ALL, array_file, output))
+            for name, body, *run_args in runs:
+                seconds, peak = measure(body, *run_args)
+                print(f"{count:>9} {size:>9.0f} {name:>20} {seconds:>8.1f} {peak:>9.0f}")
+            os.remove(array_file)
+            os.remove(ndjson_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare chained per-leg Dijkstra against shared-tree multi-stop routing.
+
+Usage: python -m benchmarks.bench_layovers [--sizes 1000 5000] [--queries 200]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import generate_network
+from graph import Graph, dijkstra, route_via
+
+
+def chained(graph, waypoints, metric):
+    """The previous implementation: one independent Dijkstra per leg."""
+    path = [waypoints[0]]
+    total_cost = total_distance = total_time = 0
+    for leg_source, leg_target in zip(waypoints, waypoints[1:]):
+        leg_path, cost, distance, flight_time = dijkstra(graph, leg_source, leg_target, metric)
+        if not leg_path:
+            return [], 0, 0, 0
+        path.extend(leg_path[1:])
+        total_cost += cost
+        total_distance += distance
+        total_time += flight_time
+    return path, total_cost, total_distance, total_time
+
+
+def run(size, queries, seed):
+    data = generate_network(size, seed=seed)
+    graph = Graph.from_routes(data["airports"], data["routes"])
+    rng = random.Random(seed)
+    itineraries = [
+        [rng.choice(graph.ids) for _ in range(rng.randint(3, 5) + 2)]
+        for _ in range(queries)
+    ]
+
+    for stops in (3, 4, 5):
+        batch = [w for w in itineraries if len(w) == stops + 2]
+        if not batch:
+            continue
+
+        start = time.perf_counter()
+        for waypoints in batch:
+            chained(graph, waypoints, "cost")
+        chained_ms = (time.perf_counter() - start) * 1000 / len(batch)
+
+        start = time.perf_counter()
+        for waypoints in batch:
+            route_via(graph, waypoints, "cost")
+        shared_ms = (time.perf_counter() - start) * 1000 / len(batch)
+
+        print(f"{size:>7} {stops:>5} {len(batch):>7} {chained_ms:>12.2f} {shared_ms:>12.2f} "
+              f"{chained_ms / shared_ms:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>7} {'stops':>5} {'queries':>7} {'chained ms':>12} {'shared ms':>12} {'speedup':>9}")
+    for size in args.sizes:
+        run(size, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark the memory held per edge by each graph layout.
+
+Synthetic networks are made directed by adding the reverse of every route
+with its own fare, which doubles the route records. Each layout is built
+from the same records and measured with tracemalloc, counting everything it
+keeps alive:
+
+- ``dict-of-dicts``: the original ``graph[source][target] = {metric: weight}``.
+- ``csr undirected``: ``Graph.from_routes`` on the one-way records.
+- ``csr directed``: ``Graph.from_routes(..., directed=True)`` on both
+  directions, with the reverse CSR.
+- ``csr directed + rev``: the same after the backward searches have built
+  the reverse-order weights of one metric.
+
+Usage: python -m benchmarks.bench_memory [--sizes 1000 10000 50000]
+"""
+import argparse
+import random
+import tracemalloc
+
+from benchmarks.synthetic import generate_network, route_cost
+from graph import AVERAGE_SPEED_KMH, Graph, reverse_weights
+
+
+def dict_of_dicts(airports, routes):
+    """The graph as main.py built it before the CSR layout."""
+    graph = {airport["id"]: {} for airport in airports}
+    for route in routes:
+        weights = {"distance": route["distance"], "cost": route["cost"],
+                   "time": route["distance"] / AVERAGE_SPEED_KMH}
+        graph[route["source"]][route["target"]] = weights
+        graph[route["target"]][route["source"]] = dict(weights)
+    return graph
+
+
+def reversed_routes(routes, rng):
+    """Both directions of every route, each priced on its own."""
+    directed = list(routes)
+    for route in routes:
+        directed.append({**route, "source": route["target"], "target": route["source"],
+                         "cost": route_cost(route["distance"], rng)})
+    return directed
+
+
+def retained(build):
+    """Bytes still allocated once ``build()`` returns, and the object it built."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        built = build()
+        return tracemalloc.get_traced_memory()[0] - before, built
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'layout':<20} {'edges':>8} {'MB':>8} {'bytes/edge':>11}")
+    for size in args.sizes:
+        network = generate_network(size, seed=args.seed)
+        airports, routes = network["airports"], network["routes"]
+        directed = reversed_routes(routes, random.Random(args.seed))
+        # Keep one-off allocations of the first build out of the figures
+        Graph.from_routes(airports, routes)
+
+        def directed_with_reverse_weights():
+            graph = Graph.from_routes(airports, directed, directed=True)
+            reverse_weights(graph, "cost")
+            return graph
+
+        layouts = [
+            ("dict-of-dicts", lambda: dict_of_dicts(airports, routes),
+             lambda graph: sum(len(edges) for edges in graph.values())),
+            ("csr undirected", lambda: Graph.from_routes(airports, routes), Graph.num_edges.fget),
+            ("csr directed", lambda: Graph.from_routes(airports, directed, directed=True),
+             Graph.num_edges.fget),
+            ("csr directed + rev", directed_with_reverse_weights, Graph.num_edges.fget),
+        ]
+        for name, build, count_edges in layouts:
+            nbytes, graph = retained(build)
+            edges = count_edges(graph)
+            print(f"{size:>8} {name:<20} {edges:>8} {nbytes / 1e6:>8.2f} {nbytes / max(edges, 1):>11.1f}")
+            del graph
+
+
+if __name__ == "__main__":
+    main()
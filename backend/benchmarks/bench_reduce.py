@@ -0,0 +1,77 @@
+"""Benchmark reduce_connections.py on synthetic networks of growing size.
+
+Nearest neighbours from the grid search are checked against a brute-force
+distance matrix on the smaller inputs, and the old approach of sorting every
+airport's scalar ``calculate_distance`` list is timed where it is still
+feasible. The connected components of each reduced network are counted;
+there should be one.
+
+Usage: python -m benchmarks.bench_reduce [--sizes 1000 10000 50000] [--workers 4]
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import generate_network
+from graph import Graph, connected_components
+from reduce_connections import calculate_distance, haversine, nearest_neighbours, reduce_network, CANDIDATES
+
+# Largest input checked against brute force and timed with the scalar approach
+BRUTE_FORCE_LIMIT = 3000
+
+
+def scalar_nearest(airports):
+    """The old way: every airport sorts its distances to every other airport."""
+    for airport in airports:
+        distances = [(other["id"], calculate_distance(airport["lat"], airport["lng"], other["lat"], other["lng"]))
+                     for other in airports if other is not airport]
+        distances.sort(key=lambda x: x[1])
+
+
+def check_neighbours(lat, lng, indices):
+    """Count rows whose neighbour distances differ from a brute-force search."""
+    matrix = haversine(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+    np.fill_diagonal(matrix, np.inf)
+    expected = np.sort(matrix, axis=1)[:, :indices.shape[1]]
+    found = np.take_along_axis(matrix, indices, axis=1)
+    return int((~np.isclose(found, expected)).any(axis=1).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'routes in':>10} {'routes out':>11} {'neighbours s':>13} {'reduce s':>9} "
+          f"{'scalar s':>9} {'mismatches':>11} {'components':>11}")
+    for size in args.sizes:
+        data = generate_network(size, seed=args.seed)
+        airports, routes = data["airports"], data["routes"]
+        lat = np.array([airport["lat"] for airport in airports])
+        lng = np.array([airport["lng"] for airport in airports])
+
+        start = time.perf_counter()
+        indices, _ = nearest_neighbours(lat, lng, CANDIDATES, args.workers)
+        neighbours_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new_routes, _ = reduce_network(airports, routes, seed=args.seed, workers=args.workers)
+        reduce_s = time.perf_counter() - start
+
+        scalar = mismatches = "-"
+        if size <= BRUTE_FORCE_LIMIT:
+            mismatches = check_neighbours(lat, lng, indices)
+            start = time.perf_counter()
+            scalar_nearest(airports)
+            scalar = f"{time.perf_counter() - start:.2f}"
+        components = len(connected_components(Graph.from_routes(airports, new_routes)))
+        print(f"{size:>8} {len(routes):>10} {len(new_routes):>11} {neighbours_s:>13.2f} {reduce_s:>9.2f} "
+              f"{scalar:>9} {mismatches:>11} {components:>11}")
+
+
+if __name__ == "__main__":
+    main()
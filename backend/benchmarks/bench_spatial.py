@@ -0,0 +1,71 @@
+"""Benchmark the airport spatial index against a linear scan.
+
+Random airports are drawn over the synthetic network's area. For each size
+the KD-tree build is timed, then nearest-airport and radius lookups, with a
+linear scan of ``calculate_distance`` for comparison. Lookups are checked
+against the scan.
+
+Usage: python -m benchmarks.bench_spatial [--sizes 1000 10000 100000] [--queries 1000]
+"""
+import argparse
+import random
+import time
+from array import array
+
+from benchmarks.synthetic import LAT_RANGE, LNG_RANGE, percentile
+from reduce_connections import calculate_distance
+from spatial import AirportIndex
+
+# Queries checked against, and timed with, the linear scan
+SCAN_QUERIES = 20
+
+
+def linear_scan(lat, lng, point):
+    """Every airport as ``(distance_km, node)``, nearest first."""
+    return sorted((calculate_distance(point[0], point[1], lat[i], lng[i]), i) for i in range(len(lat)))
+
+
+def timed_us(lookup, points):
+    samples = []
+    for point in points:
+        start = time.perf_counter()
+        lookup(point)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return percentile(samples, 0.5), percentile(samples, 0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'build s':>8} {'lookup':<16} {'p50 us':>9} {'p99 us':>9} {'scan p50 us':>12} {'mismatches':>11}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        lat = array("d", (rng.uniform(*LAT_RANGE) for _ in range(size)))
+        lng = array("d", (rng.uniform(*LNG_RANGE) for _ in range(size)))
+        points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(args.queries)]
+
+        start = time.perf_counter()
+        index = AirportIndex(lat, lng)
+        build_s = time.perf_counter() - start
+
+        scans = [linear_scan(lat, lng, point) for point in points[:SCAN_QUERIES]]
+        scan_p50, _ = timed_us(lambda point: linear_scan(lat, lng, point), points[:SCAN_QUERIES])
+        lookups = {
+            "nearest k=1": (lambda p: index.nearest(*p, 1), lambda scan: scan[:1]),
+            "nearest k=10": (lambda p: index.nearest(*p, 10), lambda scan: scan[:10]),
+            "within 50 km": (lambda p: index.within(*p, 50), lambda scan: [m for m in scan if m[0] <= 50]),
+            "within 200 km": (lambda p: index.within(*p, 200), lambda scan: [m for m in scan if m[0] <= 200]),
+        }
+        for name, (lookup, expected) in lookups.items():
+            p50, p99 = timed_us(lookup, points)
+            mismatches = sum([node for _, node in lookup(point)] != [node for _, node in expected(scan)]
+                             for point, scan in zip(points, scans))
+            print(f"{size:>8} {build_s:>8.3f} {name:<16} {p50:>9.1f} {p99:>9.1f} {scan_p50:>12.0f} {mismatches:>11}")
+
+
+if __name__ == "__main__":
+    main()
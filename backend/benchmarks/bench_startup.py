@@ -0,0 +1,73 @@
+"""Compare server data loading from the JSON data file and from its binary snapshot.
+
+Each load runs in a fresh process, as at server startup, and is followed by
+one route search so the cost of touching the mapped pages is counted too.
+"binary" still hashes the JSON file to check the snapshot is current;
+"binary only" is a deployment shipping just the snapshot.
+
+Usage: python -m benchmarks.bench_startup [--sizes 1000 10000 100000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import generate_network
+from binary_snapshot import write_snapshot
+
+CHILD = """
+import sys, time
+from graph import dijkstra
+from snapshot import load_snapshot
+
+def peak_rss():
+    # ru_maxrss survives exec and would report the parent's peak; VmHWM does not
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+
+start = time.perf_counter()
+snapshot = load_snapshot(sys.argv[1], snapshot_file=sys.argv[2] if len(sys.argv) > 2 else None)
+loaded = time.perf_counter()
+graph = snapshot.graph
+dijkstra(graph, graph.ids[0], graph.ids[-1], "cost")
+print(loaded - start, time.perf_counter() - loaded, peak_rss())
+"""
+
+
+def measure(*args):
+    """``(load seconds, first search seconds, peak MiB)`` in a fresh interpreter."""
+    output = subprocess.run([sys.executable, "-c", CHILD, *args],
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[-3]), float(output[-2]), int(output[-1]) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3, help="loads per format; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'format':>12} {'file MiB':>9} {'load ms':>9} {'1st search ms':>14} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            data_file = os.path.join(tmp, f"data_{size}.json")
+            snapshot_file = os.path.join(tmp, f"data_{size}.snap")
+            with open(data_file, "w") as f:
+                json.dump(generate_network(size, seed=args.seed), f)
+            write_snapshot(data_file, snapshot_file)
+            missing_file = os.path.join(tmp, "missing.json")
+
+            runs = [("json", os.path.getsize(data_file), (data_file,)),
+                    ("binary", os.path.getsize(snapshot_file), (data_file, snapshot_file)),
+                    ("binary only", os.path.getsize(snapshot_file), (missing_file, snapshot_file))]
+            for name, file_bytes, run_args in runs:
+                load, search, peak = min(measure(*run_args) for _ in range(args.repeat))
+                print(f"{size:>8} {name:>12} {file_bytes / (1 << 20):>9.1f} {load * 1000:>9.1f} "
+                      f"{search * 1000:>14.1f} {peak:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Compare nodes settled and latency of the search strategies.
+
+Usage: python -m benchmarks.bench_strategies [--sizes 1000 10000] [--queries 200]
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import generate_network
+from graph import Graph
+from search import ASTAR_METRICS, STRATEGIES, landmarks
+
+
+def run(size, queries, seed):
+    data = generate_network(size, seed=seed)
+    graph = Graph.from_routes(data["airports"], data["routes"])
+    rng = random.Random(seed)
+    pairs = [(rng.randrange(size), rng.randrange(size)) for _ in range(queries)]
+
+    for metric in ("distance", "cost"):
+        # Landmark selection is a one-off preprocessing cost; keep it out of the timings
+        start = time.perf_counter()
+        landmarks(graph, metric)
+        preprocess_ms = (time.perf_counter() - start) * 1000
+        print(f"{size:>8} {metric:>9} {'(alt landmarks)':>14} {'':>12} {preprocess_ms:>10.1f}")
+
+        for name, search in STRATEGIES.items():
+            if name == "astar" and metric not in ASTAR_METRICS:
+                continue
+            if name == "ch":
+                # Needs a contraction hierarchy; see bench_contraction
+                continue
+            settled = 0
+            start = time.perf_counter()
+            for source, target in pairs:
+                settled += search(graph, source, target, metric)[2]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"{size:>8} {metric:>9} {name:>14} {settled / queries:>12.0f} {elapsed_ms / queries:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'airports':>8} {'metric':>9} {'strategy':>14} {'settled':>12} {'ms/query':>10}")
+    for size in args.sizes:
+        run(size, args.queries, args.seed)
+
+
+if __name__ == "__main__":
+    main()
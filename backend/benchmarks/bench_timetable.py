@@ -0,0 +1,143 @@
+"""Benchmark earliest-arrival queries: time-expanded and time-dependent Dijkstra versus Connection Scan.
+
+Usage: python -m benchmarks.bench_timetable [--size 2000] [--flights-per-route 8] [--queries 50]
+"""
+import argparse
+import bisect
+import heapq
+import random
+import time
+
+from benchmarks.synthetic import generate_flights, generate_network, percentile
+from graph import Graph
+from timetable import Timetable, earliest_arrival
+
+
+def departures_by_airport(table):
+    """Per airport, its connections as parallel (departure, connection) lists sorted by departure."""
+    by_airport = [([], []) for _ in table.ids]
+    for c in range(len(table)):
+        times, connections = by_airport[table.source[c]]
+        times.append(table.departure[c])
+        connections.append(c)
+    return by_airport
+
+
+def time_expanded_dijkstra(table, by_airport, positions, source, target, depart_after):
+    """Earliest arrival by Dijkstra over departure and arrival events.
+
+    Each departure event links to the next departure at the same airport
+    (waiting) and to its arrival event (flying); an arrival event links to
+    the first departure its connection time allows. Single-leg flights only.
+    """
+    times, connections = by_airport[source]
+    start = bisect.bisect_left(times, depart_after)
+    queue = [(times[start], connections[start])] if start < len(times) else []
+    done = set()
+    settled = 0
+    while queue:
+        time_at, event = heapq.heappop(queue)
+        if event in done:
+            continue
+        done.add(event)
+        settled += 1
+        if event < 0:
+            # Arrival event of connection ~event
+            c = ~event
+            v = table.target[c]
+            if v == target:
+                return time_at, settled
+            times, connections = by_airport[v]
+            i = bisect.bisect_left(times, time_at + table.min_connection[v])
+            if i < len(times):
+                heapq.heappush(queue, (times[i], connections[i]))
+            continue
+
+        heapq.heappush(queue, (table.arrival[event], ~event))
+        times, connections = by_airport[table.source[event]]
+        i = positions[event] + 1
+        if i < len(times):
+            heapq.heappush(queue, (times[i], connections[i]))
+    return None, settled
+
+
+def time_dependent_dijkstra(table, by_airport, source, target, depart_after):
+    """Earliest arrival at ``target`` by Dijkstra on arrival times; single-leg flights only."""
+    best = {source: depart_after}
+    queue = [(depart_after, source)]
+    done = set()
+    settled = 0
+    while queue:
+        time_at, u = heapq.heappop(queue)
+        if u in done:
+            continue
+        done.add(u)
+        settled += 1
+        if u == target:
+            return time_at, settled
+        ready = time_at if u == source else time_at + table.min_connection[u]
+        times, connections = by_airport[u]
+        for c in connections[bisect.bisect_left(times, ready):]:
+            v = table.target[c]
+            arrival = table.arrival[c]
+            if v not in done and arrival < best.get(v, float("inf")):
+                best[v] = arrival
+                heapq.heappush(queue, (arrival, v))
+    return None, settled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--flights-per-route", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    network = generate_network(args.size, seed=args.seed)
+    graph = Graph.from_routes(network["airports"], network["routes"])
+    flights = generate_flights(network, args.flights_per_route, seed=args.seed)
+
+    start = time.perf_counter()
+    table = Timetable.from_flights(graph, flights)
+    build_ms = (time.perf_counter() - start) * 1000
+    by_airport = departures_by_airport(table)
+    positions = [0] * len(table)
+    for times, connections in by_airport:
+        for i, c in enumerate(connections):
+            positions[c] = i
+    print(f"{len(table)} connections ({table.nbytes()} bytes) built in {build_ms:.0f} ms")
+
+    rng = random.Random(args.seed)
+    queries = [(rng.randrange(args.size), rng.randrange(args.size), rng.randrange(6 * 60, 12 * 60))
+               for _ in range(args.queries)]
+
+    timings = {"expanded": [], "dependent": [], "csa": []}
+    mismatches = 0
+    for source, target, depart_after in queries:
+        start = time.perf_counter()
+        expected, _ = time_expanded_dijkstra(table, by_airport, positions, source, target, depart_after)
+        timings["expanded"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        dependent, _ = time_dependent_dijkstra(table, by_airport, source, target, depart_after)
+        timings["dependent"].append((time.perf_counter() - start) * 1000)
+        if dependent != expected:
+            mismatches += 1
+
+        start = time.perf_counter()
+        legs, _ = earliest_arrival(table, source, target, depart_after)
+        timings["csa"].append((time.perf_counter() - start) * 1000)
+
+        arrival = table.arrival[legs[-1]] if legs else None
+        if source != target and arrival != expected:
+            mismatches += 1
+
+    print(f"{'algorithm':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, samples in timings.items():
+        print(f"{name:>10} {percentile(samples, 0.5):>10.2f} {percentile(samples, 0.99):>10.2f}")
+    print(f"{mismatches} of {len(queries)} arrival times differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark live fare updates: incremental route table repair versus a full rebuild.
+
+Also reports how many cached results survive each batch and the latency of
+route table lookups while a stream of updates is being applied.
+
+Usage: python -m benchmarks.bench_updates [--size 300] [--batches 20] [--batch-sizes 1 10 50] [--rate 5000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import generate_network, percentile
+from graph import shortest_path_tree
+from route_table import build_route_table
+from snapshot import SnapshotHolder, load_snapshot
+from updates import RouteUpdater, apply_updates
+
+
+def fare_updates(snapshot, count, rng):
+    """``count`` random fare changes of up to 30% either way."""
+    updates = []
+    for route in rng.sample(snapshot.routes, min(count, len(snapshot.routes))):
+        updates.append({"op": "set", "source": route["source"], "target": route["target"],
+                        "cost": round(route["cost"] * rng.uniform(0.7, 1.3))})
+    return updates
+
+
+def cached_results(snapshot, pairs):
+    """/find-path style cache entries for ``pairs`` under the cost metric."""
+    results = {}
+    for source, target in pairs:
+        path = snapshot.route_table.lookup(snapshot.graph, source, target, "cost")[0]
+        results[(source, target, (), "cost", "dijkstra")] = {"path": path}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=300)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--rate", type=int, default=5000, help="fare updates per minute while measuring latency")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "data.json")
+        table_file = os.path.join(tmp, "route_table.bin")
+        with open(data_file, "w") as f:
+            json.dump(generate_network(args.size, seed=args.seed), f)
+        build_route_table(data_file, table_file)
+        snapshot = load_snapshot(data_file, table_file)
+        ids = snapshot.graph.ids
+        pairs = [tuple(rng.sample(ids, 2)) for _ in range(2000)]
+
+        # Repairing only the affected rows against recomputing every cost row
+        print(f"{args.size} airports, {args.batches} batches per size")
+        print(f"{'fare changes':>12} {'repair p50':>11} {'rebuild p50':>12} {'rows repaired':>14} {'cache kept':>11}")
+        for batch_size in args.batch_sizes:
+            incremental = []
+            full = []
+            rows = 0
+            kept = 0
+            for _ in range(args.batches):
+                cached = cached_results(snapshot, pairs)
+                start = time.perf_counter()
+                updated, _ = apply_updates(snapshot, fare_updates(snapshot, batch_size, rng))
+                incremental.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                for source in range(len(ids)):
+                    shortest_path_tree(updated.graph, source, "cost").first_hops()
+                full.append((time.perf_counter() - start) * 1000)
+
+                rows += updated.changes.rows_repaired
+                kept += sum(1 for key, value in cached.items() if not updated.changes.affects(key, value))
+                snapshot = updated
+            print(f"{batch_size:>12} {percentile(incremental, 0.5):>9.1f}ms {percentile(full, 0.5):>10.1f}ms "
+                  f"{rows / args.batches:>14.0f} {kept / (args.batches * len(pairs)):>11.1%}")
+
+        # Lookup latency with and without a stream of updates being applied
+        holder = SnapshotHolder(snapshot, None)
+        updater = RouteUpdater(holder, interval=0.5)
+
+        def lookups(seconds):
+            samples = []
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                source, target = rng.choice(pairs)
+                start = time.perf_counter()
+                current = holder.current
+                current.route_table.lookup(current.graph, source, target, "cost")
+                samples.append((time.perf_counter() - start) * 1000)
+            return samples
+
+        quiet = lookups(3)
+        stop = threading.Event()
+
+        def stream():
+            feed = random.Random(args.seed + 1)
+            per_tick = max(1, args.rate // 600)
+            while not stop.is_set():
+                updater.submit(fare_updates(holder.current, per_tick, feed))
+                time.sleep(0.1)
+
+        feeder = threading.Thread(target=stream, daemon=True)
+        feeder.start()
+        busy = lookups(3)
+        stop.set()
+        feeder.join()
+        updater.flush()
+
+        print(f"{'lookups':>22} {'p50 ms':>10} {'p99 ms':>10}")
+        print(f"{'quiet':>22} {percentile(quiet, 0.5):>10.3f} {percentile(quiet, 0.99):>10.3f}")
+        print(f"{f'{args.rate}/min updates':>22} {percentile(busy, 0.5):>10.3f} {percentile(busy, 0.99):>10.3f}")
+        print(f"batches applied: {updater.stats()['batches']}, last: {updater.stats()['last_batch']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""In-process ASGI load generator.
+
+Requests are handed straight to the application callable, without sockets
+or an HTTP client, by ``concurrency`` asyncio tasks sharing one request
+budget. What is measured is the application: routing, validation,
+searches, serialization and compression, not the network stack.
+"""
+import asyncio
+import contextlib
+import json
+import time
+
+
+@contextlib.asynccontextmanager
+async def running(app):
+    """Run the app's lifespan startup on entry and its shutdown on exit."""
+    events = asyncio.Queue()
+    replies = asyncio.Queue()
+
+    async def receive():
+        return await events.get()
+
+    async def send(message):
+        await replies.put(message)
+
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+    await events.put({"type": "lifespan.startup"})
+    message = await replies.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Application startup failed: {message.get('message')}")
+    try:
+        yield app
+    finally:
+        await events.put({"type": "lifespan.shutdown"})
+        await replies.get()
+        await task
+
+
+async def request(app, method, path, body=None, headers=()):
+    """Call ``app`` with one HTTP request; returns ``(status, response body)``."""
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    if body is not None:
+        raw_headers += [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("utf-8"),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 40000),
+        "server": ("benchmark", 80),
+    }
+    finished = asyncio.Event()
+    body_sent = False
+    status = None
+    chunks = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Only report the client gone once the response is complete
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, b"".join(chunks)
+
+
+async def run_load(app, make_request, total, concurrency):
+    """Send ``total`` requests from ``concurrency`` tasks.
+
+    ``make_request(i)`` returns ``(method, path, body, headers)`` for the
+    i-th request. Returns ``(latency samples in ms, elapsed seconds, errors)``,
+    where errors counts responses with a status of 400 or above.
+    """
+    samples = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            method, path, body, headers = make_request(i)
+            start = time.perf_counter()
+            status, _ = await request(app, method, path, body, headers)
+            samples.append((time.perf_counter() - start) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start, errors
@@ -0,0 +1,59 @@
+"""Micro-benchmarks of graph building and route searches on a synthetic network.
+
+Every benchmark returns ``(samples_ms, elapsed_s)`` for ``report.summarize``.
+"""
+import random
+import time
+
+from graph import Graph, dijkstra
+from search import ASTAR_METRICS, STRATEGIES
+from search_pool import find_route
+
+
+def timed(calls):
+    """Run each zero-argument callable in ``calls``, timing every call."""
+    samples = []
+    start = time.perf_counter()
+    for call in calls:
+        call_start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - call_start) * 1000)
+    return samples, time.perf_counter() - start
+
+
+def graph_build(network, repeat):
+    return timed([lambda: Graph.from_routes(network["airports"], network["routes"])] * repeat)
+
+
+def single_search(graph, pairs, metric):
+    return timed([lambda s=s, t=t: dijkstra(graph, s, t, metric) for s, t in pairs])
+
+
+def routed_search(graph, waypoints, metric, strategy):
+    """``find_route``, as /find-path runs it, over lists of waypoints."""
+    return timed([lambda w=w: find_route(graph, w, metric, strategy) for w in waypoints])
+
+
+def run_micro(network, queries, seed, strategies=("dijkstra",), build_repeat=5):
+    """All micro-benchmarks, keyed by name."""
+    graph = Graph.from_routes(network["airports"], network["routes"])
+    rng = random.Random(seed)
+    ids = graph.ids
+    pairs = [tuple(rng.sample(ids, 2)) for _ in range(queries)]
+    with_stops = [(s, *rng.sample(ids, 2), t) for s, t in pairs]
+
+    results = {"graph_build": graph_build(network, build_repeat)}
+    for metric in ("cost", "distance"):
+        results[f"dijkstra_{metric}"] = single_search(graph, pairs, metric)
+    for strategy in strategies:
+        if strategy not in STRATEGIES or strategy == "ch":
+            continue
+        for metric in ("cost", "distance"):
+            if strategy == "astar" and metric not in ASTAR_METRICS:
+                continue
+            # Heuristic preprocessing is a one-off cost; keep it out of the samples
+            find_route(graph, list(pairs[0]), metric, strategy)
+            results[f"route_{strategy}_{metric}"] = routed_search(graph, [list(p) for p in pairs], metric, strategy)
+            results[f"route_{strategy}_{metric}_2_stops"] = routed_search(
+                graph, [list(w) for w in with_stops], metric, strategy)
+    return results
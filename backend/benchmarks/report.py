@@ -0,0 +1,85 @@
+"""Benchmark result summaries, JSON result files and baseline comparison."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.synthetic import percentile
+
+# Latency percentiles reported for every benchmark
+PERCENTILES = (0.5, 0.95, 0.99)
+
+
+def summarize(samples_ms, elapsed_s):
+    """Count, throughput and latency percentiles of one benchmark's samples."""
+    summary = {
+        "count": len(samples_ms),
+        "throughput": len(samples_ms) / elapsed_s if elapsed_s > 0 else 0.0,
+        "mean_ms": sum(samples_ms) / len(samples_ms) if samples_ms else 0.0,
+    }
+    for fraction in PERCENTILES:
+        summary[f"p{round(fraction * 100)}_ms"] = percentile(samples_ms, fraction)
+    return summary
+
+
+def print_table(results):
+    print(f"{'benchmark':<32} {'count':>7} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in results.items():
+        print(f"{name:<32} {summary['count']:>7} {summary['throughput']:>10.1f} {summary['p50_ms']:>9.3f} "
+              f"{summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f}")
+
+
+def environment():
+    """Where the results came from, so baselines from other machines stand out."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def save(path, config, results):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "config": config, "results": results}, f, indent=2)
+
+
+def compare(baseline_path, config, results, tolerance):
+    """Print each benchmark's change against a saved run; returns the names that regressed.
+
+    A benchmark regresses when its p50 latency grew, or its throughput fell,
+    by more than ``tolerance`` (a fraction).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print(f"Warning: baseline {baseline_path} was run with a different configuration: {baseline['config']}")
+
+    regressed = []
+    print(f"{'benchmark':<32} {'p50 ms':>9} {'baseline':>9} {'change':>8} {'ops/s':>10} {'baseline':>10} {'change':>8}")
+    for name, summary in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<32} (not in baseline)")
+            continue
+        latency = _change(summary["p50_ms"], before["p50_ms"])
+        throughput = _change(summary["throughput"], before["throughput"])
+        flag = latency > tolerance or throughput < -tolerance
+        if flag:
+            regressed.append(name)
+        print(f"{name:<32} {summary['p50_ms']:>9.3f} {before['p50_ms']:>9.3f} {latency:>+8.1%} "
+              f"{summary['throughput']:>10.1f} {before['throughput']:>10.1f} {throughput:>+8.1%}"
+              f"{'  REGRESSED' if flag else ''}")
+    return regressed
+
+
+def _change(value, before):
+    return (value - before) / before if before else 0.0
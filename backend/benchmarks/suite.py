@@ -0,0 +1,128 @@
+"""Benchmark suite: micro-benchmarks and an in-process load test of the API.
+
+A seeded synthetic network is generated and written to a temporary data
+file. Graph building and searches are timed directly, then the FastAPI app
+is loaded with that data file and /find-path, /airports and /india-map are
+driven through ASGI by concurrent tasks. Throughput and p50/p95/p99 latency
+are printed and can be saved as JSON, and compared with a saved baseline:
+the exit status is 1 if anything regressed beyond ``--tolerance``.
+
+Usage: python -m benchmarks.suite [--size 2000] [--queries 200] [--requests 1000] [--concurrency 16]
+                                  [--strategy dijkstra] [--output FILE] [--baseline FILE] [--tolerance 0.2]
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+
+from benchmarks import report
+from benchmarks.load import run_load, running
+from benchmarks.micro import run_micro
+from benchmarks.synthetic import generate_network
+
+# Requests sent to each endpoint before timing starts
+WARMUP_REQUESTS = 20
+
+
+def load_scenarios(ids, seed):
+    """``make_request`` functions for ``run_load``, keyed by benchmark name."""
+    rng = random.Random(seed)
+    pairs = [rng.sample(ids, 3) for _ in range(1000)]
+    compressed = [("accept-encoding", "br, gzip")]
+
+    def find_path(i):
+        source, destination, _ = pairs[i % len(pairs)]
+        return "POST", "/find-path", {"source": source, "destination": destination, "metric": "cost"}, ()
+
+    def find_path_layover(i):
+        source, destination, stop = pairs[i % len(pairs)]
+        body = {"source": source, "destination": destination, "layovers": [stop], "metric": "cost"}
+        return "POST", "/find-path", body, ()
+
+    return {
+        "http_find_path": find_path,
+        "http_find_path_layover": find_path_layover,
+        "http_airports": lambda i: ("GET", "/airports", None, compressed),
+        "http_india_map": lambda i: ("GET", "/india-map", None, compressed),
+    }
+
+
+async def run_http(data_file, tmp, args):
+    """Load the app on ``data_file`` and run every load scenario against it."""
+    os.environ.update({
+        "DATA_FILE": data_file,
+        "SNAPSHOT_FILE": "",
+        # No route table or hierarchy: every request runs a search
+        "ROUTE_TABLE_FILE": os.path.join(tmp, "route_table.bin"),
+        "HIERARCHY_FILE": os.path.join(tmp, "contraction.bin"),
+        "ROUTE_CACHE_SIZE": os.environ.get("ROUTE_CACHE_SIZE", "4096") if args.cache else "0",
+        "SEARCH_STRATEGY": args.strategy,
+    })
+    main = importlib.import_module("main")
+    # Keep startup logging out of the benchmark output
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    async with running(main.app) as app:
+        for name, make_request in load_scenarios(main.snapshots.current.graph.ids, args.seed).items():
+            await run_load(app, make_request, min(WARMUP_REQUESTS, args.requests), args.concurrency)
+            samples, elapsed, errors = await run_load(app, make_request, args.requests, args.concurrency)
+            results[name] = {**report.summarize(samples, elapsed), "errors": errors}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000, help="airports in the synthetic network")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=200, help="searches per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint in the load test")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent requests in the load test")
+    parser.add_argument("--strategy", default="dijkstra", help="search strategy, as SEARCH_STRATEGY")
+    parser.add_argument("--cache", action="store_true", help="keep the /find-path result cache enabled")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--output", help="save the results as JSON here")
+    parser.add_argument("--baseline", help="compare with results saved by an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown counted as a regression (default 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    config = {name: getattr(args, name) for name in
+              ("size", "seed", "queries", "requests", "concurrency", "strategy", "cache")}
+    network = generate_network(args.size, seed=args.seed)
+    results = {}
+    if not args.skip_micro:
+        for name, (samples, elapsed) in run_micro(network, args.queries, args.seed, (args.strategy,)).items():
+            results[name] = report.summarize(samples, elapsed)
+    if not args.skip_http:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_file = os.path.join(tmp, "data.json")
+            with open(data_file, "w") as f:
+                json.dump(network, f)
+            http_results = asyncio.run(run_http(data_file, tmp, args))
+        results.update(http_results)
+        errors = {name: summary["errors"] for name, summary in http_results.items() if summary["errors"]}
+        if errors:
+            print(f"Warning: requests failed: {errors}")
+
+    print(f"{args.size} airports, {len(network['routes'])} routes, seed {args.seed}")
+    report.print_table(results)
+    if args.output:
+        report.save(args.output, config, results)
+        print(f"Results saved to {args.output}")
+    if args.baseline:
+        print()
+        regressed = report.compare(args.baseline, config, results, args.tolerance)
+        if regressed:
+            print(f"{len(regressed)} benchmarks regressed by more than {args.tolerance:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Synthetic airport networks for benchmarking.
+
+Airports are scattered over India's bounding box. Each airport is linked to
+its nearest neighbours, plus long-range routes whose targets are picked in
+proportion to their current degree, which yields a few busy hubs like a real
+network. Routes are priced the same way as in reduce_connections.py.
+
+Usage: python -m benchmarks.synthetic --airports 10000 [--seed N] [--flights-per-route N] [--output FILE]
+"""
+import argparse
+import json
+import math
+import random
+
+from reduce_connections import calculate_distance
+
+# Rough bounding box of mainland India
+LAT_RANGE = (8.0, 32.0)
+LNG_RANGE = (68.0, 97.0)
+
+# Grid cell size in degrees used to find nearby airports without O(n^2) scans
+CELL_SIZE = 1.0
+
+
+def route_cost(distance, rng):
+    """Price a route like reduce_connections.py does."""
+    if distance < 500:  # Short routes
+        total_cost = 1000 + int(distance * 12)
+        variation = rng.uniform(0.6, 1.4)
+    elif distance < 1000:  # Medium routes
+        total_cost = 3500 + int(distance * 8)
+        variation = rng.uniform(0.7, 1.3)
+    else:  # Long routes
+        total_cost = 6000 + int(distance * 6)
+        variation = rng.uniform(0.8, 1.2)
+    return int(total_cost * variation)
+
+
+def _nearest(airport, grid, k):
+    """Return up to ``k`` (distance, airport) pairs closest to ``airport``."""
+    cell_lat = int(airport["lat"] // CELL_SIZE)
+    cell_lng = int(airport["lng"] // CELL_SIZE)
+    candidates = []
+    radius = 0
+    max_radius = int(max(LAT_RANGE[1] - LAT_RANGE[0], LNG_RANGE[1] - LNG_RANGE[0]) // CELL_SIZE) + 1
+    # Widen the search ring until there are enough candidates, then one more
+    # ring so that airports just across a cell border are not missed
+    extra = 1
+    while radius <= max_radius:
+        for i in range(cell_lat - radius, cell_lat + radius + 1):
+            for j in range(cell_lng - radius, cell_lng + radius + 1):
+                if max(abs(i - cell_lat), abs(j - cell_lng)) != radius:
+                    continue
+                for other in grid.get((i, j), ()):
+                    if other is not airport:
+                        candidates.append(other)
+        if len(candidates) >= k:
+            if extra == 0:
+                break
+            extra -= 1
+        radius += 1
+
+    distances = [
+        (calculate_distance(airport["lat"], airport["lng"], other["lat"], other["lng"]), other)
+        for other in candidates
+    ]
+    distances.sort(key=lambda x: x[0])
+    return distances[:k]
+
+
+def generate_network(num_airports, seed=0, nearest=3, long_range=1):
+    """Generate ``{"airports": [...], "routes": [...]}`` like reduced_map_data.json."""
+    rng = random.Random(seed)
+    width = len(str(num_airports))
+    airports = []
+    grid = {}
+    for i in range(num_airports):
+        lat = rng.uniform(*LAT_RANGE)
+        lng = rng.uniform(*LNG_RANGE)
+        airport = {
+            "id": f"S{i:0{width}d}",
+            "name": f"Synthetic Airport {i}",
+            "lat": round(lat, 4),
+            "lng": round(lng, 4),
+        }
+        airports.append(airport)
+        grid.setdefault((int(lat // CELL_SIZE), int(lng // CELL_SIZE)), []).append(airport)
+
+    routes = []
+    seen = set()
+    # Every route endpoint is appended here, so sampling from it picks
+    # airports in proportion to their degree (preferential attachment)
+    endpoints = []
+
+    def add_route(a, b, distance):
+        key = (min(a["id"], b["id"]), max(a["id"], b["id"]))
+        if a is b or key in seen:
+            return
+        seen.add(key)
+        routes.append({
+            "source": a["id"],
+            "target": b["id"],
+            "distance": distance * rng.uniform(1.1, 1.3),
+            "cost": route_cost(distance, rng),
+            "direct": True,
+        })
+        endpoints.append(a)
+        endpoints.append(b)
+
+    for airport in airports:
+        for distance, other in _nearest(airport, grid, nearest):
+            add_route(airport, other, distance)
+
+    for airport in airports:
+        for _ in range(long_range):
+            if rng.random() < 0.8:
+                other = rng.choice(endpoints)
+                distance = calculate_distance(airport["lat"], airport["lng"], other["lat"], other["lng"])
+                add_route(airport, other, distance)
+
+    return {"airports": airports, "routes": routes}
+
+
+def generate_flights(network, flights_per_route=8, seed=0, speed_kmh=800):
+    """Daily flights for ``network``, ``flights_per_route`` each way on every route.
+
+    Departures fall between 05:00 and 23:00 and block times follow the
+    route distance plus 20 minutes of taxiing, so late flights land after
+    midnight. Every flight is a single leg with its own number.
+    """
+    rng = random.Random(seed)
+    flights = []
+    for route in network["routes"]:
+        duration = int(route["distance"] / speed_kmh * 60) + 20
+        for source, target in ((route["source"], route["target"]), (route["target"], route["source"])):
+            for _ in range(flights_per_route):
+                departure = rng.randrange(5 * 60, 23 * 60)
+                flights.append({
+                    "flight": f"F{len(flights):07d}",
+                    "source": source,
+                    "target": target,
+                    "departure": f"{departure // 60:02d}:{departure % 60:02d}",
+                    "arrival": f"{(departure + duration) // 60 % 24:02d}:{(departure + duration) % 60:02d}",
+                })
+    return flights
+
+
+def percentile(samples, fraction):
+    """Return the ``fraction`` percentile of ``samples`` (nearest rank)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic network as a route data file")
+    parser.add_argument("--airports", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--flights-per-route", type=int, default=0, help="also generate flight schedules")
+    parser.add_argument("--output", default="synthetic_map_data.json")
+    args = parser.parse_args()
+
+    network = generate_network(args.airports, seed=args.seed)
+    if args.flights_per_route:
+        network["flights"] = generate_flights(network, args.flights_per_route, seed=args.seed)
+    with open(args.output, "w") as f:
+        json.dump(network, f, separators=(",", ":"))
+    print(f"Wrote {len(network['airports'])} airports and {len(network['routes'])} routes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
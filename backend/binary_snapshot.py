@@ -0,0 +1,171 @@
+"""Compact binary form of the route data for fast server startup.
+
+The file holds the interned airport IDs, the graph's CSR adjacency (and
+its reverse, for a directed graph), typed weight and coordinate arrays, and
+the airport, route and flight records as compact JSON. It is memory-mapped
+on load: the graph's arrays are views into the mapping, so nothing is
+parsed or copied before the first request, and the records are decoded only
+when something asks for them. Their encoded bytes double as the /airports
+and /routes payloads.
+
+The header records the SHA-256 of the JSON data file the snapshot was
+written from, which is also the snapshot's data version, so route tables
+and contraction hierarchies built from that file stay valid.
+
+Usage: python binary_snapshot.py [--data FILE] [--output FILE]
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+
+from graph import METRICS, Graph
+from payloads import dumps
+from route_table import DATA_DIR, DEFAULT_DATA_FILE, file_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_FILE = os.path.join(DATA_DIR, "reduced_map_data.snap")
+
+MAGIC = b"ASNP"
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct("<4sII")
+
+# Record lists stored as encoded JSON
+RECORDS = ("airports", "routes", "flights")
+
+
+class SnapshotFile:
+    """A memory-mapped binary snapshot."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot file: {path}")
+
+        offset = PREAMBLE.size
+        header = json.loads(bytes(self._mmap[offset:offset + header_length]))
+        self.source_sha256 = header["source_sha256"]
+        self.counts = header["counts"]
+        self.directed = header.get("directed", False)
+
+        # Ask the kernel to start reading the pages in before searches touch them
+        if hasattr(mmap, "MADV_WILLNEED"):
+            self._mmap.madvise(mmap.MADV_WILLNEED)
+
+        data_start = _align(offset + header_length)
+        buffer = memoryview(self._mmap)
+        self.sections = {}
+        for name, (section_offset, typecode, length) in header["sections"].items():
+            start = data_start + section_offset
+            self.sections[name] = buffer[start:start + length * array(typecode).itemsize].cast(typecode)
+
+    def graph(self):
+        """The graph, its arrays viewing the mapped file."""
+        sections = self.sections
+        ids = bytes(sections["ids"]).decode("utf-8")
+        reverse = None
+        if self.directed:
+            reverse = (sections["rev_offsets"], sections["rev_targets"], sections["rev_edges"])
+        return Graph(
+            ids.split("\n") if ids else [],
+            sections["offsets"],
+            sections["targets"],
+            {metric: sections[f"weights.{metric}"] for metric in METRICS},
+            sections["lat"],
+            sections["lng"],
+            directed=self.directed,
+            reverse=reverse,
+        )
+
+    def encoded(self, name):
+        """The compact JSON encoding of record list ``name``, or None if absent."""
+        section = self.sections.get(name)
+        return bytes(section) if section is not None else None
+
+    def decode(self, name):
+        """Record list ``name`` as Python objects; empty if absent."""
+        encoded = self.encoded(name)
+        return json.loads(encoded) if encoded is not None else []
+
+
+def write_snapshot(data_file, snapshot_file, force=False):
+    """Write the binary snapshot of ``data_file``; returns False if it was already current."""
+    source_sha256 = file_sha256(data_file)
+    if not force and os.path.exists(snapshot_file):
+        try:
+            if SnapshotFile(snapshot_file).source_sha256 == source_sha256:
+                logger.info(f"Snapshot {snapshot_file} is up to date, skipping")
+                return False
+        except (ValueError, OSError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable snapshot {snapshot_file}: {e}")
+
+    with open(data_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if "airports" not in data or "routes" not in data:
+        raise ValueError(f"Invalid data format in {data_file}: missing required keys")
+    graph = Graph.from_data(data)
+
+    sections = [("ids", array("B", "\n".join(graph.ids).encode("utf-8"))),
+                ("offsets", graph.offsets), ("targets", graph.targets)]
+    sections += [(f"weights.{metric}", graph.weights[metric]) for metric in METRICS]
+    sections += [("lat", graph.lat), ("lng", graph.lng)]
+    if graph.directed:
+        sections += [("rev_offsets", graph.rev_offsets), ("rev_targets", graph.rev_targets),
+                     ("rev_edges", graph.rev_edges)]
+    counts = {}
+    for name in RECORDS:
+        if name in data:
+            sections.append((name, array("B", dumps(data[name]))))
+            counts[name] = len(data[name])
+
+    # Lay out 8-byte aligned sections; offsets are relative to the start of
+    # the data region that follows the header
+    layout = {}
+    offset = 0
+    for name, values in sections:
+        layout[name] = [offset, values.typecode, len(values)]
+        offset = _align(offset + values.itemsize * len(values))
+    header = {"source_sha256": source_sha256, "counts": counts, "directed": graph.directed,
+              "sections": layout}
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    tmp_file = f"{snapshot_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, values in sections:
+            f.seek(data_start + layout[name][0])
+            f.write(memoryview(values).cast("B"))
+    os.replace(tmp_file, snapshot_file)
+
+    logger.info(f"Snapshot written to {snapshot_file} ({os.path.getsize(snapshot_file)} bytes)")
+    return True
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the binary snapshot of a route data file")
+    parser.add_argument("--data", default=DEFAULT_DATA_FILE, help="route data JSON file")
+    parser.add_argument("--output", default=DEFAULT_SNAPSHOT_FILE, help="snapshot file to write")
+    parser.add_argument("--force", action="store_true", help="rewrite even if the snapshot is up to date")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    write_snapshot(args.data, args.output, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Bounded, thread-safe cache of /find-path results.
+
+Entries are keyed by the request tuple and tagged with the version of the
+route data they were computed from. ``reset(version)`` switches to a new
+version and drops everything older in one step, and results computed from
+an older version are never stored. ``migrate(version, stale)`` switches
+versions too but keeps the results a route update left valid. An optional
+SQLite file shared by all uvicorn workers on the host backs the in-memory
+LRU, so a result computed by one worker is a hit for the others. Workers
+switch versions at different moments, so none deletes the others' rows:
+rows of an old version are never read again and age out with the store's
+size limit and TTL.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class SharedStore:
+    """SQLite-backed key/value store shared between processes on one host."""
+
+    def __init__(self, path, maxsize, ttl=None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "version TEXT, key TEXT, value TEXT, stored_at REAL, PRIMARY KEY (version, key))"
+        )
+        self._writes = 0
+
+    def get(self, version, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM results WHERE version = ? AND key = ?", (version, key)
+            ).fetchone()
+        if row is None:
+            return None
+        value, stored_at = row
+        if self.ttl is not None and time.time() - stored_at > self.ttl:
+            return None
+        return json.loads(value)
+
+    def put(self, version, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (version, key, json.dumps(value), time.time()),
+            )
+            self._writes += 1
+            # Trim the oldest rows now and then rather than on every write
+            if self._writes % 256 == 0:
+                self._conn.execute(
+                    "DELETE FROM results WHERE rowid IN ("
+                    "SELECT rowid FROM results ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,),
+                )
+
+    def migrate(self, old_version, version, stale):
+        """Copy the rows of ``old_version`` that are not ``stale(key, value)`` to ``version``.
+
+        Rows already stored under ``version`` by another worker are kept.
+        Returns the number of rows copied.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, stored_at FROM results WHERE version = ?", (old_version,)
+            ).fetchall()
+        kept = [(version, key, value, stored_at) for key, value, stored_at in rows
+                if not stale(json.loads(key), json.loads(value))]
+        with self._lock:
+            self._conn.executemany("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?)", kept)
+        return len(kept)
+
+
+class ResultCache:
+    """LRU cache with optional TTL and hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=4096, ttl=None, version=None, store=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        """Return the value cached for ``key`` under data ``version`` or None."""
+        if self.maxsize <= 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end((version, key))
+                    self.hits += 1
+                    return value
+                del self._entries[(version, key)]
+                self.expirations += 1
+
+        if self.store is not None:
+            try:
+                value = self.store.get(version, _store_key(key))
+            except sqlite3.Error as e:
+                logger.warning(f"Shared result cache read failed: {e}")
+                value = None
+            if value is not None:
+                self._insert(version, key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value, version):
+        """Cache ``value`` unless ``version`` is no longer the current data version."""
+        if self.maxsize <= 0 or version != self.version:
+            return
+        self._insert(version, key, value)
+        if self.store is not None:
+            try:
+                self.store.put(version, _store_key(key), value)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared result cache write failed: {e}")
+
+    def _insert(self, version, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            # Results computed against an older version are never stored
+            if version != self.version:
+                return
+            self._entries[(version, key)] = (expires_at, value)
+            self._entries.move_to_end((version, key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def reset(self, version):
+        """Switch to a new data version, dropping every cached result atomically."""
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+
+    def migrate(self, version, stale):
+        """Switch to ``version``, keeping current entries unless ``stale(key, value)``.
+
+        The shared store's rows of the current version are carried over the
+        same way.
+        """
+        with self._lock:
+            old_version = self.version
+            entries = OrderedDict()
+            for (entry_version, key), (expires_at, value) in self._entries.items():
+                if entry_version == self.version and not stale(key, value):
+                    entries[(version, key)] = (expires_at, value)
+            dropped = len(self._entries) - len(entries)
+            self.version = version
+            self._entries = entries
+            self.invalidations += dropped
+        if self.store is not None:
+            try:
+                self.store.migrate(old_version, version, stale)
+            except sqlite3.Error as e:
+                logger.warning(f"Shared result cache migration failed: {e}")
+        return dropped
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "shared_store": self.store.path if self.store is not None else None,
+            }
+
+
+def _store_key(key):
+    return json.dumps(key, separators=(",", ":"))
@@ -0,0 +1,450 @@
+"""Contraction Hierarchies for fast point-to-point queries.
+
+Preprocessing contracts airports one at a time, least important first. When
+an airport is removed, a shortcut edge replaces every shortest path through
+it that has no equally short detour (a witness). The contraction order is
+the airport's rank. A query then runs Dijkstra from both ends, following
+only edges towards higher-ranked airports, so each side settles a small
+"upward" search space. Shortcuts remember the airport they bypass and are
+unpacked back into original flights.
+
+Each metric gets its own ordering. The hierarchy is written to a binary file
+that is memory-mapped on load, like the route table. Its header records the
+SHA-256 of the data file it was built from.
+
+Contraction stops at a dense core; contracting it costs most and saves
+least. Core airports keep all their edges as upward edges and have no
+downward ones, so inside the core only the forward search moves, as plain
+Dijkstra, and the backward search stops at the first core airport it reaches.
+
+Usage: python contraction.py [--data FILE] [--output FILE] [--workers N] [--force]
+                             [--core-degree D]
+"""
+import argparse
+import copy
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from graph import METRICS, search_counters
+from route_table import DATA_DIR, DEFAULT_DATA_FILE, _align, file_sha256, load_graph
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HIERARCHY_FILE = os.path.join(DATA_DIR, "contraction.bin")
+
+MAGIC = b"CHRC"
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct("<4sII")
+
+# Nodes a witness search may settle before giving up and adding the shortcut.
+# Ordering only needs an estimate of the shortcut count, so it uses a
+# cheaper search than the contraction itself
+WITNESS_SETTLE_LIMIT = 500
+ESTIMATE_SETTLE_LIMIT = 30
+
+# Contraction stops once the remaining airports average this many edges each.
+# Dense cores gain little from contraction but cost the most to contract,
+# so they are left as they are; queries cross them with the forward search
+# alone, as plain Dijkstra, since core airports have no downward edges
+CORE_DEGREE = 20
+
+# Arrays stored for each metric: rank, then upward edges in CSR form. ``up``
+# holds edges u -> v and ``down`` edges v -> u, both stored at the lower-ranked
+# node u; core edges are all in ``up``. ``middle`` is the airport a shortcut
+# bypasses, or -1.
+SECTIONS = (
+    ("rank", "i"),
+    ("up_offsets", "q"), ("up_targets", "i"), ("up_weights", "d"), ("up_middle", "i"),
+    ("down_offsets", "q"), ("down_targets", "i"), ("down_weights", "d"), ("down_middle", "i"),
+)
+
+
+def contract(graph, metric, settle_limit=WITNESS_SETTLE_LIMIT, core_degree=CORE_DEGREE):
+    """Contract the nodes of ``graph`` for ``metric`` until the core is reached.
+
+    Returns ``(arrays, shortcuts)`` where ``arrays`` maps each name in
+    ``SECTIONS`` to its array.
+    """
+    n = len(graph)
+    weights = graph.weights[metric]
+    offsets = graph.offsets
+    targets = graph.targets
+    inf = float("inf")
+
+    # Remaining graph: out_edges[u][v] = (weight, middle), in_edges[v][u] = weight
+    out_edges = [{} for _ in range(n)]
+    in_edges = [{} for _ in range(n)]
+    for u in range(n):
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            if v != u and (v not in out_edges[u] or weights[e] < out_edges[u][v][0]):
+                out_edges[u][v] = (weights[e], -1)
+                in_edges[v][u] = weights[e]
+
+    def witness_search(source, avoid, limit, wanted, settle_limit):
+        """Tentative distances from ``source`` avoiding ``avoid``, up to ``limit``."""
+        dist = {source: 0.0}
+        queue = [(0.0, source)]
+        done = set()
+        remaining = len(wanted)
+        while queue:
+            d, u = heapq.heappop(queue)
+            if u in done:
+                continue
+            if d > limit or len(done) >= settle_limit:
+                break
+            done.add(u)
+            if u in wanted:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            for v, (w, _) in out_edges[u].items():
+                if v == avoid:
+                    continue
+                candidate = d + w
+                if candidate < dist.get(v, inf):
+                    dist[v] = candidate
+                    heapq.heappush(queue, (candidate, v))
+        return dist
+
+    def shortcuts_for(v, settle_limit=ESTIMATE_SETTLE_LIMIT):
+        """Shortcuts ``(u, x, weight)`` needed if ``v`` were contracted now."""
+        needed = []
+        for u, w_in in in_edges[v].items():
+            wanted = {x: w_in + w_out for x, (w_out, _) in out_edges[v].items() if x != u}
+            if not wanted:
+                continue
+            dist = witness_search(u, v, max(wanted.values()), wanted, settle_limit)
+            for x, weight in wanted.items():
+                if dist.get(x, inf) > weight:
+                    needed.append((u, x, weight))
+        return needed
+
+    deleted_neighbours = [0] * n
+    depth = [0] * n
+
+    def priority(v, shortcuts):
+        # Edge difference, plus terms spreading contraction evenly over the graph
+        return (2 * (len(shortcuts) - len(in_edges[v]) - len(out_edges[v]))
+                + deleted_neighbours[v] + depth[v])
+
+    queue = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+    heapq.heapify(queue)
+
+    rank = array("i", [0]) * n
+    contracted = bytearray(n)
+    up = [None] * n
+    down = [None] * n
+    shortcut_count = 0
+    next_rank = 0
+    remaining_edges = sum(len(edges) for edges in out_edges)
+    while queue:
+        if remaining_edges > core_degree * (n - next_rank):
+            break
+        _, v = heapq.heappop(queue)
+        if contracted[v]:
+            continue
+        # Lazy update: re-evaluate and postpone if no longer the cheapest
+        current = priority(v, shortcuts_for(v))
+        if queue and current > queue[0][0]:
+            heapq.heappush(queue, (current, v))
+            continue
+
+        shortcuts = shortcuts_for(v, settle_limit)
+        for u, x, weight in shortcuts:
+            if x not in out_edges[u] or weight < out_edges[u][x][0]:
+                remaining_edges += x not in out_edges[u]
+                out_edges[u][x] = (weight, v)
+                in_edges[x][u] = weight
+                shortcut_count += 1
+
+        contracted[v] = 1
+        rank[v] = next_rank
+        next_rank += 1
+        # Every remaining neighbour is contracted later, so outranks v
+        up[v] = [(x, w, middle) for x, (w, middle) in out_edges[v].items()]
+        down[v] = [(u, out_edges[u][v][0], out_edges[u][v][1]) for u in in_edges[v]]
+        neighbours = set(out_edges[v]) | set(in_edges[v])
+        remaining_edges -= len(out_edges[v]) + len(in_edges[v])
+        for x in out_edges[v]:
+            del in_edges[x][v]
+        for u in in_edges[v]:
+            del out_edges[u][v]
+        out_edges[v] = {}
+        in_edges[v] = {}
+        for u in neighbours:
+            deleted_neighbours[u] += 1
+            depth[u] = max(depth[u], depth[v] + 1)
+
+    # The uncontracted core ranks highest; its edges all count as upward
+    core = [v for v in range(n) if not contracted[v]]
+    for v in core:
+        rank[v] = next_rank
+        next_rank += 1
+        up[v] = [(x, w, middle) for x, (w, middle) in out_edges[v].items()]
+        down[v] = []
+    if core:
+        logger.info(f"Left a core of {len(core)} airports uncontracted for {metric}")
+
+    arrays = {"rank": rank}
+    for name, lists in (("up", up), ("down", down)):
+        node_offsets = array("q", [0]) * (n + 1)
+        node_targets = array("i")
+        node_weights = array("d")
+        node_middle = array("i")
+        for u in range(n):
+            for x, w, middle in lists[u]:
+                node_targets.append(x)
+                node_weights.append(w)
+                node_middle.append(middle)
+            node_offsets[u + 1] = len(node_targets)
+        arrays[f"{name}_offsets"] = node_offsets
+        arrays[f"{name}_targets"] = node_targets
+        arrays[f"{name}_weights"] = node_weights
+        arrays[f"{name}_middle"] = node_middle
+    return arrays, shortcut_count
+
+
+class ContractionHierarchy:
+    """Memory-mapped Contraction Hierarchies, one per metric."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported contraction hierarchy file: {path}")
+
+        offset = PREAMBLE.size
+        header = json.loads(bytes(self._mmap[offset:offset + header_length]))
+        self.source_sha256 = header["source_sha256"]
+        self.ids = header["ids"]
+        self.metrics = header["metrics"]
+
+        data_start = _align(offset + header_length)
+        buffer = memoryview(self._mmap)
+        self.levels = {}
+        for metric, sections in header["sections"].items():
+            self.levels[metric] = {
+                name: buffer[data_start + start:data_start + start + length].cast(typecode)
+                for name, (typecode, start, length) in sections.items()
+            }
+
+    def matches(self, graph, source_sha256):
+        """Check that the hierarchy was built for this graph and data file."""
+        return self.source_sha256 == source_sha256 and self.ids == graph.ids
+
+    def restricted(self, metrics):
+        """A copy answering only ``metrics``, or None if that leaves nothing."""
+        metrics = [metric for metric in metrics if metric in self.levels]
+        if not metrics:
+            return None
+        hierarchy = copy.copy(self)
+        hierarchy.levels = {metric: self.levels[metric] for metric in metrics}
+        return hierarchy
+
+    def search(self, graph, source, target, metric):
+        """Shortest path between node indices as ``(nodes, edges, settled)``."""
+        level = self.levels.get(metric)
+        if level is None:
+            raise ValueError(f"No contraction hierarchy for {metric}")
+        if source == target:
+            return [source], [], 0
+
+        inf = float("inf")
+        sides = (
+            (level["up_offsets"], level["up_targets"], level["up_weights"]),
+            (level["down_offsets"], level["down_targets"], level["down_weights"]),
+        )
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: -1}, {target: -1})
+        queues = ([(0.0, source)], [(0.0, target)])
+        done = (set(), set())
+        best = inf
+        meeting = -1
+        settled = 0
+        pushes = 2
+
+        while queues[0] or queues[1]:
+            # Advance the side with the smaller tentative distance
+            side = 0 if queues[0] and (not queues[1] or queues[0][0][0] <= queues[1][0][0]) else 1
+            d, u = heapq.heappop(queues[side])
+            if d >= best:
+                # Nothing left on this side can improve the best meeting point
+                queues[side].clear()
+                continue
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            settled += 1
+
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best = d + other
+                meeting = u
+
+            node_offsets, node_targets, node_weights = sides[side]
+            side_dist = dist[side]
+            for e in range(node_offsets[u], node_offsets[u + 1]):
+                v = node_targets[e]
+                candidate = d + node_weights[e]
+                if candidate < side_dist.get(v, inf):
+                    side_dist[v] = candidate
+                    parent[side][v] = u
+                    heapq.heappush(queues[side], (candidate, v))
+                    pushes += 1
+
+        search_counters.add(settled, pushes)
+        if meeting == -1:
+            return [], [], settled
+
+        # Hierarchy path: source up to the meeting node, then down to target
+        hops = []
+        node = meeting
+        while node != -1:
+            hops.append(node)
+            node = parent[0][node]
+        hops.reverse()
+        node = parent[1][meeting]
+        while node != -1:
+            hops.append(node)
+            node = parent[1][node]
+
+        nodes = [source]
+        for u, v in zip(hops, hops[1:]):
+            self._unpack(level, u, v, nodes)
+        edges = [graph.edge_index(u, v) for u, v in zip(nodes, nodes[1:])]
+        return nodes, edges, settled
+
+    def _unpack(self, level, u, v, nodes):
+        """Append the original nodes after ``u`` on the edge ``u -> v``."""
+        middle = self._middle(level, u, v)
+        if middle == -1:
+            nodes.append(v)
+            return
+        self._unpack(level, u, middle, nodes)
+        self._unpack(level, middle, v, nodes)
+
+    @staticmethod
+    def _middle(level, u, v):
+        # Edges are stored at their lower-ranked end, except within the core
+        # where every edge u -> v is an upward edge of u
+        for owner, other, prefix in ((u, v, "up"), (v, u, "down")):
+            node_offsets = level[f"{prefix}_offsets"]
+            node_targets = level[f"{prefix}_targets"]
+            for e in range(node_offsets[owner], node_offsets[owner + 1]):
+                if node_targets[e] == other:
+                    return level[f"{prefix}_middle"][e]
+        raise KeyError(f"Edge {u} -> {v} is not in the hierarchy")
+
+
+def ch_search(graph, source, target, metric):
+    """Search strategy answering from the hierarchy attached to ``graph``."""
+    hierarchy = graph.derived.get("contraction")
+    if hierarchy is None:
+        raise ValueError("No contraction hierarchy is loaded")
+    return hierarchy.search(graph, source, target, metric)
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _contract_metric(metric, core_degree):
+    arrays, shortcuts = contract(_worker_graph, metric, core_degree=core_degree)
+    return metric, {name: values.tobytes() for name, values in arrays.items()}, shortcuts
+
+
+def build_hierarchy(data_file=DEFAULT_DATA_FILE, hierarchy_file=DEFAULT_HIERARCHY_FILE,
+                    workers=None, force=False, core_degree=CORE_DEGREE):
+    """Build the hierarchy for ``data_file`` unless an up-to-date one exists.
+
+    Metrics are contracted in parallel, one process each. Contracting one
+    metric is serial, so the build never uses more processes than there are
+    metrics, however large ``workers`` is. Returns True if the file was
+    (re)built and False if it was up to date.
+    """
+    source_sha256 = file_sha256(data_file)
+    if not force and os.path.exists(hierarchy_file):
+        try:
+            if ContractionHierarchy(hierarchy_file).source_sha256 == source_sha256:
+                logger.info(f"Contraction hierarchy {hierarchy_file} is up to date, skipping build")
+                return False
+        except (ValueError, OSError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable contraction hierarchy {hierarchy_file}: {e}")
+
+    graph = load_graph(data_file)
+    metrics = list(METRICS)
+    logger.info(f"Contracting {len(graph)} airports for {len(metrics)} metrics")
+
+    results = {}
+    if workers == 1:
+        _init_worker(graph)
+        outputs = map(_contract_metric, metrics, [core_degree] * len(metrics))
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(metrics)),
+                                   initializer=_init_worker, initargs=(graph,))
+        outputs = pool.map(_contract_metric, metrics, [core_degree] * len(metrics))
+    for metric, arrays, shortcuts in outputs:
+        results[metric] = arrays
+        logger.info(f"Contracted {metric} with {shortcuts} shortcuts")
+    if workers != 1:
+        pool.shutdown()
+
+    # Sections are 8-byte aligned; offsets are relative to the data region
+    sections = {}
+    offset = 0
+    for metric in metrics:
+        sections[metric] = {}
+        for name, typecode in SECTIONS:
+            length = len(results[metric][name])
+            sections[metric][name] = [typecode, offset, length]
+            offset = _align(offset + length)
+    header = {"source_sha256": source_sha256, "ids": graph.ids, "metrics": metrics, "sections": sections}
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    tmp_file = f"{hierarchy_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for metric in metrics:
+            for name, _ in SECTIONS:
+                f.seek(data_start + sections[metric][name][1])
+                f.write(results[metric][name])
+    os.replace(tmp_file, hierarchy_file)
+
+    logger.info(f"Contraction hierarchy written to {hierarchy_file} ({os.path.getsize(hierarchy_file)} bytes)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute Contraction Hierarchies")
+    parser.add_argument("--data", default=DEFAULT_DATA_FILE, help="route data JSON file")
+    parser.add_argument("--output", default=DEFAULT_HIERARCHY_FILE, help="hierarchy file to write")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, at most one per metric")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the hierarchy is up to date")
+    parser.add_argument("--core-degree", type=float, default=CORE_DEGREE,
+                        help="average degree at which contraction stops")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build_hierarchy(args.data, args.output, workers=args.workers, force=args.force,
+                    core_degree=args.core_degree)
+
+
+if __name__ == "__main__":
+    main()
@@ -44,11 +44,30 @@ for route in data:
 
 print(f"\nFound {len(routes)} routes")
 
+# Extract flight schedules from records that carry departure and arrival times
+flights = []
+for route in data:
+    if 'departure_time' in route and 'arrival_time' in route:
+        flights.append({
+            'flight': route.get('flight_number'),
+            'source': route['origin_airport'],
+            'target': route['destination_airport'],
+            'departure': route['departure_time'],
+            'arrival': route['arrival_time'],
+            'cost': route['flight_price_inr']
+        })
+
+if flights:
+    print(f"Found {len(flights)} scheduled flights")
+
 # Optional: Save the extracted data to a new file
+output = {
+    'airports': list(airports.values()),
+    'routes': routes
+}
+if flights:
+    output['flights'] = flights
 with open('data/processed_data.json', 'w') as f:
-    json.dump({
-        'airports': list(airports.values()),
-        'routes': routes
-    }, f, indent=2)
+    json.dump(output, f, indent=2)
 
 print("\nData saved to 'data/processed_data.json'")
\ No newline at end of file
@@ -0,0 +1,722 @@
+import heapq
+import logging
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Weights stored for every edge; "time" is derived from the distance
+METRICS = ("distance", "cost", "time")
+
+# Average cruise speed used to estimate flight time in hours
+AVERAGE_SPEED_KMH = 800
+
+
+class Graph:
+    """Compact airport graph stored as CSR adjacency arrays.
+
+    Airport IDs are interned to integer indices. The outgoing edges of node
+    ``u`` are ``targets[offsets[u]:offsets[u + 1]]`` and edge ``e`` has weight
+    ``weights[metric][e]`` for each metric in ``METRICS``. Airport
+    coordinates are kept in ``lat``/``lng`` (NaN when unknown) and
+    ``derived`` caches data computed lazily from the graph, such as search
+    heuristics.
+
+    An undirected graph holds every route in both directions with equal
+    weights, so it is its own reverse. A ``directed`` graph holds each
+    direction as given and keeps its incoming edges in a second CSR:
+    the predecessors of ``v`` are ``rev_targets[rev_offsets[v]:rev_offsets[v + 1]]``
+    and ``rev_edges`` holds the index of each of those edges in ``targets``.
+    """
+
+    __slots__ = ("ids", "index", "offsets", "targets", "weights", "lat", "lng", "directed",
+                 "rev_offsets", "rev_targets", "rev_edges", "derived")
+
+    def __init__(self, ids, offsets, targets, weights, lat=None, lng=None, directed=False, reverse=None):
+        self.ids = ids
+        self.index = {airport_id: i for i, airport_id in enumerate(ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        nan = array("d", [float("nan")]) * len(ids)
+        self.lat = lat if lat is not None else nan
+        self.lng = lng if lng is not None else array("d", nan)
+        self.directed = directed
+        if not directed:
+            self.rev_offsets, self.rev_targets, self.rev_edges = offsets, targets, None
+        else:
+            # ``reverse`` is the (rev_offsets, rev_targets, rev_edges) triple
+            # when already at hand, as in a binary snapshot
+            self.rev_offsets, self.rev_targets, self.rev_edges = \
+                reverse if reverse is not None else transpose(offsets, targets, len(ids))
+        self.derived = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, airport_id):
+        return airport_id in self.index
+
+    @property
+    def num_edges(self):
+        return len(self.targets)
+
+    def neighbors(self, node):
+        """Return the range of edge indices leaving ``node``."""
+        return range(self.offsets[node], self.offsets[node + 1])
+
+    def edge_index(self, u, v):
+        """Return the index of edge ``u -> v`` or -1 if there is none."""
+        targets = self.targets
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            if targets[e] == v:
+                return e
+        return -1
+
+    def nbytes(self):
+        """Approximate size of the adjacency and weight arrays in bytes."""
+        arrays = [self.offsets, self.targets, *self.weights.values(), self.lat, self.lng]
+        if self.directed:
+            arrays += [self.rev_offsets, self.rev_targets, self.rev_edges]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    @classmethod
+    def from_data(cls, data):
+        """Build the graph of a parsed data file, directed if it sets ``"directed": true``."""
+        return cls.from_routes(data["airports"], data["routes"], directed=data.get("directed", False))
+
+    @classmethod
+    def from_routes(cls, airports, routes, directed=False):
+        """Build the graph from the airport and route lists of the data file.
+
+        Without ``directed`` every route is inserted in both directions.
+        """
+        ids = [airport["id"] for airport in airports]
+        index = {airport_id: i for i, airport_id in enumerate(ids)}
+        n = len(ids)
+
+        # Collect edges keyed by (source, target); later routes overwrite
+        # earlier ones for the same ordered pair
+        edges = {}
+        for route in routes:
+            source = index.get(route["source"])
+            target = index.get(route["target"])
+
+            # Check for missing airports (should never happen, but just in case)
+            if source is None or target is None:
+                logger.warning(f"Invalid route: {route['source']} -> {route['target']}, skipping")
+                continue
+
+            distance = route["distance"]
+            cost = route["cost"]
+            # Calculate flight time in hours (assuming average speed of 800 km/h)
+            flight_time = distance / AVERAGE_SPEED_KMH
+
+            weights = (distance, cost, flight_time)
+            edges[source * n + target] = weights
+            if not directed:
+                # Add routes in both directions to ensure graph connectivity
+                edges[target * n + source] = weights
+
+        # Counting sort of the edges into CSR rows, keeping insertion order
+        offsets = array("q", bytes(8 * (n + 1)))
+        for key in edges:
+            offsets[key // n + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+
+        m = len(edges)
+        targets = array("i", bytes(4 * m))
+        weights = {metric: array("d", bytes(8 * m)) for metric in METRICS}
+        fill = array("q", offsets[:n])
+        for key, edge_weights in edges.items():
+            source, target = divmod(key, n)
+            e = fill[source]
+            fill[source] += 1
+            targets[e] = target
+            for metric, weight in zip(METRICS, edge_weights):
+                weights[metric][e] = weight
+
+        lat = array("d", (airport.get("lat", float("nan")) for airport in airports))
+        lng = array("d", (airport.get("lng", float("nan")) for airport in airports))
+        return cls(ids, offsets, targets, weights, lat, lng, directed=directed)
+
+
+def transpose(offsets, targets, n):
+    """The incoming edges of a CSR graph as ``(rev_offsets, rev_targets, rev_edges)``."""
+    m = len(targets)
+    rev_offsets = array("q", bytes(8 * (n + 1)))
+    for v in targets:
+        rev_offsets[v + 1] += 1
+    for i in range(n):
+        rev_offsets[i + 1] += rev_offsets[i]
+
+    rev_targets = array("i", bytes(4 * m))
+    rev_edges = array("i", bytes(4 * m))
+    fill = array("q", rev_offsets[:n])
+    for u in range(n):
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            i = fill[v]
+            fill[v] += 1
+            rev_targets[i] = u
+            rev_edges[i] = e
+    return rev_offsets, rev_targets, rev_edges
+
+
+def reverse_weights(graph, metric):
+    """Weights of ``metric`` in the order of the reverse CSR, built on first use.
+
+    An undirected graph is its own reverse, so its weights serve as they are.
+    """
+    if not graph.directed:
+        return graph.weights[metric]
+    key = ("reverse_weights", metric)
+    weights = graph.derived.get(key)
+    if weights is None:
+        forward = graph.weights[metric]
+        weights = graph.derived[key] = array("d", (forward[e] for e in graph.rev_edges))
+    return weights
+
+
+class SearchScratch:
+    """Reusable per-thread buffers for searches over graphs of a given size.
+
+    Entries are only valid when their stamp equals the current generation,
+    so starting a new search is O(1) instead of reinitialising every array.
+    """
+
+    __slots__ = ("size", "generation", "dist", "prev", "prev_edge", "reached", "settled")
+
+    def __init__(self, size):
+        self.size = size
+        self.generation = 0
+        self.dist = array("d", bytes(8 * size))
+        self.prev = array("i", bytes(4 * size))
+        self.prev_edge = array("q", bytes(8 * size))
+        self.reached = array("I", bytes(4 * size))
+        self.settled = array("I", bytes(4 * size))
+
+    def next_generation(self):
+        self.generation += 1
+        if self.generation >= 0xFFFFFFFF:
+            # Stamps would wrap around; clear them and start over
+            self.reached = array("I", bytes(4 * self.size))
+            self.settled = array("I", bytes(4 * self.size))
+            self.generation = 1
+        return self.generation
+
+
+_local = threading.local()
+
+
+class SearchCounters:
+    """Running totals of search work across all threads, for /metrics.
+
+    Searches count in locals and call ``add`` once when they finish, so the
+    lock is taken once per search rather than once per node.
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.settled = 0
+        self.pushes = 0
+        self._lock = threading.Lock()
+
+    def add(self, settled, pushes, searches=1):
+        with self._lock:
+            self.searches += searches
+            self.settled += settled
+            self.pushes += pushes
+
+    def totals(self):
+        with self._lock:
+            return {"searches": self.searches, "settled": self.settled, "pushes": self.pushes}
+
+
+search_counters = SearchCounters()
+
+
+def get_scratch(graph, slot=0):
+    """Return this thread's scratch buffers, sized for ``graph``.
+
+    Searches that need several independent sets of buffers at once, such as
+    the two halves of a bidirectional search, use different ``slot`` numbers.
+    """
+    pool = getattr(_local, "scratch", None)
+    if pool is None:
+        pool = _local.scratch = {}
+    scratch = pool.get(slot)
+    if scratch is None or scratch.size != len(graph):
+        scratch = pool[slot] = SearchScratch(len(graph))
+    return scratch
+
+
+def path_totals(graph, edges):
+    """Sum cost, distance and time over a sequence of edge indices."""
+    weights = graph.weights
+    total_cost = sum(weights["cost"][e] for e in edges)
+    total_distance = sum(weights["distance"][e] for e in edges)
+    total_time = sum(weights["time"][e] for e in edges)
+    return total_cost, total_distance, total_time
+
+
+def dijkstra(graph, start, end, metric):
+    """Optimized Dijkstra's algorithm implementation."""
+    if start not in graph or end not in graph:
+        logger.error(f"Invalid airport IDs: start={start}, end={end}")
+        return [], 0, 0, 0
+
+    # Early exit if start and end are the same
+    if start == end:
+        return [start], 0, 0, 0
+
+    nodes, edges, _ = dijkstra_search(graph, graph.index[start], graph.index[end], metric)
+    # If end node wasn't reached
+    if not nodes:
+        return [], 0, 0, 0
+
+    path = [graph.ids[node] for node in nodes]
+    total_cost, total_distance, total_time = path_totals(graph, edges)
+    return path, total_cost, total_distance, total_time
+
+
+def dijkstra_search(graph, source, target, metric):
+    """Dijkstra between node indices using this thread's scratch buffers.
+
+    Returns ``(nodes, edges, settled)``: the node and edge index lists of the
+    shortest path (empty if unreachable) and the number of nodes settled.
+    """
+    scratch = get_scratch(graph)
+    gen = scratch.next_generation()
+    dist = scratch.dist
+    prev = scratch.prev
+    prev_edge = scratch.prev_edge
+    reached = scratch.reached
+    settled = scratch.settled
+
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights[metric]
+
+    dist[source] = 0.0
+    reached[source] = gen
+    priority_queue = [(0.0, source)]
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+    settled_count = 0
+    pushes = 1
+
+    # Dijkstra's algorithm main loop
+    while priority_queue:
+        current_distance, u = heappop(priority_queue)
+
+        if settled[u] == gen:
+            continue
+        settled[u] = gen
+        settled_count += 1
+
+        if u == target:  # Found the destination
+            break
+
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            if settled[v] == gen:
+                continue
+
+            distance = current_distance + weights[e]
+            if reached[v] != gen or distance < dist[v]:
+                reached[v] = gen
+                dist[v] = distance
+                prev[v] = u
+                prev_edge[v] = e
+                heappush(priority_queue, (distance, v))
+                pushes += 1
+
+    search_counters.add(settled_count, pushes)
+    if reached[target] != gen:
+        return [], [], settled_count
+
+    # Reconstruct path
+    nodes = [target]
+    edges = []
+    current = target
+    while current != source:
+        edges.append(prev_edge[current])
+        current = prev[current]
+        nodes.append(current)
+    nodes.reverse()
+    edges.reverse()
+    return nodes, edges, settled_count
+
+
+class ShortestPathTree:
+    """Single-source Dijkstra tree from ``source`` that is grown on demand.
+
+    ``settle(node)`` resumes the search until ``node`` is settled, so legs that
+    share a source reuse the work already done. ``dist`` holds infinity and
+    ``prev``/``prev_edge`` hold -1 for nodes that have not been reached.
+    ``order`` lists settled nodes in the order they settled.
+
+    A ``reverse`` tree of a directed graph follows edges backwards, so
+    ``dist`` holds distances *to* ``source``, ``prev`` the next node towards
+    it and ``prev_edge`` the index of the edge to that node. On an
+    undirected graph the two trees are the same.
+    """
+
+    __slots__ = ("graph", "source", "metric", "reverse", "dist", "prev", "prev_edge",
+                 "settled", "order", "_queue")
+
+    def __init__(self, graph, source, metric, reverse=False):
+        n = len(graph)
+        self.graph = graph
+        self.source = source
+        self.metric = metric
+        self.reverse = reverse and graph.directed
+        self.dist = array("d", [float("inf")]) * n
+        self.prev = array("i", [-1]) * n
+        self.prev_edge = array("q", [-1]) * n
+        self.settled = bytearray(n)
+        self.order = []
+        self.dist[source] = 0.0
+        self._queue = [(0.0, source)]
+        search_counters.add(0, 1)
+
+    @property
+    def complete(self):
+        return not self._queue
+
+    def reached(self, node):
+        return self.prev[node] != -1 or node == self.source
+
+    def settle(self, node=None):
+        """Grow the tree until ``node`` settles, or completely if ``node`` is None.
+
+        Returns whether ``node`` is reachable from the source.
+        """
+        settled = self.settled
+        if node is not None and settled[node]:
+            return True
+
+        dist = self.dist
+        prev = self.prev
+        prev_edge = self.prev_edge
+        order = self.order
+        queue = self._queue
+        graph = self.graph
+        if self.reverse:
+            offsets = graph.rev_offsets
+            targets = graph.rev_targets
+            weights = reverse_weights(graph, self.metric)
+            edge_ids = graph.rev_edges
+        else:
+            offsets = graph.offsets
+            targets = graph.targets
+            weights = graph.weights[self.metric]
+            edge_ids = None
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        already_settled = len(order)
+        pushes = 0
+
+        while queue:
+            current_distance, u = heappop(queue)
+            if settled[u]:
+                continue
+            settled[u] = 1
+            order.append(u)
+
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                if settled[v]:
+                    continue
+                distance = current_distance + weights[e]
+                if distance < dist[v]:
+                    dist[v] = distance
+                    prev[v] = u
+                    prev_edge[v] = e if edge_ids is None else edge_ids[e]
+                    heappush(queue, (distance, v))
+                    pushes += 1
+
+            if u == node:
+                break
+
+        # Growing a tree further is not a new search; only the work is counted
+        search_counters.add(len(order) - already_settled, pushes, searches=0)
+        return node is None or bool(settled[node])
+
+    def path_to(self, node):
+        """Return the node and edge index lists from the source to ``node``.
+
+        The lists of a reverse tree run against its edges; reversed, they are
+        the path from ``node`` to the source.
+        """
+        if not self.settle(node):
+            return [], []
+        nodes = [node]
+        edges = []
+        while node != self.source:
+            edges.append(self.prev_edge[node])
+            node = self.prev[node]
+            nodes.append(node)
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+    def first_hops(self):
+        """Return the first node after the source on the path to every node."""
+        self.settle()
+        hops = array("i", [-1]) * len(self.prev)
+        prev = self.prev
+        for node in self.order:
+            parent = prev[node]
+            if parent == -1:
+                continue
+            hops[node] = node if parent == self.source else hops[parent]
+        return hops
+
+
+def shortest_path_tree(graph, source, metric, reverse=False):
+    """Run Dijkstra from node index ``source`` until every reachable node settles."""
+    tree = ShortestPathTree(graph, source, metric, reverse)
+    tree.settle()
+    return tree
+
+
+class TreeCache:
+    """Shortest path trees keyed by (source, metric), shared across legs.
+
+    Routes of an undirected graph are inserted in both directions with equal
+    weights, so a tree rooted at either end of a leg can answer it. On a
+    directed graph only the tree rooted at the leg's source can.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.trees = {}
+
+    def settled(self):
+        """Total number of nodes settled by all cached trees."""
+        return sum(len(tree.order) for tree in self.trees.values())
+
+    def get(self, source, metric):
+        tree = self.trees.get((source, metric))
+        if tree is None:
+            tree = ShortestPathTree(self.graph, source, metric)
+            self.trees[(source, metric)] = tree
+        return tree
+
+    def leg(self, source, target, metric):
+        """Return the node and edge lists of the shortest path for one leg."""
+        if source == target:
+            return [source], []
+        if not self.graph.directed and (target, metric) in self.trees and (source, metric) not in self.trees:
+            nodes, _ = self.trees[(target, metric)].path_to(source)
+            nodes.reverse()
+            edges = [self.graph.edge_index(nodes[i], nodes[i + 1]) for i in range(len(nodes) - 1)]
+            return nodes, edges
+        return self.get(source, metric).path_to(target)
+
+
+def route_via(graph, waypoints, metric, trees=None):
+    """Shortest route visiting ``waypoints`` (airport IDs) in order.
+
+    Returns ``(path, total_cost, total_distance, total_time, failed_leg)``
+    where ``failed_leg`` is the first unreachable (source, target) pair or
+    None. Each distinct waypoint roots at most one tree, and a tree rooted at
+    a leg's end also serves the next leg, so k legs need about k/2 searches.
+    On a directed graph each leg needs the tree at its own source.
+    """
+    if trees is None:
+        trees = TreeCache(graph)
+    index = graph.index
+    nodes = [index[waypoints[0]]]
+    edges = []
+
+    for i in range(len(waypoints) - 1):
+        source = index[waypoints[i]]
+        target = index[waypoints[i + 1]]
+        # Root the search at the far end of the leg when nothing is cached,
+        # so the same tree answers the following leg too
+        if not graph.directed and (source, metric) not in trees.trees and source != target:
+            trees.get(target, metric)
+        leg_nodes, leg_edges = trees.leg(source, target, metric)
+        if not leg_nodes:
+            return [], 0, 0, 0, (waypoints[i], waypoints[i + 1])
+        nodes.extend(leg_nodes[1:])
+        edges.extend(leg_edges)
+
+    path = [graph.ids[node] for node in nodes]
+    total_cost, total_distance, total_time = path_totals(graph, edges)
+    return path, total_cost, total_distance, total_time, None
+
+
+class DisjointSets:
+    """Union-find over ``0..n-1`` with union by size and path halving."""
+
+    def __init__(self, n):
+        self.parent = array("i", range(n))
+        self.size = array("i", [1]) * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """Merge the sets of ``a`` and ``b``; returns False if they were already one."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return False
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return True
+
+    def labels(self):
+        """``(labels, sizes)``: sets numbered from 0 in order of their first element."""
+        numbers = {}
+        labels = array("i", bytes(4 * len(self.parent)))
+        sizes = []
+        for x in range(len(self.parent)):
+            root = self.find(x)
+            label = numbers.get(root)
+            if label is None:
+                label = numbers[root] = len(sizes)
+                sizes.append(self.size[root])
+            labels[x] = label
+        return labels, sizes
+
+
+class Components:
+    """Connected components of a graph: a label per node and the size of each.
+
+    Routes of an undirected graph are inserted in both directions, so these
+    are also the strongly connected components, and two airports are
+    reachable from each other exactly when their labels match. For a
+    directed graph ``connected_components`` gives the weakly connected
+    components: airports with different labels cannot reach each other, but
+    one with the same label may still be out of reach one way.
+    ``strongly_connected_components`` then tells those apart.
+    """
+
+    __slots__ = ("labels", "sizes")
+
+    def __init__(self, labels, sizes):
+        self.labels = labels
+        self.sizes = sizes
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def connected(self, u, v):
+        return self.labels[u] == self.labels[v]
+
+    def stats(self):
+        n = len(self.labels)
+        return {
+            "components": len(self.sizes),
+            "largest_component": max(self.sizes, default=0),
+            "isolated_airports": self.sizes.count(1),
+            "component_sizes": sorted(self.sizes, reverse=True)[:10],
+            # Chance that a random pair of airports has a route between them
+            "connected_pair_fraction": sum(size * size for size in self.sizes) / (n * n) if n else 0.0,
+        }
+
+
+def connected_components(graph):
+    """The (weakly) connected components of ``graph``, found with union-find on first use and cached."""
+    components = graph.derived.get("components")
+    if components is None:
+        sets = DisjointSets(len(graph))
+        offsets, targets = graph.offsets, graph.targets
+        union = sets.union
+        # Each route of an undirected graph is stored both ways; one direction is enough
+        directed = graph.directed
+        for u in range(len(graph)):
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                if v > u or directed:
+                    union(u, v)
+        components = graph.derived["components"] = Components(*sets.labels())
+    return components
+
+
+def strongly_connected_components(graph):
+    """The strongly connected components of ``graph``, found on first use and cached.
+
+    For an undirected graph these are the connected components. For a
+    directed one Kosaraju's algorithm runs over the forward and reverse CSR
+    arrays, and components are numbered in topological order: a route can
+    only lead from a component to one with a higher label.
+    """
+    if not graph.directed:
+        return connected_components(graph)
+    components = graph.derived.get("strong_components")
+    if components is None:
+        n = len(graph)
+        offsets, targets = graph.offsets, graph.targets
+
+        # Forward depth-first search, recording nodes as they finish
+        visited = bytearray(n)
+        finished = []
+        for root in range(n):
+            if visited[root]:
+                continue
+            visited[root] = 1
+            stack = [(root, offsets[root])]
+            while stack:
+                u, e = stack[-1]
+                if e < offsets[u + 1]:
+                    stack[-1] = (u, e + 1)
+                    v = targets[e]
+                    if not visited[v]:
+                        visited[v] = 1
+                        stack.append((v, offsets[v]))
+                else:
+                    stack.pop()
+                    finished.append(u)
+
+        # Backward searches from the last to finish each collect one component
+        rev_offsets, rev_targets = graph.rev_offsets, graph.rev_targets
+        labels = array("i", [-1]) * n
+        sizes = []
+        for root in reversed(finished):
+            if labels[root] >= 0:
+                continue
+            label = len(sizes)
+            labels[root] = label
+            stack = [root]
+            size = 0
+            while stack:
+                u = stack.pop()
+                size += 1
+                for e in range(rev_offsets[u], rev_offsets[u + 1]):
+                    v = rev_targets[e]
+                    if labels[v] < 0:
+                        labels[v] = label
+                        stack.append(v)
+            sizes.append(size)
+        components = graph.derived["strong_components"] = Components(labels, sizes)
+    return components
+
+
+def unreachable_leg(graph, waypoints):
+    """The first leg of ``waypoints`` (airport IDs) known to have no route, or None.
+
+    A leg between weakly connected components has none. On a directed graph
+    neither has one leading from a strongly connected component to one
+    earlier in topological order; legs between components the other way
+    round may still have no route, which only a search finds out.
+    """
+    labels = connected_components(graph).labels
+    strong = strongly_connected_components(graph).labels if graph.directed else None
+    index = graph.index
+    for source, target in zip(waypoints, waypoints[1:]):
+        u, v = index[source], index[target]
+        if labels[u] != labels[v] or (strong is not None and strong[u] > strong[v]):
+            return source, target
+    return None
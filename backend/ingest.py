@@ -0,0 +1,365 @@
+"""Streaming ingestion of raw route dumps: extract -> coordinates -> reduce in one command.
+
+Replaces running extract_airports.py, map_coordinates.py and
+reduce_connections.py one after another, each loading and rewriting the
+whole data set. Raw records are parsed incrementally, from a JSON array
+(with ``ijson`` when installed, else a chunked built-in parser) or from
+NDJSON, one record per line, and flow through the stages as generators.
+Airports are deduplicated as they are first seen; flight schedules are
+spooled to a temporary file; routes are written out as they arrive, in
+compact JSON. Memory grows with the number of airports, not the size of
+the dump.
+
+With ``--reduce`` the input is read twice: the first pass only collects
+airports, which is all the reduction needs to decide which routes to keep,
+and the second streams the routes through it; airports without coordinates
+are left out of a reduced network. Reducing needs NumPy.
+``--snapshot`` also writes the binary snapshot the server maps at startup
+(see binary_snapshot.py). ``--directed`` marks the data file as directed, so
+each record is a route one way only, with its own fares; routes the
+reduction adds are then written both ways.
+
+Usage: python ingest.py [--input FILE] [--output FILE] [--format auto|array|ndjson]
+                        [--reduce] [--seed N] [--workers N] [--snapshot FILE] [--directed]
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+
+try:
+    import ijson
+except ImportError:  # ijson is optional
+    ijson = None
+
+from binary_snapshot import write_snapshot
+from map_coordinates import AIRPORT_COORDINATES, geo_to_map_coordinates
+from reduce_connections import MIN_CONNECTIONS, NetworkReducer, located_airports, np
+from timetable import parse_time
+
+# Characters read from the input per chunk
+CHUNK_SIZE = 1 << 16
+
+# A record this long that still does not parse is treated as malformed input
+# rather than read into memory indefinitely
+MAX_RECORD_SIZE = 16 << 20
+
+# Kept routes are priced this many at a time before being written
+PRICE_BATCH = 10000
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# What may follow a number that the end of a chunk cut short
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]+")
+
+
+def _json_array(f):
+    """Yield the elements of the top-level JSON array in text file ``f``, a chunk at a time."""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    state = "start"
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of input inside the JSON array")
+            chunk = f.read(CHUNK_SIZE)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise ValueError("Expected a JSON array of records")
+            pos, state = pos + 1, "first"
+            continue
+        if char == "]" and state in ("first", "next"):
+            return
+        if state == "next":
+            if char != ",":
+                raise ValueError(f"Expected ',' or ']' in the JSON array, found {char!r}")
+            pos, state = pos + 1, "value"
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof or len(buffer) - pos > MAX_RECORD_SIZE:
+                raise
+            end = None
+        # A value running to the end of the buffer may continue in the next
+        # chunk, and so may a number cut short there, as in "12." + "5"
+        if end is None or not eof and (end == len(buffer) or (
+                isinstance(value, (int, float)) and _NUMBER_TAIL.fullmatch(buffer, end))):
+            chunk = f.read(CHUNK_SIZE)
+            buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+            continue
+        yield value
+        pos, state = end, "next"
+
+
+def detect_format(path):
+    """``"array"`` or ``"ndjson"``, judged by the first non-blank character of the file."""
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                raise ValueError(f"{path} is empty")
+            stripped = chunk.lstrip()
+            if stripped:
+                return "array" if stripped[0] == "[" else "ndjson"
+
+
+def read_records(path, fmt):
+    """Yield the raw records of ``path`` one at a time."""
+    if fmt == "ndjson":
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_number}: {e.msg}") from e
+    elif ijson is not None:
+        with open(path, "rb") as f:
+            yield from ijson.items(f, "item", use_float=True)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from _json_array(f)
+
+
+def extract(records, airports):
+    """Stage 1: yield ``(route, flight)`` per raw record; ``flight`` is None without a schedule.
+
+    New airports are added to ``airports`` as they are first seen. Records
+    may carry ``origin_lat``/``origin_lng`` (and ``destination_...``)
+    coordinates of their own.
+    """
+    for record in records:
+        for side in ("origin", "destination"):
+            airport_code = record[f"{side}_airport"]
+            if airport_code not in airports:
+                state = record[f"{side}_state"]
+                airport = {"id": airport_code, "name": f"{airport_code} ({state})", "state": state}
+                if f"{side}_lat" in record and f"{side}_lng" in record:
+                    airport["lat"] = record[f"{side}_lat"]
+                    airport["lng"] = record[f"{side}_lng"]
+                airports[airport_code] = airport
+
+        route = {
+            "source": record["origin_airport"],
+            "target": record["destination_airport"],
+            "distance": record["distance_km"],
+            "cost": record["flight_price_inr"],
+            "direct": record["direct_flight"] == "Yes",
+        }
+        flight = None
+        if "departure_time" in record and "arrival_time" in record:
+            for key in ("departure_time", "arrival_time"):
+                try:
+                    parse_time(record[key])
+                except ValueError as e:
+                    raise ValueError(f"Flight {record.get('flight_number') or ''} {route['source']}->"
+                                     f"{route['target']} {key}: {e}")
+            flight = {
+                "flight": record.get("flight_number"),
+                "source": record["origin_airport"],
+                "target": record["destination_airport"],
+                "departure": record["departure_time"],
+                "arrival": record["arrival_time"],
+                "cost": record["flight_price_inr"],
+            }
+        yield route, flight
+
+
+def locate(items, airports, missing):
+    """Stage 2: give each newly seen airport its known coordinates; collect the rest in ``missing``."""
+    seen = set()
+    for route, flight in items:
+        for airport_code in (route["source"], route["target"]):
+            if airport_code in seen:
+                continue
+            seen.add(airport_code)
+            airport = airports[airport_code]
+            known = AIRPORT_COORDINATES.get(airport_code)
+            if known is not None:
+                airport.update(lat=known["lat"], lng=known["lng"], name=known["name"])
+            elif "lat" not in airport:
+                missing.append(airport_code)
+        yield route, flight
+
+
+def thin(items, reducer):
+    """Stage 3: replace the routes the reduction does not keep with None."""
+    for route, flight in items:
+        yield reducer.keep(route), flight
+
+
+def project(airports):
+    """Add map ``x``/``y`` positions to every airport with coordinates."""
+    located = {airport["id"]: airport for airport in airports.values() if "lat" in airport}
+    if len(located) < 2:
+        return
+    for airport_code, position in geo_to_map_coordinates(located).items():
+        airports[airport_code].update(x=position["x"], y=position["y"])
+
+
+_encode = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+class _ArrayWriter:
+    """Write a compact JSON array one element at a time."""
+
+    def __init__(self, out):
+        self.out = out
+        self.count = 0
+
+    def write(self, value):
+        self.write_encoded(_encode(value))
+
+    def write_encoded(self, text):
+        self.out.write("," + text if self.count else text)
+        self.count += 1
+
+
+def _spool(spool, flight):
+    """Store ``flight`` as its encoded endpoints and record, tab-separated."""
+    spool.write(f"{_encode(flight['source'])}\t{_encode(flight['target'])}\t{_encode(flight)}\n")
+
+
+def ingest(input_file, output_file, fmt="auto", reduce_network=False, seed=None, workers=1, directed=False):
+    """Run the pipeline from ``input_file`` to ``output_file``; returns counts for reporting."""
+    if fmt == "auto":
+        fmt = detect_format(input_file)
+    airports = {}
+    missing = []
+    reducer = None
+    if reduce_network:
+        # First pass: the reduction only needs the airports to choose its routes
+        for _ in locate(extract(read_records(input_file, fmt), airports), airports, missing):
+            pass
+        reducer = NetworkReducer(list(airports.values()), seed=seed, workers=workers)
+
+    counts = {"records": 0, "routes": 0, "flights": 0}
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as out, \
+            tempfile.TemporaryFile("w+", encoding="utf-8") as flights_spool:
+        out.write('{"directed":true,"routes":[' if directed else '{"routes":[')
+        routes = _ArrayWriter(out)
+        items = locate(extract(read_records(input_file, fmt), airports), airports,
+                       missing if reducer is None else [])
+        if reducer is None:
+            for route, flight in items:
+                counts["records"] += 1
+                routes.write(route)
+                if flight is not None:
+                    _spool(flights_spool, flight)
+        else:
+            batch = []
+            for route, flight in thin(items, reducer):
+                counts["records"] += 1
+                if flight is not None:
+                    _spool(flights_spool, flight)
+                if route is None:
+                    continue
+                batch.append(route)
+                if len(batch) >= PRICE_BATCH:
+                    reducer.price(batch)
+                    for kept in batch:
+                        routes.write(kept)
+                    batch = []
+            added = reducer.repair() + reducer.connect()
+            if directed:
+                added += [{**route, "source": route["target"], "target": route["source"]} for route in added]
+            batch += added
+            reducer.price(batch)
+            for kept in batch:
+                routes.write(kept)
+            counts["routes_added"] = len(added)
+            counts["poorly_connected"] = [airport_id for airport_id, count in reducer.connections_count.items()
+                                          if count < MIN_CONNECTIONS]
+        counts["routes"] = routes.count
+        out.write("]")
+
+        # Flights go out after the routes so a reduction can drop those of removed routes
+        flights_spool.seek(0)
+        flights = None
+        for line in flights_spool:
+            source, target, flight = line.rstrip("\n").split("\t", 2)
+            if reducer is not None and not reducer.links(json.loads(source), json.loads(target)):
+                continue
+            if flights is None:
+                out.write(',"flights":[')
+                flights = _ArrayWriter(out)
+            flights.write_encoded(flight)
+        if flights is not None:
+            out.write("]")
+            counts["flights"] = flights.count
+
+        project(airports)
+        out.write(',"airports":[')
+        writer = _ArrayWriter(out)
+        # A reduced network leaves out airports it could not place, which would have no routes
+        for airport in airports.values() if reducer is None else located_airports(airports.values()):
+            writer.write(airport)
+        out.write("]}")
+    os.replace(tmp_file, output_file)
+
+    counts["airports"] = len(airports)
+    counts["airports_written"] = writer.count
+    counts["missing_coordinates"] = missing
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a raw route dump into the server's data file")
+    parser.add_argument("--input", default=os.path.join("data", "data.json"),
+                        help="raw records, as a JSON array or NDJSON")
+    parser.add_argument("--output", default=None,
+                        help="defaults to data/map_data.json, or data/reduced_map_data.json with --reduce")
+    parser.add_argument("--format", choices=("auto", "array", "ndjson"), default="auto")
+    parser.add_argument("--reduce", action="store_true", help="thin the network as reduce_connections.py does")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible reduction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="threads used for the reduction's nearest-neighbour search")
+    parser.add_argument("--snapshot", default=None, help="also write the binary snapshot of the output here")
+    parser.add_argument("--directed", action="store_true",
+                        help="keep each record's direction instead of routing both ways")
+    args = parser.parse_args()
+    output = args.output or os.path.join("data", "reduced_map_data.json" if args.reduce else "map_data.json")
+
+    if args.reduce and np is None:
+        print("Error: --reduce needs NumPy (pip install numpy)")
+        return
+
+    start = time.perf_counter()
+    try:
+        counts = ingest(args.input, output, fmt=args.format, reduce_network=args.reduce,
+                        seed=args.seed, workers=args.workers, directed=args.directed)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error processing {args.input}: {e!r}")
+        return
+
+    print(f"Read {counts['records']} records: {counts['airports']} unique airports")
+    if counts["missing_coordinates"]:
+        print(f"Warning: No coordinates found for {len(counts['missing_coordinates'])} airports: "
+              f"{', '.join(counts['missing_coordinates'][:20])}")
+    if args.reduce:
+        print(f"Kept {counts['routes'] - counts['routes_added']} routes and added {counts['routes_added']}")
+        if counts["airports_written"] < counts["airports"]:
+            print(f"Left out {counts['airports'] - counts['airports_written']} airports without coordinates")
+        if counts["poorly_connected"]:
+            print(f"{len(counts['poorly_connected'])} airports still have fewer than {MIN_CONNECTIONS} "
+                  f"connections: {', '.join(counts['poorly_connected'][:20])}")
+    print(f"Wrote {counts['routes']} routes and {counts['flights']} scheduled flights to {output} "
+          f"in {time.perf_counter() - start:.1f}s")
+    if args.snapshot:
+        write_snapshot(output, args.snapshot, force=True)
+        print(f"Wrote binary snapshot to {args.snapshot}")
+
+
+if __name__ == "__main__":
+    main()
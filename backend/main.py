@@ -1,14 +1,36 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
-from pydantic import BaseModel, field_validator
-import heapq
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, field_validator, model_validator
+import asyncio
 import logging
 import json
+import math
 import os
+import random
 from typing import List, Optional
 from functools import lru_cache
 
+from graph import (TreeCache, connected_components, reverse_weights, route_via, search_counters,
+                   strongly_connected_components, unreachable_leg)
+import payloads
+import profiling
+from metrics import CONTENT_TYPE, MetricsMiddleware, Registry
+from map_assets import load_map_assets
+from cache import ResultCache, SharedStore
+from contraction import DEFAULT_HIERARCHY_FILE
+from alternatives import alternative_routes
+from pareto import extremes, pareto_search
+from search import ASTAR_METRICS, STRATEGIES, great_circle_scale, landmarks, resolve_strategy
+from route_table import DEFAULT_TABLE_FILE
+from binary_snapshot import DEFAULT_SNAPSHOT_FILE
+from snapshot import DataSnapshot, SnapshotHolder, load_snapshot
+from spatial import airport_index
+from timetable import earliest_route, parse_departure
+from updates import OPERATIONS, RouteUpdater, UpdateQueueFull
+from search_pool import SearchBusy, SearchExecutor, SingleFlight, find_route
+from ratelimit import TokenBuckets
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,6 +46,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts and latencies per endpoint, served by /metrics
+metrics = Registry()
+app.add_middleware(
+    MetricsMiddleware,
+    requests=metrics.counter("http_requests_total", "HTTP requests by endpoint and status",
+                             ("method", "route", "status")),
+    latency=metrics.histogram("http_request_duration_seconds", "HTTP request latency by endpoint",
+                              ("method", "route")),
+)
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -34,41 +66,204 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 # Load airport and route data from JSON files
-DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "reduced_map_data.json")
+DATA_FILE = os.environ.get("DATA_FILE", os.path.join(os.path.dirname(__file__), "data", "reduced_map_data.json"))
+
+# Binary form of the data file (see binary_snapshot.py), mapped instead of
+# parsing the JSON when it was written from the current data file. Set to
+# an empty string to always load the JSON
+SNAPSHOT_FILE = os.environ.get("SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE)
+
+# Optional precomputed all-pairs route table (see route_table.py). When
+# PRECOMPUTE_ROUTES=1 the table is built while loading the data if it is
+# missing or stale.
+ROUTE_TABLE_FILE = os.environ.get("ROUTE_TABLE_FILE", DEFAULT_TABLE_FILE)
+PRECOMPUTE_ROUTES = os.environ.get("PRECOMPUTE_ROUTES", "0") == "1"
+
+# Optional contraction hierarchy (see contraction.py) enabling the "ch"
+# strategy; it is used only if built from the current data file
+HIERARCHY_FILE = os.environ.get("HIERARCHY_FILE", DEFAULT_HIERARCHY_FILE)
+
+# /airports and /routes change on reload, so clients always revalidate their ETag
+LIST_CACHE_CONTROL = "no-cache"
+
+# India map served by /india-map: browser cache lifetime in seconds, brotli
+# quality for the precompressed variant and whether to offer TopoJSON
+MAP_FILE = os.path.join(os.path.dirname(__file__), "data", "in.json")
+MAP_CACHE_MAX_AGE = int(os.environ.get("MAP_CACHE_MAX_AGE", "604800"))
+MAP_BROTLI_QUALITY = int(os.environ.get("MAP_BROTLI_QUALITY", "9"))
+MAP_TOPOJSON = os.environ.get("MAP_TOPOJSON", "1") == "1"
+
+# Reload the data automatically when the data file changes (see snapshot.py)
+WATCH_DATA_FILE = os.environ.get("WATCH_DATA_FILE", "0") == "1"
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", "2"))
+
+# Token required in the X-Admin-Token header by admin endpoints, if set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Default search strategy (see search.py); "auto" picks one per metric
+SEARCH_STRATEGY = os.environ.get("SEARCH_STRATEGY", "dijkstra")
+if SEARCH_STRATEGY != "auto" and SEARCH_STRATEGY not in STRATEGIES:
+    logger.warning("Unknown SEARCH_STRATEGY %r, using auto", SEARCH_STRATEGY)
+    SEARCH_STRATEGY = "auto"
+
+# With PROFILING=1 a /find-path request with ?profile= or an X-Profile header
+# ("cprofile" or "pyinstrument") gets a profile of its search in the response;
+# the admin token is required when ADMIN_TOKEN is set. PROFILE_SAMPLE_RATE
+# profiles that fraction of all searches and logs the report instead
+PROFILING = os.environ.get("PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+
+def warm_graph(snapshot):
+    """Precompute the airport index, components and search heuristics before the first request."""
+    airport_index(snapshot.graph)
+    connected_components(snapshot.graph)
+    strongly_connected_components(snapshot.graph)
+    for metric in ("cost", "distance"):
+        strategy = resolve_strategy(SEARCH_STRATEGY, metric)
+        if strategy == "astar":
+            great_circle_scale(snapshot.graph, metric)
+        elif strategy == "alt":
+            landmarks(snapshot.graph, metric)
+        elif strategy == "bidirectional":
+            reverse_weights(snapshot.graph, metric)
+
+def load_data():
+    snapshot = load_snapshot(DATA_FILE, ROUTE_TABLE_FILE, PRECOMPUTE_ROUTES, HIERARCHY_FILE, SNAPSHOT_FILE)
+    warm_graph(snapshot)
+    return snapshot
 
 try:
-    logger.info(f"Attempting to load data from {DATA_FILE}")
-    if not os.path.exists(DATA_FILE):
-        logger.error(f"Data file not found: {DATA_FILE}")
-        raise FileNotFoundError(f"Data file not found: {DATA_FILE}")
-        
-    with open(DATA_FILE, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-        
-    if 'airports' not in data or 'routes' not in data:
-        logger.error(f"Invalid data format in {DATA_FILE}: missing 'airports' or 'routes' keys")
-        raise ValueError(f"Invalid data format in {DATA_FILE}: missing required keys")
-        
-    airports = data['airports']
-    routes = data['routes']
-    
-    logger.info(f"Loaded {len(airports)} airports and {len(routes)} routes from {DATA_FILE}")
-    
-    # Log a sample of the data to verify structure
-    if airports and routes:
-        logger.info(f"Sample airport: {airports[0]}")
-        logger.info(f"Sample route: {routes[0]}")
+    initial_snapshot = load_data()
+    logger.info(f"Route data ready: {initial_snapshot.stats()}")
 except Exception as e:
     logger.error(f"Error loading data from {DATA_FILE}: {e}")
     # Fallback to empty data
-    airports = []
-    routes = []
+    initial_snapshot = DataSnapshot.empty()
+
+snapshots = SnapshotHolder(initial_snapshot, load_data)
+
+# Upper bound on the number of requests accepted by /find-paths
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", "10000"))
+
+# Cap on labels kept per airport by /find-path/pareto, bounding its latency
+PARETO_MAX_LABELS = int(os.environ.get("PARETO_MAX_LABELS", "16"))
+
+# Upper bound on k for /find-path/alternatives
+MAX_ALTERNATIVES = int(os.environ.get("MAX_ALTERNATIVES", "50"))
+
+# Most airports returned by /airports/nearest and /airports/within
+MAX_NEARBY_AIRPORTS = int(os.environ.get("MAX_NEARBY_AIRPORTS", "1000"))
+
+# /find-path result cache: entry limit (0 disables it), optional TTL in
+# seconds and optional SQLite file shared by all workers on the host
+ROUTE_CACHE_SIZE = int(os.environ.get("ROUTE_CACHE_SIZE", "4096"))
+ROUTE_CACHE_TTL = float(os.environ["ROUTE_CACHE_TTL"]) if os.environ.get("ROUTE_CACHE_TTL") else None
+ROUTE_CACHE_DB = os.environ.get("ROUTE_CACHE_DB")
+
+result_cache = ResultCache(
+    maxsize=ROUTE_CACHE_SIZE,
+    ttl=ROUTE_CACHE_TTL,
+    version=initial_snapshot.version,
+    store=SharedStore(ROUTE_CACHE_DB, ROUTE_CACHE_SIZE * 4, ROUTE_CACHE_TTL) if ROUTE_CACHE_DB else None,
+)
+def refresh_result_cache(snapshot):
+    """Drop results computed from older data as soon as new data is live.
+
+    After route updates only the results the changes could affect are dropped.
+    """
+    changes = snapshot.changes
+    if changes is not None and changes.base_version == result_cache.version:
+        result_cache.migrate(snapshot.version, changes.affects)
+    else:
+        result_cache.reset(snapshot.version)
+
+snapshots.on_swap(refresh_result_cache)
+
+# Searches for /find-path and its alternatives and Pareto variants:
+# SEARCH_WORKERS > 0 runs single-route, alternative and Pareto searches in
+# that many processes sharing the graph through shared memory, 0 in a thread
+# pool; schedule, profiled and batch searches always use threads. At most
+# SEARCH_QUEUE_SIZE may be queued or running before requests get a 503, and
+# SEARCH_TIMEOUT seconds (0 for none) bounds how long a request waits
+SEARCH_WORKERS = int(os.environ.get("SEARCH_WORKERS", "0"))
+SEARCH_QUEUE_SIZE = int(os.environ.get("SEARCH_QUEUE_SIZE", "64"))
+SEARCH_TIMEOUT = float(os.environ.get("SEARCH_TIMEOUT", "10")) or None
+search_executor = SearchExecutor(SEARCH_WORKERS, SEARCH_QUEUE_SIZE, SEARCH_TIMEOUT)
+search_executor.publish(initial_snapshot)
+snapshots.on_swap(search_executor.publish)
+
+# Identical /find-path searches running at the same time on the same data
+# version share one search
+in_flight = SingleFlight()
+
+# Searches per second each client may start, 0 for no limit; a client may
+# burst up to RATE_LIMIT_BURST at once. Clients are told apart by the
+# RATE_LIMIT_CLIENT_HEADER header when set (e.g. X-Forwarded-For behind a
+# proxy), else by their address. Clients can put anything in that header, so
+# the entry added by the outermost of RATE_LIMIT_PROXY_DEPTH trusted proxies,
+# counted from the right, is used
+RATE_LIMIT = float(os.environ.get("RATE_LIMIT", "0"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_CLIENT_HEADER = os.environ.get("RATE_LIMIT_CLIENT_HEADER")
+RATE_LIMIT_PROXY_DEPTH = max(1, int(os.environ.get("RATE_LIMIT_PROXY_DEPTH", "1")))
+rate_limiter = TokenBuckets(RATE_LIMIT, RATE_LIMIT_BURST) if RATE_LIMIT > 0 else None
+
+# Route updates posted to /admin/routes are applied in batches every
+# ROUTE_UPDATE_INTERVAL seconds; at most ROUTE_UPDATE_QUEUE_SIZE may wait.
+# They only change the process that receives them, so they are refused when
+# WEB_CONCURRENCY, the worker count uvicorn and gunicorn read, is above 1
+ROUTE_UPDATE_INTERVAL = float(os.environ.get("ROUTE_UPDATE_INTERVAL", "1"))
+ROUTE_UPDATE_QUEUE_SIZE = int(os.environ.get("ROUTE_UPDATE_QUEUE_SIZE", "100000"))
+SERVER_WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+route_updater = RouteUpdater(snapshots, ROUTE_UPDATE_INTERVAL, ROUTE_UPDATE_QUEUE_SIZE)
+
+def warm_payloads(snapshot):
+    """Serialize the /airports and /routes payloads before the first request needs them.
+
+    Snapshots made by route updates are left to encode on first request, as
+    update batches may follow each other faster than the payloads are read.
+    """
+    if snapshot.changes is not None:
+        return
+    for name in ("airports", "routes"):
+        payloads.full_payload(snapshot, name)
+
+warm_payloads(initial_snapshot)
+snapshots.on_swap(warm_payloads)
+
+class Coordinates(BaseModel):
+    lat: float
+    lng: float
+
+    @field_validator('lat')
+    @classmethod
+    def validate_lat(cls, v):
+        if not -90 <= v <= 90:
+            raise ValueError("lat must be between -90 and 90")
+        return v
+
+    @field_validator('lng')
+    @classmethod
+    def validate_lng(cls, v):
+        if not -180 <= v <= 180:
+            raise ValueError("lng must be between -180 and 180")
+        return v
 
 class PathRequest(BaseModel):
-    source: str
-    destination: str
-    layover: str | None = None  # Optional layover airport
+    # Airports are given by ID, or by coordinates to use the nearest airport
+    source: str | Coordinates
+    destination: str | Coordinates
+    layover: str | Coordinates | None = None  # Optional layover airport
+    layovers: List[str | Coordinates] = []  # Optional ordered stops, visited after `layover`
     metric: str = "cost"
+    strategy: str | None = None  # Search strategy, defaults to SEARCH_STRATEGY
+    # Earliest arrival over flight schedules, leaving at or after this time
+    # ("HH:MM" or minutes); the metric and strategy are then ignored
+    depart_after: int | str | None = None
+
+    def stops(self):
+        """All intermediate stops in visiting order."""
+        return ([self.layover] if self.layover else []) + self.layovers
     
     @field_validator('metric')
     @classmethod
@@ -77,252 +272,841 @@ class PathRequest(BaseModel):
             raise ValueError("Metric must be either 'cost' or 'distance'")
         return v
 
+    @field_validator('strategy')
+    @classmethod
+    def validate_strategy(cls, v):
+        if v is not None and v != 'auto' and v not in STRATEGIES:
+            raise ValueError(f"Strategy must be 'auto' or one of {', '.join(STRATEGIES)}")
+        return v
+
+    @field_validator('depart_after')
+    @classmethod
+    def validate_depart_after(cls, v):
+        return parse_departure(v) if v is not None else None
+
+class FlightLeg(BaseModel):
+    flight: Optional[str] = None
+    source: str
+    target: str
+    departure: str  # "HH:MM", with "+N" for later days
+    arrival: str
+
 class PathResponse(BaseModel):
     path: List[str]
     total_cost: float
     total_distance: float
     total_time: float
     error: Optional[str] = None
+    nodes_settled: Optional[int] = None
+    # Set for depart_after requests
+    departure: Optional[str] = None
+    arrival: Optional[str] = None
+    legs: Optional[List[FlightLeg]] = None
+    profile: Optional[str] = None  # Profiler report, when one was requested
+    
+class AlternativesRequest(BaseModel):
+    source: str
+    destination: str
+    metric: str = "cost"
+    k: int = 3  # Number of routes to return
+
+    @field_validator('metric')
+    @classmethod
+    def validate_metric(cls, v):
+        if v not in ['cost', 'distance']:
+            raise ValueError("Metric must be either 'cost' or 'distance'")
+        return v
+
+    @field_validator('k')
+    @classmethod
+    def validate_k(cls, v):
+        if not 1 <= v <= MAX_ALTERNATIVES:
+            raise ValueError(f"k must be between 1 and {MAX_ALTERNATIVES}")
+        return v
+
+class AlternativesResponse(BaseModel):
+    routes: List[PathResponse]
+    nodes_settled: int = 0
+    error: Optional[str] = None
+
+class ParetoRequest(BaseModel):
+    source: str
+    destination: str
+    max_labels: int = PARETO_MAX_LABELS  # Labels kept per airport during the search
+
+    @field_validator('max_labels')
+    @classmethod
+    def validate_max_labels(cls, v):
+        if not 1 <= v <= 1000:
+            raise ValueError("max_labels must be between 1 and 1000")
+        return v
+
+class RouteUpdate(BaseModel):
+    source: str
+    target: str
+    op: str = "set"  # "set" changes a route, "add" creates one, "remove" deletes it
+    cost: Optional[float] = None
+    distance: Optional[float] = None
+
+    @field_validator('op')
+    @classmethod
+    def validate_op(cls, v):
+        if v not in OPERATIONS:
+            raise ValueError(f"op must be one of {', '.join(OPERATIONS)}")
+        return v
+
+    @field_validator('cost', 'distance')
+    @classmethod
+    def validate_weight(cls, v):
+        if v is not None and not v >= 0:
+            raise ValueError("Route weights must be non-negative numbers")
+        return v
+
+    @model_validator(mode='after')
+    def validate_weights_for_op(self):
+        if self.op == "set" and self.cost is None and self.distance is None:
+            raise ValueError("set needs a cost or a distance")
+        if self.op == "add" and (self.cost is None or self.distance is None):
+            raise ValueError("add needs both a cost and a distance")
+        return self
+
+class ParetoResponse(BaseModel):
+    routes: List[PathResponse]
+    cheapest: Optional[int] = None  # Index into routes of the cheapest option
+    shortest: Optional[int] = None
+    fastest: Optional[int] = None
+    labels_settled: int = 0
+    truncated: bool = False  # Whether max_labels dropped some trade-off routes
+    error: Optional[str] = None
     
 # We'll return the GeoJSON directly as a Response instead of parsing it
 # class GeoJsonResponse(BaseModel):
 #     geojson: dict
 
-@lru_cache(maxsize=1)
-def build_graph():
-    """Build the airport graph with caching for better performance."""
-    graph = {}
-    
-    # Initialize the graph with all airports
-    for airport in airports:
-        graph[airport["id"]] = {}
-    
-    # Create connections for all routes
-    for route in routes:
-        source = route["source"]
-        target = route["target"]
-        distance = route["distance"]
-        cost = route["cost"]
-        
-        # Calculate flight time in hours (assuming average speed of 800 km/h)
-        flight_time = distance / 800  # Time in hours
-        
-        # Check for missing airports (should never happen, but just in case)
-        if source not in graph or target not in graph:
-            logger.warning(f"Invalid route: {source} -> {target}, skipping")
-            continue
-            
-        # Add routes in both directions to ensure graph connectivity
-        # We want to make sure all airports are reachable
-        graph[source][target] = {"distance": distance, "cost": cost, "time": flight_time}
-        graph[target][source] = {"distance": distance, "cost": cost, "time": flight_time}
-    
-    logger.info(f"Graph built with {len(graph)} airports and {len(routes)} routes (bidirectional)")
-    return graph
-
-def dijkstra(graph, start, end, metric):
-    """Optimized Dijkstra's algorithm implementation."""
-    if start not in graph or end not in graph:
-        logger.error(f"Invalid airport IDs: start={start}, end={end}")
-        return [], 0, 0, 0
-        
-    # Initialize data structures
-    distances = {node: float('infinity') for node in graph}
-    distances[start] = 0
-    priority_queue = [(0, start)]
-    previous = {node: None for node in graph}
-    visited = set()
-    
-    # Early exit if start and end are the same
-    if start == end:
-        return [start], 0, 0, 0
-    
-    # Dijkstra's algorithm main loop
-    while priority_queue:
-        current_distance, current_node = heapq.heappop(priority_queue)
+def shortest_route(snapshot, waypoints, metric, strategy="dijkstra", trees=None):
+    """Shortest route through ``waypoints`` in order.
+
+    Returns ``(path, total_cost, total_distance, total_time, failed_leg, nodes_settled)``.
+    Dijkstra answers from the route table when available and otherwise shares
+    search trees between legs via ``trees``; other strategies search each leg.
+    """
+    graph = snapshot.graph
+    strategy = resolve_strategy(strategy, metric)
+    table = snapshot.route_table
+    if strategy != "dijkstra" or (table is None and trees is None):
+        return find_route(graph, waypoints, metric, strategy)
 
-        if current_node == end:  # Found the destination
-            break
+    if table is None:
+        settled_before = trees.settled()
+        result = route_via(graph, waypoints, metric, trees)
+        return (*result, trees.settled() - settled_before)
 
-        if current_node in visited:
-            continue
+    path = [waypoints[0]]
+    total_cost = total_distance = total_time = 0
+    for leg_source, leg_target in zip(waypoints, waypoints[1:]):
+        leg_path, cost, distance, time = table.lookup(graph, leg_source, leg_target, metric)
+        if not leg_path:
+            return [], 0, 0, 0, (leg_source, leg_target), 0
+        path.extend(leg_path[1:])
+        total_cost += cost
+        total_distance += distance
+        total_time += time
+    return path, total_cost, total_distance, total_time, None, 0
 
-        visited.add(current_node)
+@app.on_event("startup")
+def watch_data_file():
+    if WATCH_DATA_FILE:
+        snapshots.watch(DATA_FILE, WATCH_INTERVAL)
 
-        for neighbor, edge_data in graph[current_node].items():
-            if neighbor in visited:
-                continue
+def asset_response(request, asset, cache_control, headers=None):
+    """Serve a precompressed asset, answering a matching If-None-Match with 304."""
+    encoding = asset.negotiate(request.headers.get("accept-encoding"))
+    headers = {
+        **(headers or {}),
+        "ETag": asset.etags[encoding],
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if asset.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
 
-            weight = edge_data[metric]
-            distance = current_distance + weight
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=asset.variants[encoding], media_type=asset.media_type, headers=headers)
 
-            if distance < distances[neighbor]:
-                distances[neighbor] = distance
-                previous[neighbor] = current_node
-                heapq.heappush(priority_queue, (distance, neighbor))
+def list_response(request, snapshot, name, fields, offset, limit, bbox):
+    """Serve ``snapshot.<name>`` whole from cached bytes, or a filtered page of it."""
+    records = getattr(snapshot, name)
+    if not records:
+        logger.warning("No %s data available!", name[:-1])
 
-    # If end node wasn't reached
-    if distances[end] == float('infinity'):
-        return [], 0, 0, 0
+    if fields is None and bbox is None and offset == 0 and limit is None:
+        logger.debug("Returning %d %s", len(records), name)
+        return asset_response(request, payloads.full_payload(snapshot, name), LIST_CACHE_CONTROL,
+                              {"X-Total-Count": str(len(records))})
 
-    # Reconstruct path
-    path = []
-    current = end
+    try:
+        selected_fields = payloads.parse_fields(fields)
+        box = payloads.parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    while current:
-        path.append(current)
-        current = previous[current]
+    headers = {
+        "ETag": payloads.query_etag(snapshot.version, name, selected_fields, offset, limit, box),
+        "Cache-Control": LIST_CACHE_CONTROL,
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
 
-    path.reverse()
+    if box is not None:
+        if name == "airports":
+            records = payloads.airports_in(records, box)
+        else:
+            records = payloads.routes_in(records, snapshot.graph, box)
+    records, total = payloads.page(records, selected_fields, offset, limit)
+    headers["X-Total-Count"] = str(total)
+    logger.debug("Returning %d of %d %s", len(records), total, name)
+    return Response(content=payloads.dumps(records), media_type="application/json", headers=headers)
 
-    # Calculate totals
-    total_cost = 0
-    total_distance = 0
-    total_time = 0
+@app.get("/airports")
+def get_airports(request: Request, fields: Optional[str] = None, offset: int = Query(0, ge=0),
+                 limit: Optional[int] = Query(None, ge=1), bbox: Optional[str] = None):
+    """All airports, or with ``fields``, ``offset``/``limit`` and ``bbox`` a projected page."""
+    return list_response(request, snapshots.current, "airports", fields, offset, limit, bbox)
 
-    for i in range(len(path) - 1):
-        current = path[i]
-        next_node = path[i + 1]
-        edge_data = graph[current][next_node]
-        total_cost += edge_data["cost"]
-        total_distance += edge_data["distance"]
-        total_time += edge_data["time"]
+def nearby_response(snapshot, matches, total):
+    """Airport records of ``(distance_km, node)`` matches, each with its ``distance_km``."""
+    airports = snapshot.airports
+    records = [{**airports[node], "distance_km": distance} for distance, node in matches]
+    return Response(content=payloads.dumps(records), media_type="application/json",
+                    headers={"X-Total-Count": str(total)})
 
-    return path, total_cost, total_distance, total_time
+@app.get("/airports/nearest")
+def get_nearest_airports(lat: float = Query(ge=-90, le=90), lng: float = Query(ge=-180, le=180),
+                         k: int = Query(5, ge=1, le=MAX_NEARBY_AIRPORTS)):
+    """The ``k`` airports nearest to a point by great-circle distance, nearest first."""
+    snapshot = snapshots.current
+    matches = airport_index(snapshot.graph).nearest(lat, lng, k)
+    return nearby_response(snapshot, matches, len(matches))
 
-@app.get("/airports")
-def get_airports():
-    logger.info(f"Returning {len(airports)} airports")
-    if not airports:
-        logger.warning("No airport data available!")
-    return airports
+@app.get("/airports/within")
+def get_airports_within(lat: float = Query(ge=-90, le=90), lng: float = Query(ge=-180, le=180),
+                        radius_km: float = Query(gt=0),
+                        limit: int = Query(MAX_NEARBY_AIRPORTS, ge=1, le=MAX_NEARBY_AIRPORTS)):
+    """Airports within ``radius_km`` of a point, nearest first; X-Total-Count counts all of them."""
+    snapshot = snapshots.current
+    matches = airport_index(snapshot.graph).within(lat, lng, radius_km)
+    return nearby_response(snapshot, matches[:limit], len(matches))
 
 @app.get("/routes")
-def get_routes():
-    logger.info(f"Returning {len(routes)} routes")
-    if not routes:
-        logger.warning("No route data available!")
-    return routes
-    
+def get_routes(request: Request, fields: Optional[str] = None, offset: int = Query(0, ge=0),
+               limit: Optional[int] = Query(None, ge=1), bbox: Optional[str] = None):
+    """All routes; ``bbox`` keeps routes with at least one endpoint inside the box."""
+    return list_response(request, snapshots.current, "routes", fields, offset, limit, bbox)
+
+@lru_cache(maxsize=1)
+def load_india_map():
+    """Read the India map once and precompute its compressed and TopoJSON variants."""
+    logger.info(f"Loading India map from: {MAP_FILE}")
+    if not os.path.exists(MAP_FILE):
+        logger.error(f"Map file not found: {MAP_FILE}")
+        raise FileNotFoundError(f"Map file not found: {MAP_FILE}")
+    return load_map_assets(MAP_FILE, brotli_quality=MAP_BROTLI_QUALITY, topojson=MAP_TOPOJSON)
+
+@app.on_event("startup")
+def prepare_india_map():
+    try:
+        load_india_map()
+    except Exception as e:
+        logger.error(f"Error preparing India map: {e}")
+
 @app.get("/india-map")
-def get_india_map():
+def get_india_map(request: Request, format: str = "geojson"):
+    """Serve the India map as GeoJSON, or as quantised TopoJSON with format=topojson."""
     try:
-        map_file = os.path.join(os.path.dirname(__file__), "data", "in.json")
-        logger.info(f"Loading India map from: {map_file}")
-        
-        if not os.path.exists(map_file):
-            logger.error(f"Map file not found: {map_file}")
-            raise HTTPException(status_code=404, detail="India map file not found")
-        
-        logger.info(f"Map file exists, size: {os.path.getsize(map_file)} bytes")
-            
-        with open(map_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Instead of parsing, just return the raw JSON content
-        return Response(content=content, media_type="application/json")
-            
+        assets = load_india_map()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="India map file not found")
     except Exception as e:
         logger.error(f"Error loading India GeoJSON map: {e}")
         raise HTTPException(status_code=500, detail=f"Could not load India map data: {str(e)}")
 
-@app.post("/find-path", response_model=PathResponse)
-def find_path(request: PathRequest):
+    asset = assets.get(format)
+    if asset is None:
+        raise HTTPException(status_code=404, detail=f"India map is not available as {format}")
+
+    return asset_response(request, asset, f"public, max-age={MAP_CACHE_MAX_AGE}")
+
+def resolve_places(snapshot, request):
+    """``request`` with any coordinates replaced by the ID of the nearest airport."""
+    places = [request.source, request.destination, request.layover, *request.layovers]
+    if not any(isinstance(place, Coordinates) for place in places):
+        return request
+
+    index = airport_index(snapshot.graph)
+
+    def nearest_id(place):
+        if not isinstance(place, Coordinates):
+            return place
+        nearest = index.nearest(place.lat, place.lng)
+        if not nearest:
+            raise HTTPException(status_code=404, detail="No airports with coordinates are loaded")
+        return snapshot.graph.ids[nearest[0][1]]
+
+    return request.model_copy(update={
+        "source": nearest_id(request.source),
+        "destination": nearest_id(request.destination),
+        "layover": nearest_id(request.layover),
+        "layovers": [nearest_id(place) for place in request.layovers],
+    })
+
+def begin_path(snapshot, request, use_cache=True):
+    """Validate a path request and look it up in the result cache.
+
+    Returns ``(result, cache_key, waypoints, strategy)`` where ``result`` is
+    set when the request is answered without a search. Raises HTTPException
+    for unknown airports.
+    """
+    graph = snapshot.graph
     source = request.source
     destination = request.destination
-    layover = request.layover
+    stops = request.stops()
     metric = request.metric
     
-    logger.info(f"Finding path from {source} to {destination} via {layover} optimizing for {metric}")
-
-    # Use the cached graph
-    graph = build_graph()
+    logger.debug("Finding path from %s to %s via %s optimizing for %s", source, destination, stops, metric)
 
     # Quick validation of airports
     if source not in graph:
-        logger.warning(f"Source airport not found: {source}")
+        logger.warning("Source airport not found: %s", source)
         raise HTTPException(status_code=404, detail=f"Source airport {source} not found")
 
     if destination not in graph:
-        logger.warning(f"Destination airport not found: {destination}")
+        logger.warning("Destination airport not found: %s", destination)
         raise HTTPException(status_code=404, detail=f"Destination airport {destination} not found")
         
-    if layover and layover not in graph:
-        logger.warning(f"Layover airport not found: {layover}")
-        raise HTTPException(status_code=404, detail=f"Layover airport {layover} not found")
+    for layover in stops:
+        if layover not in graph:
+            logger.warning("Layover airport not found: %s", layover)
+            raise HTTPException(status_code=404, detail=f"Layover airport {layover} not found")
+
+    strategy = request.strategy or SEARCH_STRATEGY
+    cache_key = (source, destination, tuple(stops), metric, strategy)
+    has_hierarchy = snapshot.hierarchy is not None and metric in snapshot.hierarchy.levels
+    if strategy == "ch" and not has_hierarchy and metric in snapshot.stale_hierarchy:
+        # Route updates outdated the hierarchy; answer exactly without it until the next reload
+        logger.debug("Contraction hierarchy for %s is stale, searching bidirectionally", metric)
+        strategy = "bidirectional"
+    elif strategy == "ch" and not has_hierarchy or strategy == "astar" and metric not in ASTAR_METRICS:
+        fallback = resolve_strategy("auto", metric)
+        logger.info("The %s strategy cannot search by %s, using %s", strategy, metric, fallback)
+        strategy = fallback
+    if request.depart_after is not None:
+        if snapshot.timetable is None:
+            raise HTTPException(status_code=400, detail="No flight schedules are loaded")
+        strategy = "connection-scan"
+        cache_key = (source, destination, tuple(stops), strategy, request.depart_after)
+    waypoints = [source, *stops, destination]
 
     # Early return for same source and destination
-    if source == destination:
-        logger.info(f"Source and destination are the same: {source}")
+    if source == destination and not stops:
+        logger.debug("Source and destination are the same: %s", source)
         return {
             "path": [source],
             "total_cost": 0,
             "total_distance": 0,
             "total_time": 0,
             "error": None
-        }
+        }, cache_key, waypoints, strategy
+
+    # Airports whose components rule out a route; answer without searching
+    failed_leg = unreachable_leg(graph, waypoints) if request.depart_after is None else None
+    if failed_leg is not None:
+        logger.debug("No path between %s and %s, their components rule it out", *failed_leg)
+        return no_path_result(request, failed_leg, 0), cache_key, waypoints, strategy
+
+    cached = result_cache.get(cache_key, snapshot.version) if use_cache else None
+    if cached is not None:
+        logger.debug("Cache hit for %s to %s via %s", source, destination, stops)
+        return {**cached, "nodes_settled": 0}, cache_key, waypoints, strategy
+    return None, cache_key, waypoints, strategy
+
+def no_path_result(request, failed_leg, nodes_settled):
+    error = "No valid path found between these airports"
+    if request.stops():
+        error = f"No valid path found between {failed_leg[0]} and {failed_leg[1]}"
+    return {
+        "error": error,
+        "path": [],
+        "total_cost": 0,
+        "total_distance": 0,
+        "total_time": 0,
+        "nodes_settled": nodes_settled
+    }
+
+def finish_path(snapshot, request, cache_key, strategy, route):
+    """Turn a ``shortest_route`` or ``earliest_route`` result into a response and cache it."""
+    path, total_cost, total_distance, total_time, failed_leg, nodes_settled, *legs = route
+
+    # Check if a valid path was found
+    if failed_leg:
+        logger.debug("No path found between %s and %s", failed_leg[0], failed_leg[1])
+        result = no_path_result(request, failed_leg, nodes_settled)
+        result_cache.put(cache_key, result, snapshot.version)
+        return result
+        
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Path found: %s, cost: %s, distance: %s, time: %s, settled %s nodes using %s",
+                     ' → '.join(path), total_cost, total_distance, total_time, nodes_settled, strategy)
+    result = {
+        "path": path,
+        "total_cost": total_cost,
+        "total_distance": total_distance,
+        "total_time": total_time,
+        "error": None,
+        "nodes_settled": nodes_settled
+    }
+    if legs:
+        legs = legs[0]
+        result["legs"] = legs
+        result["departure"] = legs[0]["departure"] if legs else None
+        result["arrival"] = legs[-1]["arrival"] if legs else None
+    result_cache.put(cache_key, result, snapshot.version)
+    return result
+
+def search_route(snapshot, request, waypoints, strategy, trees=None):
+    """Run the search for a validated path request in the calling thread."""
+    if request.depart_after is not None:
+        return earliest_route(snapshot.timetable, waypoints, request.depart_after)
+    return shortest_route(snapshot, waypoints, request.metric, strategy, trees)
+
+def solve_path(snapshot, request, trees=None):
+    """Answer a single path request in the calling thread."""
+    result, cache_key, waypoints, strategy = begin_path(snapshot, request)
+    if result is not None:
+        return result
 
-    # Find the shortest path
+    # Find the shortest path, sharing search trees between the legs
     try:
-        if layover:
-            logger.info(f"Finding path with layover at {layover}")
-            # First find path from source to layover
-            path1, cost1, distance1, time1 = dijkstra(graph, source, layover, metric)
-            if not path1 or path1[0] != source:
-                logger.warning(f"No path found from {source} to layover {layover}")
-                return {
-                    "error": f"No valid path found between {source} and layover {layover}",
-                    "path": [],
-                    "total_cost": 0,
-                    "total_distance": 0,
-                    "total_time": 0
-                }
-            
-            # Then find path from layover to destination
-            path2, cost2, distance2, time2 = dijkstra(graph, layover, destination, metric)
-            if not path2 or path2[0] != layover:
-                logger.warning(f"No path found from layover {layover} to {destination}")
-                return {
-                    "error": f"No valid path found between layover {layover} and {destination}",
-                    "path": [],
-                    "total_cost": 0,
-                    "total_distance": 0,
-                    "total_time": 0
-                }
-            
-            # Combine paths (remove duplicate layover)
-            path = path1[:-1] + path2  # Remove layover from first path to avoid duplication
-            total_cost = cost1 + cost2
-            total_distance = distance1 + distance2
-            total_time = time1 + time2
-            
-            logger.info(f"Found layover path: {' → '.join(path)}")
-            logger.info(f"Path details: cost={total_cost}, distance={total_distance}, time={total_time}")
+        route = search_route(snapshot, request, waypoints, strategy, trees)
+    except Exception as e:
+        logger.error(f"Error finding path: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to calculate path: {str(e)}")
+    return finish_path(snapshot, request, cache_key, strategy, route)
+
+def requested_profiler(profile, admin_token):
+    """The profiler a /find-path request asked for, or None; raises HTTPException if not allowed."""
+    if not profile:
+        return None
+    if not PROFILING:
+        raise HTTPException(status_code=403, detail="Profiling is disabled on this server")
+    check_admin_token(admin_token)
+    profiler = "cprofile" if profile in ("1", "true") else profile
+    if profiler not in profiling.available():
+        raise HTTPException(status_code=400,
+                            detail=f"Profiler must be one of {', '.join(profiling.available())}")
+    return profiler
+
+def limit_client(http_request, searches=1):
+    """Take ``searches`` from the client's rate limit; raises HTTPException 429 when it is used up."""
+    if rate_limiter is None:
+        return
+    client = None
+    if RATE_LIMIT_CLIENT_HEADER:
+        entries = [entry.strip() for entry in http_request.headers.get(RATE_LIMIT_CLIENT_HEADER, "").split(",")]
+        entries = [entry for entry in entries if entry]
+        if entries:
+            client = entries[-min(RATE_LIMIT_PROXY_DEPTH, len(entries))]
+    if client is None:
+        client = http_request.client.host if http_request.client else "unknown"
+    wait = rate_limiter.take(client, searches)
+    if wait:
+        logger.debug("Rate limiting %s for %.2fs", client, wait)
+        raise HTTPException(status_code=429, detail="Too many requests, try again shortly",
+                            headers={"Retry-After": str(math.ceil(wait))})
+
+async def off_loop_if_shared(fn, *args):
+    """Await ``fn(*args)``, in a thread when the result cache has a shared store.
+
+    Reading or writing the store is a SQLite query that may wait on disk or
+    another worker's write lock, which would stall the event loop.
+    """
+    if result_cache.store is None:
+        return fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+@app.post("/find-path", response_model=PathResponse)
+async def find_path(request: PathRequest, http_request: Request, profile: Optional[str] = None,
+                    x_profile: str | None = Header(default=None),
+                    x_admin_token: str | None = Header(default=None)):
+    """Find a route without blocking the event loop; searches run in the search executor.
+
+    Concurrent requests for the same route on the same data share one search;
+    the requests that joined it report no nodes settled.
+
+    With profiling enabled, ``?profile=`` or an ``X-Profile`` header runs the
+    search under a profiler, bypassing the result cache, and returns its report.
+    """
+    limit_client(http_request)
+    profiler = requested_profiler(profile or x_profile, x_admin_token)
+    # Use the current data snapshot for the whole request
+    snapshot = snapshots.current
+    request = resolve_places(snapshot, request)
+    result, cache_key, waypoints, strategy = await off_loop_if_shared(
+        begin_path, snapshot, request, profiler is None)
+    if result is not None:
+        return result
+
+    sampled = profiler is None and PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    metric = request.metric
+    report = None
+
+    async def search():
+        if request.depart_after is not None:
+            route = await search_executor.call(
+                earliest_route, snapshot.timetable, waypoints, request.depart_after)
         else:
-            path, total_cost, total_distance, total_time = dijkstra(graph, source, destination, metric)
-        
-        # Check if a valid path was found
-        if not path or path[0] != source:
-            logger.info(f"No path found between {source} and {destination}")
-            return {
-                "error": "No valid path found between these airports",
-                "path": [],
-                "total_cost": 0,
-                "total_distance": 0,
-                "total_time": 0
-            }
-            
-        logger.info(f"Path found: {' → '.join(path)}, cost: {total_cost}, distance: {total_distance}, time: {total_time}")
-        return {
-            "path": path,
-            "total_cost": total_cost,
-            "total_distance": total_distance,
-            "total_time": total_time,
-            "error": None
-        }
+            route = await search_executor.find_route(snapshot, waypoints, metric, strategy)
+        return await off_loop_if_shared(finish_path, snapshot, request, cache_key, strategy, route)
+
+    try:
+        if profiler is not None or sampled:
+            # Profiled in a search thread, whatever the executor mode
+            route, report = await search_executor.call(
+                profiling.profiled, profiler or "cprofile", search_route, snapshot, request, waypoints, strategy)
+        elif request.depart_after is None and snapshot.route_table is not None \
+                and resolve_strategy(strategy, metric) == "dijkstra":
+            # Table lookups are cheap enough to answer inline
+            route = shortest_route(snapshot, waypoints, metric, strategy)
+        else:
+            result, shared = await in_flight.do((cache_key, snapshot.version), search)
+            return {**result, "nodes_settled": 0} if shared else result
+    except SearchBusy as e:
+        logger.warning("Rejecting path request, search queue is full: %s", e)
+        raise HTTPException(status_code=503, detail="Too many searches in progress, try again shortly",
+                            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        logger.warning("Path search from %s to %s timed out", request.source, request.destination)
+        raise HTTPException(status_code=504, detail=f"Path search timed out after {SEARCH_TIMEOUT}s")
     except Exception as e:
         logger.error(f"Error finding path: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to calculate path: {str(e)}")
+    result = await off_loop_if_shared(finish_path, snapshot, request, cache_key, strategy, route)
+    if sampled and report is not None:
+        logger.info("Profile of path search from %s to %s via %s using %s:\n%s",
+                    request.source, request.destination, request.stops(), strategy, report)
+    elif profiler is not None:
+        # The cached result stays free of the report
+        result = {**result, "profile": report or "Not profiled: another search was being profiled"}
+    return result
+
+@app.post("/find-path/alternatives", response_model=AlternativesResponse)
+async def find_alternative_paths(request: AlternativesRequest, http_request: Request):
+    """Return the k best loopless routes for the requested metric, best first.
+
+    The search runs in the search executor, under its queue limit and timeout.
+    """
+    limit_client(http_request)
+    source = request.source
+    destination = request.destination
+    logger.debug("Finding %d alternative routes from %s to %s optimizing for %s",
+                 request.k, source, destination, request.metric)
+
+    snapshot = snapshots.current
+    graph = snapshot.graph
+    if source not in graph:
+        raise HTTPException(status_code=404, detail=f"Source airport {source} not found")
+    if destination not in graph:
+        raise HTTPException(status_code=404, detail=f"Destination airport {destination} not found")
+    if unreachable_leg(graph, [source, destination]):
+        return {"routes": [], "nodes_settled": 0, "error": "No valid path found between these airports"}
+
+    try:
+        routes, nodes_settled = await search_executor.on_graph(
+            snapshot, alternative_routes, source, destination, request.metric, request.k)
+    except SearchBusy as e:
+        logger.warning("Rejecting alternative routes request, search queue is full: %s", e)
+        raise HTTPException(status_code=503, detail="Too many searches in progress, try again shortly",
+                            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        logger.warning("Alternative routes search from %s to %s timed out", source, destination)
+        raise HTTPException(status_code=504, detail=f"Path search timed out after {SEARCH_TIMEOUT}s")
+    except Exception as e:
+        logger.error(f"Error finding alternative routes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to calculate routes: {str(e)}")
+
+    if not routes:
+        return {"routes": [], "nodes_settled": nodes_settled,
+                "error": "No valid path found between these airports"}
+
+    logger.debug("Found %d alternative routes after settling %d nodes", len(routes), nodes_settled)
+    return {
+        "routes": [
+            {
+                "path": path,
+                "total_cost": total_cost,
+                "total_distance": total_distance,
+                "total_time": total_time,
+                "error": None
+            }
+            for path, total_cost, total_distance, total_time in routes
+        ],
+        "nodes_settled": nodes_settled,
+        "error": None
+    }
+
+@app.post("/find-path/pareto", response_model=ParetoResponse)
+async def find_pareto_paths(request: ParetoRequest, http_request: Request):
+    """Return every route not beaten on cost, distance and time at once.
+
+    The search runs in the search executor, under its queue limit and timeout.
+    """
+    limit_client(http_request)
+    source = request.source
+    destination = request.destination
+    logger.debug("Finding Pareto routes from %s to %s with max_labels=%d", source, destination, request.max_labels)
+
+    snapshot = snapshots.current
+    graph = snapshot.graph
+    if source not in graph:
+        raise HTTPException(status_code=404, detail=f"Source airport {source} not found")
+    if destination not in graph:
+        raise HTTPException(status_code=404, detail=f"Destination airport {destination} not found")
+    if unreachable_leg(graph, [source, destination]):
+        return {"routes": [], "labels_settled": 0, "truncated": False,
+                "error": "No valid path found between these airports"}
+
+    try:
+        routes, labels_settled, truncated = await search_executor.on_graph(
+            snapshot, pareto_search, graph.index[source], graph.index[destination], request.max_labels)
+    except SearchBusy as e:
+        logger.warning("Rejecting Pareto routes request, search queue is full: %s", e)
+        raise HTTPException(status_code=503, detail="Too many searches in progress, try again shortly",
+                            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        logger.warning("Pareto routes search from %s to %s timed out", source, destination)
+        raise HTTPException(status_code=504, detail=f"Path search timed out after {SEARCH_TIMEOUT}s")
+    except Exception as e:
+        logger.error(f"Error finding Pareto routes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to calculate routes: {str(e)}")
+
+    if not routes:
+        return {"routes": [], "labels_settled": labels_settled, "truncated": truncated,
+                "error": "No valid path found between these airports"}
+
+    best = extremes(routes)
+    logger.debug("Found %d Pareto routes after settling %d labels", len(routes), labels_settled)
+    return {
+        "routes": [
+            {
+                "path": [graph.ids[node] for node in nodes],
+                "total_cost": cost,
+                "total_distance": distance,
+                "total_time": flight_time,
+                "error": None
+            }
+            for nodes, (cost, distance, flight_time) in routes
+        ],
+        "cheapest": best["cost"],
+        "shortest": best["distance"],
+        "fastest": best["time"],
+        "labels_settled": labels_settled,
+        "truncated": truncated,
+        "error": None
+    }
+
+@app.post("/find-paths")
+async def find_paths(requests: List[PathRequest], http_request: Request):
+    """Answer a batch of path requests as an NDJSON stream.
+
+    Requests are grouped by (source, metric) and every group is answered from
+    one shared single-source search tree, in one call to the search executor
+    under its queue limit and timeout. Lines are emitted group by group and
+    carry the ``index`` of their request in the submitted list. Each group is
+    one search against the client's rate limit; with rate limiting on, a
+    batch of more than RATE_LIMIT_BURST groups can never be admitted and gets
+    a 413.
+    """
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size is limited to {MAX_BATCH_SIZE} requests")
+
+    snapshot = snapshots.current
+    requests = [resolve_places(snapshot, request) for request in requests]
+    groups = {}
+    for i, request in enumerate(requests):
+        groups.setdefault((request.source, request.metric), []).append(i)
+
+    if rate_limiter is not None and len(groups) > rate_limiter.burst:
+        # No client ever holds more than a burst of tokens, so waiting would not help
+        logger.warning("Rejecting batch of %d searches, more than the rate limit burst of %d",
+                       len(groups), rate_limiter.burst)
+        raise HTTPException(status_code=413, detail=f"Batch needs {len(groups)} searches, more than the rate "
+                                                    f"limit burst of {rate_limiter.burst}; split it into "
+                                                    "smaller batches")
+    limit_client(http_request, len(groups))
+
+    logger.debug("Finding %d paths in %d (source, metric) groups", len(requests), len(groups))
+
+    async def results():
+        for indices in groups.values():
+            try:
+                answers = await search_executor.call(solve_batch_group, snapshot, requests, indices)
+            except SearchBusy:
+                answers = [(i, batch_error("Too many searches in progress, try again shortly")) for i in indices]
+            except asyncio.TimeoutError:
+                answers = [(i, batch_error(f"Path search timed out after {SEARCH_TIMEOUT}s")) for i in indices]
+            for i, result in answers:
+                yield json.dumps({"index": i, **result}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def solve_batch_group(snapshot, requests, indices):
+    """Answer one (source, metric) group of a /find-paths batch in the calling thread.
+
+    The group's requests share one ``TreeCache`` rooted at their source.
+    Returns ``(index, result)`` pairs in the order of ``indices``.
+    """
+    graph = snapshot.graph
+    trees = TreeCache(graph)
+    answers = []
+    for i in indices:
+        request = requests[i]
+        try:
+            if request.source in graph:
+                trees.get(graph.index[request.source], request.metric)
+            result = solve_path(snapshot, request, trees)
+        except HTTPException as e:
+            result = batch_error(e.detail)
+        answers.append((i, result))
+    return answers
+
+def batch_error(detail):
+    """A /find-paths line for a request that could not be answered."""
+    return {
+        "error": detail,
+        "path": [],
+        "total_cost": 0,
+        "total_distance": 0,
+        "total_time": 0
+    }
+
+@app.get("/graph/stats")
+def get_graph_stats():
+    """Size and connectivity of the live route graph; ``strongly_connected`` differs only when directed."""
+    snapshot = snapshots.current
+    graph = snapshot.graph
+    return {"airports": len(graph), "edges": graph.num_edges, "directed": graph.directed,
+            "contraction_stale": sorted(snapshot.stale_hierarchy),
+            **connected_components(graph).stats(),
+            "strongly_connected": strongly_connected_components(graph).stats()}
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Hit, miss and eviction counters of the /find-path result cache."""
+    return result_cache.stats()
+
+@app.get("/search/stats")
+def get_search_stats():
+    """Queue depth, rejections and timeouts of the /find-path search executor, plus coalescing and rate limits."""
+    return {**search_executor.stats(), "coalescing": in_flight.stats(),
+            "rate_limit": rate_limiter.stats() if rate_limiter is not None else None}
+
+@metrics.collector
+def collect_service_metrics():
+    """Search, cache, executor and data figures read when /metrics is scraped."""
+    snapshot = snapshots.current
+    searches = search_counters.totals()
+    cache = result_cache.stats()
+    executor = search_executor.stats()
+    coalescing = in_flight.stats()
+    updates = route_updater.stats()
+    return [
+        ("search_runs_total", "counter", "Searches started, including shortest path trees", searches["searches"]),
+        ("search_nodes_settled_total", "counter", "Nodes settled by searches", searches["settled"]),
+        ("search_heap_pushes_total", "counter", "Priority queue pushes by searches", searches["pushes"]),
+        ("search_queue_depth", "gauge", "Searches queued or running in the search executor", executor["pending"]),
+        ("search_rejected_total", "counter", "Searches rejected because the queue was full", executor["rejected"]),
+        ("search_timeouts_total", "counter", "Searches that exceeded SEARCH_TIMEOUT", executor["timeouts"]),
+        ("search_in_flight", "gauge", "Distinct /find-path searches in progress", coalescing["in_flight"]),
+        ("search_coalesced_total", "counter", "/find-path requests that joined a search already in progress",
+         coalescing["coalesced"]),
+        ("rate_limited_total", "counter", "Search requests refused by the per-client rate limit",
+         rate_limiter.limited if rate_limiter is not None else 0),
+        ("route_cache_hits_total", "counter", "/find-path result cache hits", cache["hits"]),
+        ("route_cache_misses_total", "counter", "/find-path result cache misses", cache["misses"]),
+        ("route_cache_evictions_total", "counter", "/find-path result cache evictions", cache["evictions"]),
+        ("route_cache_entries", "gauge", "Entries in the /find-path result cache", cache["size"]),
+        ("route_data_build_seconds", "gauge", "Time taken to build the live data snapshot and its graph",
+         snapshot.build_seconds or 0.0),
+        ("route_data_loaded_timestamp_seconds", "gauge", "When the live data snapshot was built",
+         snapshot.loaded_at),
+        ("route_data_airports", "gauge", "Airports in the live graph", len(snapshot.graph)),
+        ("route_data_graph_edges", "gauge", "Directed edges in the live graph", snapshot.graph.num_edges),
+        ("route_data_components", "gauge", "Connected components of the live graph",
+         len(connected_components(snapshot.graph))),
+        ("route_data_strong_components", "gauge", "Strongly connected components of the live graph",
+         len(strongly_connected_components(snapshot.graph))),
+        ("route_updates_applied_total", "counter", "Route updates applied to the live data", updates["applied"]),
+        ("route_updates_pending", "gauge", "Route updates waiting for the next batch", updates["pending"]),
+    ]
+
+@app.get("/metrics")
+def get_metrics():
+    """Request, search, cache and data metrics in the Prometheus text format."""
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+@app.on_event("shutdown")
+def stop_search_executor():
+    search_executor.shutdown()
+
+def check_admin_token(token):
+    if ADMIN_TOKEN and token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/reload", status_code=202)
+def reload_data(x_admin_token: str | None = Header(default=None)):
+    """Rebuild the data snapshot from the data file in the background."""
+    check_admin_token(x_admin_token)
+    if not snapshots.reload():
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+    logger.info("Started reloading route data")
+    return {"status": "started"}
+
+@app.get("/admin/reload")
+def get_reload_status(x_admin_token: str | None = Header(default=None)):
+    """State of the last reload and the size of the live snapshot."""
+    check_admin_token(x_admin_token)
+    return {"reload": snapshots.status, "snapshot": snapshots.current.stats()}
+
+@app.post("/admin/routes", status_code=202)
+def update_routes(updates: List[RouteUpdate], wait: bool = False,
+                  x_admin_token: str | None = Header(default=None)):
+    """Queue fare and route changes for the live data.
+
+    They are applied with the next batch, or before returning with ``wait``.
+    Changes last until the data file is reloaded. Only served by a single
+    server process, as other workers would keep the old routes.
+    """
+    check_admin_token(x_admin_token)
+    if SERVER_WORKERS > 1:
+        raise HTTPException(status_code=409,
+                            detail=f"Route updates need a single server process, not {SERVER_WORKERS}; "
+                                   "edit the data file instead")
+    try:
+        pending = route_updater.submit([update.model_dump() for update in updates])
+    except UpdateQueueFull as e:
+        logger.warning(f"Rejecting route updates, queue is full: {e}")
+        raise HTTPException(status_code=503, detail="Too many route updates queued, try again shortly",
+                            headers={"Retry-After": str(max(1, int(ROUTE_UPDATE_INTERVAL)))})
+    if wait:
+        route_updater.flush()
+        return {"status": "applied", "updates": route_updater.stats()}
+    return {"status": "queued", "pending": pending}
+
+@app.get("/admin/routes")
+def get_route_update_status(x_admin_token: str | None = Header(default=None)):
+    """Counters of the route update queue."""
+    check_admin_token(x_admin_token)
+    return route_updater.stats()
 
 if __name__ == "__main__":
     import uvicorn
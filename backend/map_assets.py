@@ -0,0 +1,248 @@
+"""Static map payloads served with precompressed variants and ETags.
+
+The map file is read once and kept in memory together with gzip and, when
+the ``brotli`` package is installed, brotli encodings. A quantised TopoJSON
+version of the GeoJSON, in which borders shared by two states are stored
+once, can be generated as a much smaller alternative.
+"""
+import gzip
+import hashlib
+import json
+import logging
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Preferred order when a client accepts several encodings equally
+ENCODINGS = ("br", "gzip", "identity")
+
+
+class StaticAsset:
+    """An in-memory payload with its compressed variants and strong ETags."""
+
+    def __init__(self, content, media_type="application/json", brotli_quality=9):
+        self.media_type = media_type
+        self.variants = {"identity": content, "gzip": gzip.compress(content, compresslevel=9)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(content, quality=brotli_quality)
+
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        # Each encoding is a different representation, so each gets its own strong ETag
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in self.variants
+        }
+
+    def sizes(self):
+        return {encoding: len(body) for encoding, body in self.variants.items()}
+
+    def negotiate(self, accept_encoding):
+        """Pick the best available encoding for an ``Accept-Encoding`` header."""
+        weights = {}
+        for part in (accept_encoding or "").split(","):
+            token, _, params = part.strip().partition(";")
+            token = token.strip().lower()
+            if not token:
+                continue
+            quality = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            weights[token] = quality
+
+        def quality(encoding):
+            if encoding in weights:
+                return weights[encoding]
+            if "*" in weights:
+                return weights["*"]
+            # Uncompressed is always acceptable but only chosen as a last resort
+            return 0.001 if encoding == "identity" else 0.0
+
+        # Highest quality wins; ties go to the earlier entry in ENCODINGS
+        candidates = [(quality(encoding), -rank, encoding)
+                      for rank, encoding in enumerate(ENCODINGS) if encoding in self.variants]
+        best_quality, _, best = max(candidates)
+        return best if best_quality > 0 else "identity"
+
+    def matches(self, if_none_match):
+        """Whether an ``If-None-Match`` header names any representation of this asset."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not tags.isdisjoint(self.etags.values())
+
+
+def quantize(geojson, quantization):
+    """Return the quantisation transform and a function mapping positions onto the grid."""
+    xs, ys = [], []
+    for feature in geojson["features"]:
+        for x, y in _positions(feature.get("geometry")):
+            xs.append(x)
+            ys.append(y)
+    x0, x1 = min(xs), max(xs)
+    y0, y1 = min(ys), max(ys)
+    kx = (x1 - x0) / (quantization - 1) or 1.0
+    ky = (y1 - y0) / (quantization - 1) or 1.0
+
+    def to_grid(position):
+        return (round((position[0] - x0) / kx), round((position[1] - y0) / ky))
+
+    transform = {"scale": [kx, ky], "translate": [x0, y0]}
+    return transform, to_grid, [x0, y0, x1, y1]
+
+
+def _positions(geometry):
+    if not geometry:
+        return
+    kind = geometry["type"]
+    coordinates = geometry["coordinates"]
+    if kind == "Point":
+        yield coordinates
+    elif kind in ("MultiPoint", "LineString"):
+        yield from coordinates
+    elif kind in ("MultiLineString", "Polygon"):
+        for line in coordinates:
+            yield from line
+    elif kind == "MultiPolygon":
+        for polygon in coordinates:
+            for ring in polygon:
+                yield from ring
+
+
+def geojson_to_topojson(geojson, quantization=10000, object_name="states"):
+    """Convert a GeoJSON FeatureCollection of (multi)polygons to quantised TopoJSON.
+
+    Rings are snapped to a ``quantization`` x ``quantization`` grid, which
+    drops points that collapse onto their neighbour. Rings are then cut at
+    junctions, the points where borders of different rings meet or part, so
+    a border shared by two states becomes one arc referenced from both.
+    """
+    transform, to_grid, bbox = quantize(geojson, quantization)
+
+    def snap(ring):
+        points = []
+        for position in ring:
+            point = to_grid(position)
+            if not points or points[-1] != point:
+                points.append(point)
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        # A ring needs at least three distinct corners to enclose an area
+        return points if len(points) >= 3 else None
+
+    # Snap every ring and remember where it belongs
+    features = []
+    rings = []
+    for feature in geojson["features"]:
+        geometry = feature.get("geometry") or {}
+        kind = geometry.get("type")
+        if kind == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif kind == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            logger.warning(f"Skipping unsupported geometry type {kind} in TopoJSON conversion")
+            continue
+        snapped = []
+        for polygon in polygons:
+            polygon_rings = []
+            for ring in polygon:
+                points = snap(ring)
+                if points is not None:
+                    polygon_rings.append(len(rings))
+                    rings.append(points)
+            if polygon_rings:
+                snapped.append(polygon_rings)
+        features.append((feature, kind, snapped))
+
+    # A point is a junction when it is seen with two different sets of neighbours
+    neighbours = {}
+    junctions = set()
+    for points in rings:
+        n = len(points)
+        for i, point in enumerate(points):
+            pair = frozenset((points[i - 1], points[(i + 1) % n]))
+            seen = neighbours.setdefault(point, pair)
+            if seen != pair:
+                junctions.add(point)
+
+    arcs = []
+    arc_index = {}
+
+    def add_arc(points):
+        key = tuple(points)
+        if key in arc_index:
+            return arc_index[key]
+        reverse = key[::-1]
+        if reverse in arc_index:
+            return ~arc_index[reverse]
+        arc_index[key] = len(arcs)
+        arcs.append(points)
+        return arc_index[key]
+
+    def cut(points):
+        cuts = [i for i, point in enumerate(points) if point in junctions]
+        if not cuts:
+            return [add_arc(points + [points[0]])]
+        # Rotate the ring to start at a junction and split it at every junction
+        start = cuts[0]
+        rotated = points[start:] + points[:start]
+        rotated.append(rotated[0])
+        offsets = [i - start for i in cuts] + [len(points)]
+        return [add_arc(rotated[a:b + 1]) for a, b in zip(offsets, offsets[1:])]
+
+    geometries = []
+    for feature, kind, polygons in features:
+        ring_arcs = [[cut(rings[r]) for r in polygon] for polygon in polygons]
+        if not ring_arcs:
+            continue
+        geometry = {"type": "Polygon", "arcs": ring_arcs[0]} if kind == "Polygon" \
+            else {"type": "MultiPolygon", "arcs": ring_arcs}
+        if "properties" in feature:
+            geometry["properties"] = feature["properties"]
+        if "id" in feature:
+            geometry["id"] = feature["id"]
+        geometries.append(geometry)
+
+    # Delta-encode the arcs, as TopoJSON expects for quantised topologies
+    encoded = []
+    for points in arcs:
+        x, y = points[0]
+        deltas = [[x, y]]
+        for px, py in points[1:]:
+            deltas.append([px - x, py - y])
+            x, y = px, py
+        encoded.append(deltas)
+
+    return {
+        "type": "Topology",
+        "bbox": bbox,
+        "transform": transform,
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": encoded,
+    }
+
+
+def load_map_assets(map_file, brotli_quality=9, topojson=True, quantization=10000):
+    """Read the map once and build its GeoJSON and optional TopoJSON assets."""
+    with open(map_file, "rb") as f:
+        content = f.read()
+
+    assets = {"geojson": StaticAsset(content, brotli_quality=brotli_quality)}
+    if topojson:
+        topology = geojson_to_topojson(json.loads(content), quantization=quantization)
+        topology_bytes = json.dumps(topology, separators=(",", ":")).encode("utf-8")
+        assets["topojson"] = StaticAsset(topology_bytes, brotli_quality=brotli_quality)
+
+    for name, asset in assets.items():
+        logger.info(f"Prepared {name} map asset from {map_file}: {asset.sizes()}")
+    return assets
@@ -0,0 +1,172 @@
+"""Prometheus-style metrics: counters, histograms and the /metrics text format.
+
+Request counts and latency histograms are recorded per endpoint by
+``MetricsMiddleware``, labelled with the route template rather than the
+raw path so the number of series stays bounded. Values kept elsewhere,
+such as cache and search statistics, are read at scrape time by collectors
+registered with ``Registry.collector``.
+"""
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds; most requests are answered in milliseconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _labels(self.label_names, labels), value) for labels, value in values]
+
+
+class Histogram:
+    """Observations counted into cumulative ``le`` buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label combination: per-bucket counts (the last is +Inf), sum
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        samples = []
+        names = self.label_names + ("le",)
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _labels(names, labels + (_number(bound),)), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.label_names, labels), total))
+            samples.append((f"{self.name}_count", _labels(self.label_names, labels), cumulative))
+        return samples
+
+
+class Registry:
+    """Metrics exposed together on one /metrics page."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect):
+        """Register ``collect()``, returning ``(name, kind, help, value)`` tuples at scrape time.
+
+        ``value`` is a number, or a dict of label tuples (as
+        ``((name, value), ...)``) to numbers for labelled series.
+        """
+        self._collectors.append(collect)
+        return collect
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+        for collect in self._collectors:
+            for name, kind, help_text, value in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if isinstance(value, dict):
+                    for labels, series_value in value.items():
+                        names, values = zip(*labels) if labels else ((), ())
+                        lines.append(f"{name}{_labels(names, values)} {_number(series_value)}")
+                else:
+                    lines.append(f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template."""
+
+    def __init__(self, app, requests, latency):
+        self.app = app
+        self.requests = requests
+        self.latency = latency
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # The router records the matched route in the scope
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            self.latency.observe(time.perf_counter() - start, method, endpoint)
+            self.requests.inc(1, method, endpoint, str(status))
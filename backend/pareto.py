@@ -0,0 +1,108 @@
+"""Multi-criteria route search returning the Pareto front of (cost, distance, time).
+
+A label is one partial route to a node with its three totals. Labels are
+popped in lexicographic order, so a popped label that no settled label at the
+same node dominates is itself Pareto-optimal and becomes permanent. Labels
+reaching the destination form the front; any label dominated by one of them
+is pruned early.
+
+In the bundled data flight time is derived from distance, so the front is
+effectively two-dimensional, but the search makes no use of that.
+"""
+import heapq
+
+# Order of the criteria in every label vector
+CRITERIA = ("cost", "distance", "time")
+
+
+def dominates(a, b):
+    """Whether criteria vector ``a`` is at least as good as ``b`` everywhere."""
+    return a[0] <= b[0] and a[1] <= b[1] and a[2] <= b[2]
+
+
+def _dominated(vector, front):
+    for other in front:
+        if dominates(other, vector):
+            return True
+    return False
+
+
+def pareto_search(graph, source, target, max_labels):
+    """Find the non-dominated routes between two node indices.
+
+    At most ``max_labels`` labels are kept per node, which bounds the search
+    but may drop some trade-off routes. Returns ``(routes, labels_settled,
+    truncated)`` where each route is ``(nodes, (cost, distance, time))``
+    ordered by cost, and ``truncated`` tells whether the cap dropped labels.
+    """
+    offsets = graph.offsets
+    targets = graph.targets
+    cost_w = graph.weights["cost"]
+    distance_w = graph.weights["distance"]
+    time_w = graph.weights["time"]
+
+    # Label storage: criteria, node and parent label index
+    vectors = [(0.0, 0.0, 0.0)]
+    label_nodes = [source]
+    parents = [-1]
+    settled = {}
+    front = []
+    front_vectors = []
+    truncated = False
+    labels_settled = 0
+
+    queue = [(0.0, 0.0, 0.0, 0)]
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+
+    while queue:
+        cost, distance, flight_time, label = heappop(queue)
+        vector = (cost, distance, flight_time)
+        node = label_nodes[label]
+
+        node_labels = settled.setdefault(node, [])
+        if _dominated(vector, node_labels) or _dominated(vector, front_vectors):
+            continue
+        if len(node_labels) >= max_labels:
+            truncated = True
+            continue
+        node_labels.append(vector)
+        labels_settled += 1
+
+        if node == target:
+            front.append(label)
+            front_vectors.append(vector)
+            continue
+
+        for e in range(offsets[node], offsets[node + 1]):
+            v = targets[e]
+            candidate = (cost + cost_w[e], distance + distance_w[e], flight_time + time_w[e])
+            if v in settled and _dominated(candidate, settled[v]):
+                continue
+            if _dominated(candidate, front_vectors):
+                continue
+            vectors.append(candidate)
+            label_nodes.append(v)
+            parents.append(label)
+            heappush(queue, (*candidate, len(vectors) - 1))
+
+    routes = []
+    for label in front:
+        nodes = []
+        current = label
+        while current != -1:
+            nodes.append(label_nodes[current])
+            current = parents[current]
+        nodes.reverse()
+        routes.append((nodes, vectors[label]))
+    return routes, labels_settled, truncated
+
+
+def extremes(routes):
+    """Index of the best route in ``routes`` for each criterion."""
+    if not routes:
+        return {}
+    return {
+        name: min(range(len(routes)), key=lambda i: routes[i][1][position])
+        for position, name in enumerate(CRITERIA)
+    }
@@ -0,0 +1,109 @@
+"""Serialized /airports and /routes payloads with projection, paging and bbox filters.
+
+The unfiltered list of each snapshot is encoded once, compressed and cached
+on the snapshot, so repeat requests only copy bytes. Filtered requests are
+encoded per request but carry an ETag derived from the data version and the
+query, so a client revalidating the same view gets a 304 without any work.
+``orjson`` is used for encoding when installed. Snapshots mapped from a
+binary file serve the record bytes stored in it.
+"""
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+from map_assets import StaticAsset
+
+# Lists change with every reload, so cheaper brotli than the static map
+PAYLOAD_BROTLI_QUALITY = 5
+
+
+def dumps(value):
+    """Encode ``value`` as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def full_payload(snapshot, name):
+    """The cached, precompressed asset holding every record of ``snapshot.<name>``."""
+    asset = snapshot.payloads.get(name)
+    if asset is None:
+        # A binary snapshot already holds the records encoded
+        content = snapshot.records.encoded(name) if snapshot.records is not None else None
+        if content is None:
+            # Concurrent first requests may both encode; either result is the same
+            content = dumps(getattr(snapshot, name))
+        asset = StaticAsset(content, brotli_quality=PAYLOAD_BROTLI_QUALITY)
+        snapshot.payloads[name] = asset
+    return asset
+
+
+def query_etag(version, *query):
+    """ETag for a filtered view of the data version ``version``."""
+    digest = hashlib.sha256(repr(query).encode("utf-8")).hexdigest()[:16]
+    return f'"{version[:16]}-{digest}"'
+
+
+def parse_fields(value):
+    """Split a ``fields=a,b`` parameter; returns None when absent."""
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    if not fields:
+        raise ValueError("fields must name at least one field")
+    return fields
+
+
+def parse_bbox(value):
+    """Parse ``bbox=min_lng,min_lat,max_lng,max_lat``; returns None when absent."""
+    if value is None:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValueError("bbox minimums must not exceed its maximums")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def _inside(bbox, lat, lng):
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+def airports_in(airports, bbox):
+    """Airports inside ``bbox``; those without coordinates are never inside."""
+    return [airport for airport in airports
+            if airport.get("lat") is not None and airport.get("lng") is not None
+            and _inside(bbox, airport["lat"], airport["lng"])]
+
+
+def routes_in(routes, graph, bbox):
+    """Routes with at least one endpoint inside ``bbox``."""
+    index = graph.index
+    lat = graph.lat
+    lng = graph.lng
+    selected = []
+    for route in routes:
+        for airport in (route["source"], route["target"]):
+            node = index.get(airport)
+            if node is not None and _inside(bbox, lat[node], lng[node]):
+                selected.append(route)
+                break
+    return selected
+
+
+def page(records, fields=None, offset=0, limit=None):
+    """Slice ``records`` and keep only ``fields``; returns ``(records, total)``."""
+    total = len(records)
+    end = total if limit is None else offset + limit
+    records = records[offset:end]
+    if fields is not None:
+        records = [{field: record[field] for field in fields if field in record}
+                   for record in records]
+    return records, total
@@ -0,0 +1,64 @@
+"""Profile a single call with cProfile or, when it is installed, pyinstrument.
+
+Used by /find-path to return a breakdown of one request's search on demand.
+pyinstrument is optional: ``pip install pyinstrument``.
+"""
+import cProfile
+import io
+import pstats
+import threading
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# Functions listed in a cProfile report, by cumulative time
+STATS_LINES = 30
+
+# pyinstrument sampling interval in seconds; searches often take milliseconds
+SAMPLE_INTERVAL = 0.0001
+
+# One profile at a time: Python 3.12+ refuses to start a second cProfile
+# while one is active, and overlapping profiles would mix their searches
+_lock = threading.Lock()
+
+
+def available():
+    """Profilers usable in this environment."""
+    return tuple(name for name in PROFILERS if name != "pyinstrument" or pyinstrument is not None)
+
+
+def profiled(profiler, fn, *args):
+    """Call ``fn(*args)`` under ``profiler``; returns ``(result, text report)``.
+
+    While another call is being profiled, ``fn`` runs unprofiled and the
+    report is None.
+    """
+    if profiler not in available():
+        raise ValueError(f"Profiler must be one of {', '.join(available())}")
+    if not _lock.acquire(blocking=False):
+        return fn(*args), None
+    try:
+        return _profiled(profiler, fn, *args)
+    finally:
+        _lock.release()
+
+
+def _profiled(profiler, fn, *args):
+    if profiler == "pyinstrument":
+        sampler = pyinstrument.Profiler(interval=SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            result = fn(*args)
+        finally:
+            sampler.stop()
+        return result, sampler.output_text(unicode=False, color=False)
+
+    profile = cProfile.Profile()
+    result = profile.runcall(fn, *args)
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).strip_dirs().sort_stats("cumulative").print_stats(STATS_LINES)
+    return result, out.getvalue()
@@ -0,0 +1,57 @@
+"""Per-client token bucket rate limiting for the search endpoints.
+
+Each client has a bucket holding up to ``burst`` tokens that refills at
+``rate`` tokens a second; a request takes one token per search it asks for
+and is refused when the bucket runs short. Buckets are kept for the most
+recently seen ``max_clients`` clients only. A client whose bucket was
+dropped has been idle long enough for it to be full anyway, unless the
+limiter is over capacity, when the oldest clients are reset early.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBuckets:
+    """Token buckets keyed by client, safe to use from several threads."""
+
+    def __init__(self, rate, burst, max_clients=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.allowed = 0
+        self.limited = 0
+        # client -> [tokens, last refill time], least recently seen first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client, tokens=1):
+        """Take ``tokens`` from ``client``'s bucket.
+
+        Returns 0.0 if allowed, else the seconds until enough tokens will
+        have accumulated; nothing is taken then. ``tokens`` must not be more
+        than ``burst``.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [float(self.burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= tokens:
+                bucket[0] -= tokens
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (tokens - bucket[0]) / self.rate
+
+    def stats(self):
+        with self._lock:
+            return {"rate": self.rate, "burst": self.burst, "clients": len(self._buckets),
+                    "allowed": self.allowed, "limited": self.limited}
@@ -1,13 +1,59 @@
+"""Reduce the full route network to a sparser, more realistic one.
+
+Every airport keeps its routes to the three nearest airports, one or two
+medium-range routes and usually one long-range route. Airports left with
+fewer than three connections are then linked to nearby well-connected
+airports, any components still apart are joined at their closest airports so
+the network is connected, and every route is re-priced by its length.
+Airports without coordinates cannot be placed, so they are left out of the
+output, and the script refuses to write a network that is still not
+connected.
+
+Nearest neighbours are found once, up front, on a coarse latitude/longitude
+grid: each airport is only compared with the airports in nearby cells, using
+vectorised haversine distances and ``argpartition``, so the stage scales to
+tens of thousands of airports. Grid cells are processed in chunks by
+``--workers`` threads; NumPy releases the GIL for the heavy lifting. NumPy
+is required.
+
+Usage: python reduce_connections.py [--input FILE] [--output FILE] [--seed N] [--workers N]
+"""
+import argparse
 import json
-import random
-import os
 import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from graph import DisjointSets, Graph, connected_components
+
+try:
+    import numpy as np
+except ImportError:  # Only needed to run the reduction, not by the server
+    np = None
+
+EARTH_RADIUS_KM = 6371
+
+# Routes kept to the nearest airports, the rank range medium-range routes are
+# drawn from and the chance of keeping one long-range route
+NEAREST = 3
+MID_RANGE = (3, 8)
+LONG_RANGE_PROBABILITY = 0.8
+
+# Airports with fewer connections are linked to nearby well-connected ones
+MIN_CONNECTIONS = 3
+
+# Neighbours found per airport; enough for both passes in all but sparse corners
+CANDIDATES = 16
+
+# Grid cells are sized to hold about this many airports on average
+AIRPORTS_PER_CELL = 8
 
 def calculate_distance(lat1, lng1, lat2, lng2):
     """Calculate the great circle distance between two points in kilometers."""
     # Convert to radians
     lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
-    
+
     # Haversine formula
     dlat = lat2 - lat1
     dlng = lng2 - lng1
@@ -16,180 +62,386 @@ def calculate_distance(lat1, lng1, lat2, lng2):
     r = 6371  # Radius of Earth in kilometers
     return c * r
 
+def haversine(lat1, lng1, lat2, lng2):
+    """Vectorised ``calculate_distance`` over NumPy arrays of degrees (broadcasting)."""
+    lat1, lng1, lat2, lng2 = (np.radians(values) for values in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _nearest_in_rows(lat, lng, rows, candidates, k):
+    """Sorted ``k`` nearest of ``candidates`` for each of ``rows``, excluding the row itself."""
+    distances = haversine(lat[rows][:, None], lng[rows][:, None], lat[candidates][None, :], lng[candidates][None, :])
+    distances[rows[:, None] == candidates[None, :]] = np.inf
+    k = min(k, len(candidates))
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(candidates) else \
+        np.broadcast_to(np.arange(len(candidates)), distances.shape)
+    part_distances = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_distances, axis=1, kind="stable")
+    return candidates[np.take_along_axis(part, order, axis=1)], np.take_along_axis(part_distances, order, axis=1)
+
+def nearest_neighbours(lat, lng, k=CANDIDATES, workers=1):
+    """The ``k`` nearest airports of every airport, by great-circle distance.
+
+    Returns ``(indices, distances)`` arrays of shape (n, k) sorted by
+    distance; rows of airports with fewer than ``k`` others are padded with
+    -1 and infinity. Each grid cell's airports are compared with those of
+    the surrounding block of cells, widened until it holds enough airports.
+    Rows whose k-th neighbour could lie outside that block fall back to a
+    comparison with every airport.
+    """
+    n = len(lat)
+    indices = np.full((n, k), -1, dtype=np.int64)
+    distances = np.full((n, k), np.inf)
+    if n < 2:
+        return indices, distances
+
+    lat0, lng0 = lat.min(), lng.min()
+    area = max(lat.max() - lat0, 1e-6) * max(lng.max() - lng0, 1e-6)
+    cell = math.sqrt(area * AIRPORTS_PER_CELL / n)
+    grid_rows = int((lat.max() - lat0) // cell) + 1
+    grid_cols = int((lng.max() - lng0) // cell) + 1
+    cell_row = ((lat - lat0) // cell).astype(np.int64)
+    cell_col = ((lng - lng0) // cell).astype(np.int64)
+    keys = cell_row * grid_cols + cell_col
+    order = np.argsort(keys, kind="stable")
+    occupied, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    members = {key: order[start:start + count] for key, start, count in zip(occupied.tolist(), starts, counts)}
+    # Longitude degrees shrink towards the poles; bound them by the widest latitude
+    km_per_degree = math.radians(1) * EARTH_RADIUS_KM
+    km_per_lng_degree = km_per_degree * math.cos(math.radians(min(90.0, np.abs(lat).max())))
+
+    def process(cell_keys):
+        for key in cell_keys:
+            rows = members[key]
+            r, c = divmod(key, grid_cols)
+            radius = 1
+            while True:
+                block = [members[i * grid_cols + j]
+                         for i in range(max(0, r - radius), min(grid_rows, r + radius + 1))
+                         for j in range(max(0, c - radius), min(grid_cols, c + radius + 1))
+                         if i * grid_cols + j in members]
+                candidates = np.concatenate(block)
+                covers_all = r - radius <= 0 and c - radius <= 0 and \
+                    r + radius >= grid_rows - 1 and c + radius >= grid_cols - 1
+                if len(candidates) > k or covers_all:
+                    break
+                radius += 1
+
+            found, found_distances = _nearest_in_rows(lat, lng, rows, candidates, k)
+            width = found.shape[1]
+            indices[rows, :width] = found
+            distances[rows, :width] = found_distances
+            if covers_all:
+                continue
+
+            # Anything outside the block is at least this far away
+            inf = np.inf
+            south = (lat[rows] - (lat0 + (r - radius) * cell)) * km_per_degree if r - radius > 0 else inf
+            north = ((lat0 + (r + radius + 1) * cell) - lat[rows]) * km_per_degree if r + radius + 1 < grid_rows else inf
+            west = (lng[rows] - (lng0 + (c - radius) * cell)) * km_per_lng_degree if c - radius > 0 else inf
+            east = ((lng0 + (c + radius + 1) * cell) - lng[rows]) * km_per_lng_degree if c + radius + 1 < grid_cols else inf
+            reach = np.minimum(np.minimum(south, north), np.minimum(west, east)) * 0.99
+            unsure = rows[distances[rows, k - 1] > reach]
+            if len(unsure):
+                found, found_distances = _nearest_in_rows(lat, lng, unsure, np.arange(n), k)
+                width = found.shape[1]
+                indices[unsure, :width] = found
+                distances[unsure, :width] = found_distances
+
+    cell_keys = occupied.tolist()
+    chunks = [cell_keys[i::max(1, workers)] for i in range(max(1, workers))]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(process, chunks))
+    # Fewer than k other airports: drop the padding the self-distance left behind
+    indices[~np.isfinite(distances)] = -1
+    return indices, distances
+
+def select_targets(neighbours, n, rng):
+    """Targets kept by each airport in the first pass, as an (n, 6) array padded with -1.
+
+    Columns hold the nearest airports, one or two medium-range picks and,
+    with ``LONG_RANGE_PROBABILITY``, a random airport beyond the medium range.
+    """
+    low, high = MID_RANGE
+    kept = np.full((n, NEAREST + 3), -1, dtype=np.int64)
+    kept[:, :NEAREST] = neighbours[:, :NEAREST]
+
+    # One or two distinct picks among the medium-range ranks
+    mid = neighbours[:, low:high]
+    keys = rng.random(mid.shape)
+    keys[mid < 0] = np.inf
+    picks = np.take_along_axis(mid, np.argsort(keys, axis=1)[:, :2], axis=1)
+    picks[rng.integers(1, 3, n) == 1, 1] = -1
+    kept[:, NEAREST:NEAREST + 2] = picks
+
+    # A long-range target: any airport beyond the medium range. Redraw the
+    # few that hit a nearby airport; the retries are bounded and the rest
+    # simply go without
+    if n > high + 1:
+        wanted = np.flatnonzero(rng.random(n) < LONG_RANGE_PROBABILITY)
+        nearby = neighbours[:, :high]
+        for _ in range(32):
+            if not len(wanted):
+                break
+            draws = rng.integers(0, n, len(wanted))
+            clash = (draws == wanted) | (nearby[wanted] == draws[:, None]).any(axis=1)
+            kept[wanted[~clash], -1] = draws[~clash]
+            wanted = wanted[clash]
+    return kept
+
+def price_routes(routes, lat, lng, index, rng):
+    """Set ``cost`` and ``distance`` of every route from its length, with random variation."""
+    priced = [route for route in routes
+              if index.get(route['source']) is not None and index.get(route['target']) is not None]
+    if not priced:
+        return
+    sources = np.array([index[route['source']] for route in priced])
+    targets = np.array([index[route['target']] for route in priced])
+    distance = haversine(lat[sources], lng[sources], lat[targets], lng[targets])
+
+    # Categorize routes by distance with more extreme pricing
+    short = distance < 500
+    medium = ~short & (distance < 1000)
+    base_cost = np.where(short, 1000, np.where(medium, 3500, 6000))
+    per_km = np.where(short, 12, np.where(medium, 8, 6))
+    spread = np.where(short, 0.4, np.where(medium, 0.3, 0.2))  # ±40%, ±30% and ±20% variation
+    total_cost = base_cost + np.floor(distance * per_km)
+    cost = np.floor(total_cost * rng.uniform(1 - spread, 1 + spread))
+
+    # More extreme express flight variations: 35-50% faster, 80-120% more expensive
+    express = rng.random(len(priced)) < 0.5
+    cost = np.where(express, np.floor(cost * rng.uniform(1.8, 2.2, len(priced))), cost)
+    flown = distance * np.where(express, rng.uniform(0.5, 0.65, len(priced)), rng.uniform(1.1, 1.3, len(priced)))
+
+    for route, route_cost, route_distance in zip(priced, cost.tolist(), flown.tolist()):
+        route['cost'] = int(route_cost)
+        route['distance'] = route_distance
+
+class NetworkReducer:
+    """The reduction applied to routes one at a time, for route lists too big to hold.
+
+    Only the airports are needed up front. ``keep`` decides whether a route
+    survives the first pass, ``repair`` and then ``connect`` return the extra
+    routes the later passes add, and ``price`` re-prices a batch of surviving routes.
+    """
+
+    def __init__(self, airports, seed=None, workers=1):
+        self.rng = np.random.default_rng(seed)
+        self.located = located_airports(airports)
+        self.index = {airport['id']: i for i, airport in enumerate(self.located)}
+        self.lat = np.array([airport['lat'] for airport in self.located], dtype=float)
+        self.lng = np.array([airport['lng'] for airport in self.located], dtype=float)
+        n = self.n = len(self.located)
+        self.neighbours, self.neighbour_km = nearest_neighbours(self.lat, self.lng, CANDIDATES, workers)
+        kept = select_targets(self.neighbours, n, self.rng)
+        self.kept_pairs = set((np.arange(n)[:, None] * n + kept)[kept >= 0].tolist())
+        self.connections_count = {airport['id']: 0 for airport in airports}
+        self.linked = set()
+
+    def keep(self, route):
+        """A copy of ``route`` if the first pass keeps it, otherwise None."""
+        source = self.index.get(route['source'])
+        target = self.index.get(route['target'])
+        if source is None or target is None or source * self.n + target not in self.kept_pairs:
+            return None
+        route_copy = route.copy()
+        route_copy['direct'] = True
+        self.connections_count[route['source']] += 1
+        self.connections_count[route['target']] += 1
+        self.linked.add(frozenset((source, target)))
+        return route_copy
+
+    def links(self, source_id, target_id):
+        """Whether a kept or added route joins the two airports, in either direction."""
+        source = self.index.get(source_id)
+        target = self.index.get(target_id)
+        return source is not None and target is not None and frozenset((source, target)) in self.linked
+
+    def repair(self):
+        """Second pass: link poorly connected airports to the nearest airports,
+        preferring well-connected ones. Each airport is visited once and only
+        scans a finite candidate list, so the pass always terminates.
+        """
+        new_routes = []
+        connections_count = self.connections_count
+        lat, lng, n = self.lat, self.lng, self.n
+        for airport in self.located:
+            airport_id = airport['id']
+            if connections_count[airport_id] >= MIN_CONNECTIONS:
+                continue
+            i = self.index[airport_id]
+
+            def link(candidates, well_connected_only):
+                for j in candidates:
+                    if connections_count[airport_id] >= MIN_CONNECTIONS:
+                        return
+                    target_id = self.located[j]['id']
+                    if frozenset((i, j)) in self.linked:
+                        continue
+                    if well_connected_only and connections_count[target_id] < MIN_CONNECTIONS:
+                        continue
+                    new_routes.append(self._link(i, j))
+
+            candidates = self.neighbours[i][self.neighbours[i] >= 0].tolist()
+            link(candidates, well_connected_only=True)
+            if connections_count[airport_id] < MIN_CONNECTIONS and len(candidates) < n - 1:
+                # The precomputed neighbours were not enough; rank every airport
+                row = haversine(lat[i], lng[i], lat, lng)
+                row[i] = np.inf
+                candidates = [j for j in np.argsort(row, kind="stable").tolist() if j != i]
+                link(candidates, well_connected_only=True)
+            # Too few well-connected airports around: settle for the nearest ones
+            link(candidates, well_connected_only=False)
+        return new_routes
+
+    def _link(self, i, j):
+        source, target = self.located[i], self.located[j]
+        self.connections_count[source['id']] += 1
+        self.connections_count[target['id']] += 1
+        self.linked.add(frozenset((i, j)))
+        return {
+            'source': source['id'],
+            'target': target['id'],
+            'distance': calculate_distance(source['lat'], source['lng'], target['lat'], target['lng']),
+            'direct': True
+        }
+
+    def _nearest_outside(self, members, labels, label):
+        """``(km, i, j)``: the closest pair from ``members`` to an airport outside ``label``."""
+        others = np.flatnonzero(labels != label)
+        best = (np.inf, -1, -1)
+        # Bound the distance matrix to a few million entries at a time
+        step = max(1, 4_000_000 // len(others))
+        for start in range(0, len(members), step):
+            rows = members[start:start + step]
+            found, found_km = _nearest_in_rows(self.lat, self.lng, rows, others, 1)
+            r = int(np.argmin(found_km[:, 0]))
+            if found_km[r, 0] < best[0]:
+                best = (float(found_km[r, 0]), int(rows[r]), int(found[r, 0]))
+        return best
+
+    def connect(self):
+        """Third pass: join the components the earlier passes left apart.
+
+        Each round links every component to the nearest airport outside it
+        (Boruvka's algorithm), so the rounds at most halve the number of
+        components until one is left. The neighbour lists usually hold that
+        airport; otherwise the component is compared with every other airport.
+        Airports without coordinates cannot be placed and stay unlinked.
+        """
+        new_routes = []
+        sets = DisjointSets(self.n)
+        for i, j in self.linked:
+            sets.union(i, j)
+        rows = np.arange(self.n)
+        while True:
+            labels, sizes = sets.labels()
+            if len(sizes) <= 1:
+                return new_routes
+            labels = np.frombuffer(labels, dtype=np.int32)
+            largest = int(np.argmax(sizes))
+
+            # Nearest neighbour of each airport that lies in another component
+            neighbours = self.neighbours
+            outside = (neighbours >= 0) & (labels[np.maximum(neighbours, 0)] != labels[:, None])
+            first = outside.argmax(axis=1)
+            km = np.where(outside.any(axis=1), self.neighbour_km[rows, first], np.inf)
+            # The best airport of each component: the first of its rows by (label, km)
+            order = np.lexsort((km, labels))
+            best_rows = order[np.r_[0, np.flatnonzero(np.diff(labels[order])) + 1]]
+
+            for label, i in enumerate(best_rows.tolist()):
+                if np.isfinite(km[i]):
+                    j = int(neighbours[i, first[i]])
+                elif label == largest:
+                    # Every other component links to something, so the largest may wait
+                    continue
+                else:
+                    _, i, j = self._nearest_outside(np.flatnonzero(labels == label), labels, label)
+                if sets.union(i, j):
+                    new_routes.append(self._link(i, j))
+
+    def price(self, routes):
+        """Update costs and times with more extreme variations."""
+        price_routes(routes, self.lat, self.lng, self.index, self.rng)
+
+def reduce_network(airports, routes, seed=None, workers=1):
+    """Return the reduced route list and the number of connections of each airport."""
+    reducer = NetworkReducer(airports, seed, workers)
+    new_routes = [kept for kept in map(reducer.keep, routes) if kept is not None]
+    new_routes += reducer.repair()
+    new_routes += reducer.connect()
+    reducer.price(new_routes)
+    return new_routes, reducer.connections_count
+
+def located_airports(airports):
+    """The airports the reduction can place, those with coordinates."""
+    return [airport for airport in airports if 'lat' in airport and 'lng' in airport]
+
+def count_components(airports, routes):
+    """The number of connected components of the network of ``airports`` and ``routes``."""
+    return len(connected_components(Graph.from_routes(airports, routes)))
+
 def main():
+    parser = argparse.ArgumentParser(description="Reduce the route network to a sparser one")
+    parser.add_argument("--input", default=os.path.join("data", "map_data.json"), help="route data to reduce")
+    parser.add_argument("--output", default=os.path.join("data", "reduced_map_data.json"),
+                        help="file to write the reduced network to")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible output")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="threads used for the nearest-neighbour search")
+    args = parser.parse_args()
+
+    if np is None:
+        print("Error: reduce_connections.py needs NumPy (pip install numpy)")
+        return
+
     # Load the current data
     try:
-        with open('data/map_data.json', 'r') as f:
+        with open(args.input, 'r') as f:
             data = json.load(f)
             airports = data['airports']
             routes = data['routes']
-            
-        print(f"Loaded {len(airports)} airports and {len(routes)} routes from map_data.json")
-        
-        # Create a list of all possible airport pairs
-        all_airport_ids = [airport['id'] for airport in airports]
-        
-        # Create a mapping of airport IDs to their details
-        airport_map = {airport['id']: airport for airport in airports}
-        
-        # Group routes by source airport
-        routes_by_source = {}
-        for route in routes:
-            source = route['source']
-            if source not in routes_by_source:
-                routes_by_source[source] = []
-            routes_by_source[source].append(route)
-        
-        # Create a new set of reduced routes
-        new_routes = []
-        
-        # Track connections for each airport to ensure minimum connectivity
-        connections_count = {airport_id: 0 for airport_id in all_airport_ids}
-        
-        # First pass: Create primary connections
-        for airport_id, airport_routes in routes_by_source.items():
-            # Calculate distances to all other airports
-            distances = []
-            for other_id in all_airport_ids:
-                if other_id == airport_id:
-                    continue
-                    
-                source_airport = airport_map[airport_id]
-                target_airport = airport_map[other_id]
-                
-                # Skip if coordinates are not available
-                if 'lat' not in source_airport or 'lng' not in source_airport or \
-                   'lat' not in target_airport or 'lng' not in target_airport:
-                    continue
-                
-                distance = calculate_distance(
-                    source_airport['lat'], source_airport['lng'],
-                    target_airport['lat'], target_airport['lng']
-                )
-                
-                distances.append((other_id, distance))
-            
-            # Sort by distance
-            distances.sort(key=lambda x: x[1])
-            
-            # Always keep at least 3 closest airports (increased from 2)
-            kept_targets = set([dist[0] for dist in distances[:3]])
-            
-            # Add 1-2 medium distance connections
-            mid_range = distances[3:8]
-            if mid_range:
-                num_mid = random.randint(1, 2)
-                mid_choices = random.sample(mid_range, min(num_mid, len(mid_range)))
-                kept_targets.update([dist[0] for dist in mid_choices])
-            
-            # Add 1 long distance connection with 80% probability (increased from 70%)
-            long_range = distances[8:]
-            if long_range and random.random() < 0.8:
-                kept_targets.add(random.choice(long_range)[0])
-            
-            # Filter and add routes
-            for route in airport_routes:
-                if route['target'] in kept_targets:
-                    route_copy = route.copy()
-                    route_copy['direct'] = True
-                    new_routes.append(route_copy)
-                    connections_count[route['source']] += 1
-                    connections_count[route['target']] += 1
-        
-        # Second pass: Add connections to poorly connected airports
-        poorly_connected = [aid for aid, count in connections_count.items() if count < 3]
-        while poorly_connected:
-            for airport_id in poorly_connected:
-                distances = []
-                for other_id in all_airport_ids:
-                    if other_id == airport_id:
-                        continue
-                    
-                    source_airport = airport_map[airport_id]
-                    target_airport = airport_map[other_id]
-                    
-                    if 'lat' in source_airport and 'lng' in source_airport and \
-                       'lat' in target_airport and 'lng' in target_airport:
-                        distance = calculate_distance(
-                            source_airport['lat'], source_airport['lng'],
-                            target_airport['lat'], target_airport['lng']
-                        )
-                        distances.append((other_id, distance))
-                
-                if distances:
-                    distances.sort(key=lambda x: x[1])
-                    # Add connections until minimum is met
-                    for target_id, distance in distances:
-                        if connections_count[airport_id] >= 3:
-                            break
-                        # Prefer connecting to well-connected airports
-                        if connections_count[target_id] >= 3:
-                            new_route = {
-                                'source': airport_id,
-                                'target': target_id,
-                                'distance': distance,
-                                'direct': True
-                            }
-                            new_routes.append(new_route)
-                            connections_count[airport_id] += 1
-                            connections_count[target_id] += 1
-            
-            # Update poorly connected list
-            poorly_connected = [aid for aid, count in connections_count.items() if count < 3]
-        
+
+        print(f"Loaded {len(airports)} airports and {len(routes)} routes from {args.input}")
+
+        new_routes, connections_count = reduce_network(airports, routes, seed=args.seed, workers=args.workers)
+
         print(f"Reduced routes from {len(routes)} to {len(new_routes)}")
-        print("Airport connections:", connections_count)
-        
-        # Update costs and times with more extreme variations
-        for route in new_routes:
-            source = airport_map[route['source']]
-            target = airport_map[route['target']]
-            
-            if 'lat' in source and 'lng' in source and 'lat' in target and 'lng' in target:
-                distance = calculate_distance(
-                    source['lat'], source['lng'],
-                    target['lat'], target['lng']
-                )
-                
-                # Categorize routes by distance with more extreme pricing
-                if distance < 500:  # Short routes
-                    base_cost = 1000
-                    distance_cost = int(distance * 12)  # Even higher per-km cost
-                    total_cost = base_cost + distance_cost
-                    variation = random.uniform(0.6, 1.4)  # ±40% variation
-                elif distance < 1000:  # Medium routes
-                    base_cost = 3500
-                    distance_cost = int(distance * 8)
-                    total_cost = base_cost + distance_cost
-                    variation = random.uniform(0.7, 1.3)  # ±30% variation
-                else:  # Long routes
-                    base_cost = 6000
-                    distance_cost = int(distance * 6)
-                    total_cost = base_cost + distance_cost
-                    variation = random.uniform(0.8, 1.2)  # ±20% variation
-                
-                # Apply the variation
-                route['cost'] = int(total_cost * variation)
-                
-                # More extreme express flight variations
-                if random.random() < 0.5:  # 50% chance of being an express route
-                    speed_factor = random.uniform(0.5, 0.65)  # 35-50% faster
-                    cost_factor = random.uniform(1.8, 2.2)  # 80-120% more expensive
-                    route['cost'] = int(route['cost'] * cost_factor)
-                    route['distance'] = distance * speed_factor
-                else:
-                    route['distance'] = distance * random.uniform(1.1, 1.3)  # 10-30% slower
-        
+        poorly_connected = [aid for aid, count in connections_count.items() if count < MIN_CONNECTIONS]
+        if poorly_connected:
+            print(f"{len(poorly_connected)} airports still have fewer than {MIN_CONNECTIONS} connections "
+                  f"(missing coordinates or too few airports): {', '.join(poorly_connected[:20])}")
+        if len(connections_count) <= 100:
+            print("Airport connections:", connections_count)
+
+        # Airports without coordinates have no routes left; they would only be isolated nodes
+        located = located_airports(airports)
+        if len(located) < len(airports):
+            print(f"Leaving out {len(airports) - len(located)} airports without coordinates")
+        components = count_components(located, new_routes)
+        if components > 1:
+            print(f"Error: the reduced network has {components} connected components, not writing {args.output}")
+            sys.exit(1)
+
         # Save the new data
+        data['airports'] = located
         data['routes'] = new_routes
-        with open('data/reduced_map_data.json', 'w') as f:
-            json.dump(data, f, indent=2)
-        
-        print(f"Saved reduced route network to data/reduced_map_data.json")
-        print("To use the new data, edit main.py to load from reduced_map_data.json instead of map_data.json")
-        
+        if 'flights' in data:
+            # Keep only the schedules of routes that survived
+            kept_pairs = {(route['source'], route['target']) for route in new_routes}
+            kept_pairs |= {(target, source) for source, target in kept_pairs}
+            data['flights'] = [flight for flight in data['flights']
+                               if (flight['source'], flight['target']) in kept_pairs]
+            print(f"Kept {len(data['flights'])} scheduled flights")
+        with open(args.output, 'w') as f:
+            json.dump(data, f, separators=(",", ":"))
+
+        print(f"Saved reduced route network to {args.output}")
+        print(f"The server loads data/reduced_map_data.json; set DATA_FILE={args.output} to serve another file")
+
     except Exception as e:
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,304 @@
+"""Precomputed all-pairs route table.
+
+For every metric the table stores an n x n distance matrix and an n x n
+next-hop matrix, so a shortest path can be read back hop by hop without
+running a search. The table is written to a single binary file that is
+memory-mapped on load; its header records the SHA-256 of the data file it
+was built from, so an unchanged graph is never recomputed.
+
+Route updates repair rows in memory on top of the mapped file. Once the
+repaired rows outgrow ``PATCHED_ROWS_BYTES`` they are folded into a copy of
+the file, which is mapped in the base table's place and unlinked straight
+away, so the rows held in memory stay bounded however long updates go on.
+
+Usage: python route_table.py [--data FILE] [--output FILE] [--workers N] [--force]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from graph import METRICS, Graph, path_totals, shortest_path_tree
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_DATA_FILE = os.path.join(DATA_DIR, "reduced_map_data.json")
+DEFAULT_TABLE_FILE = os.path.join(DATA_DIR, "route_table.bin")
+
+MAGIC = b"RTBL"
+FORMAT_VERSION = 1
+# magic, format version, header length
+PREAMBLE = struct.Struct("<4sII")
+
+# Rows a build worker computes per task batch
+ROWS_PER_CHUNK = 64
+
+# Memory that rows repaired by route updates may take before they are
+# folded into a new table file
+PATCHED_ROWS_BYTES = 64 << 20
+
+
+def file_sha256(path):
+    """Return the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RouteTable:
+    """Memory-mapped all-pairs distance and next-hop matrices."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported route table file: {path}")
+
+        offset = PREAMBLE.size
+        header = json.loads(bytes(self._mmap[offset:offset + header_length]))
+        self.source_sha256 = header["source_sha256"]
+        self.ids = header["ids"]
+        self.metrics = header["metrics"]
+
+        n = len(self.ids)
+        data_start = _align(offset + header_length)
+        self._layout = (data_start, header["sections"])
+        buffer = memoryview(self._mmap)
+        self.dist = {}
+        self.next_hop = {}
+        for metric, sections in header["sections"].items():
+            dist_offset, next_offset = (data_start + section for section in sections)
+            self.dist[metric] = buffer[dist_offset:dist_offset + 8 * n * n].cast("d")
+            self.next_hop[metric] = buffer[next_offset:next_offset + 4 * n * n].cast("i")
+
+    def matches(self, graph, source_sha256):
+        """Check that the table was built for this graph and data file."""
+        return self.source_sha256 == source_sha256 and self.ids == graph.ids
+
+    def row(self, metric, source):
+        """Distance and next-hop arrays from node index ``source`` to every node."""
+        n = len(self.ids)
+        start = source * n
+        return self.dist[metric][start:start + n], self.next_hop[metric][start:start + n]
+
+    def column(self, metric, target):
+        """Distances from every node to node index ``target``."""
+        return self.dist[metric][target::len(self.ids)]
+
+    def patched(self, rows):
+        """A copy with the rows in ``rows``, keyed by (metric, source), replaced.
+
+        Past ``PATCHED_ROWS_BYTES`` of replaced rows the copy is written out
+        and mapped as a plain table instead.
+        """
+        table = PatchedRouteTable(self, rows)
+        if len(table.rows) * 12 * len(self.ids) > PATCHED_ROWS_BYTES:
+            return table.compacted()
+        return table
+
+    def lookup(self, graph, start, end, metric):
+        """Return the path and totals between two airports, like ``dijkstra``."""
+        if start not in graph or end not in graph:
+            return [], 0, 0, 0
+        if start == end:
+            return [start], 0, 0, 0
+
+        target = graph.index[end]
+        node = graph.index[start]
+        if self.row(metric, node)[1][target] == -1:
+            return [], 0, 0, 0
+
+        nodes = [node]
+        edges = []
+        while node != target:
+            hop = self.row(metric, node)[1][target]
+            edges.append(graph.edge_index(node, hop))
+            node = hop
+            nodes.append(node)
+
+        path = [graph.ids[node] for node in nodes]
+        total_cost, total_distance, total_time = path_totals(graph, edges)
+        return path, total_cost, total_distance, total_time
+
+
+class PatchedRouteTable(RouteTable):
+    """A route table with some rows repaired in memory after route updates.
+
+    Rows that were never patched are read from the mapped base table.
+    """
+
+    def __init__(self, base, rows):
+        if isinstance(base, PatchedRouteTable):
+            rows = {**base.rows, **rows}
+            base = base.base
+        self.base = base
+        self.rows = rows
+        self.path = base.path
+        self.source_sha256 = base.source_sha256
+        self.ids = base.ids
+        self.metrics = base.metrics
+        # Replaced distance rows by metric, so a column only visits its own
+        self._dist_rows = {metric: [] for metric in self.metrics}
+        for (metric, source), (dist, _) in rows.items():
+            self._dist_rows[metric].append((source, dist))
+
+    def row(self, metric, source):
+        replaced = self.rows.get((metric, source))
+        return replaced if replaced is not None else self.base.row(metric, source)
+
+    def column(self, metric, target):
+        column = array("d", self.base.column(metric, target))
+        for source, dist in self._dist_rows[metric]:
+            column[source] = dist[target]
+        return column
+
+    def compacted(self):
+        """A plain ``RouteTable`` over a copy of the base file with the replaced rows written in.
+
+        The copy is unlinked once mapped where the platform allows, so it
+        lasts only as long as the tables using it.
+        """
+        base = self.base
+        n = len(self.ids)
+        data_start, sections = base._layout
+        directory, name = os.path.split(base.path)
+        fd, path = tempfile.mkstemp(prefix=f"{name}.live-", dir=directory or ".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(base._mmap)
+                for (metric, source), (dist, hops) in self.rows.items():
+                    dist_offset, next_offset = sections[metric]
+                    f.seek(data_start + dist_offset + source * 8 * n)
+                    f.write(dist)
+                    f.seek(data_start + next_offset + source * 4 * n)
+                    f.write(hops)
+            table = RouteTable(path)
+            # Later copies are named after the built file, not this one
+            table.path = base.path
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                # Mapped files cannot be removed on Windows; left for the user to clear
+                pass
+        logger.info(f"Folded {len(self.rows)} repaired route table rows into a new table file")
+        return table
+
+
+def load_graph(data_file):
+    with open(data_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return Graph.from_data(data)
+
+
+_worker_graph = None
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _table_row(args):
+    """Compute the distance and next-hop rows for one source and metric."""
+    source, metric = args
+    tree = shortest_path_tree(_worker_graph, source, metric)
+    return source, metric, tree.dist.tobytes(), tree.first_hops().tobytes()
+
+
+def build_route_table(data_file=DEFAULT_DATA_FILE, table_file=DEFAULT_TABLE_FILE,
+                      workers=None, force=False):
+    """Build the route table for ``data_file`` unless an up-to-date one exists.
+
+    Returns True if the table was (re)built and False if it was up to date.
+    """
+    source_sha256 = file_sha256(data_file)
+    if not force and os.path.exists(table_file):
+        try:
+            if RouteTable(table_file).source_sha256 == source_sha256:
+                logger.info(f"Route table {table_file} is up to date, skipping build")
+                return False
+        except (ValueError, OSError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable route table {table_file}: {e}")
+
+    graph = load_graph(data_file)
+    n = len(graph)
+    logger.info(f"Building route table for {n} airports with {workers or os.cpu_count()} workers")
+
+    # Lay out 8-byte aligned matrix sections; offsets are relative to the
+    # start of the data region that follows the header
+    metrics = list(METRICS)
+    matrix_bytes = 8 * n * n
+    hop_bytes = 4 * n * n
+    sections = {}
+    offset = 0
+    for metric in metrics:
+        sections[metric] = [offset, _align(offset + matrix_bytes)]
+        offset = _align(sections[metric][1] + hop_bytes)
+    header = {"source_sha256": source_sha256, "ids": graph.ids, "metrics": metrics, "sections": sections}
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    # Rows are written where they belong as they arrive, so the matrices are
+    # never held in memory
+    tasks = [(source, metric) for metric in metrics for source in range(n)]
+    tmp_file = f"{table_file}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.truncate(data_start + offset)
+
+        def write_row(source, metric, dist_row, next_row):
+            dist_offset, next_offset = sections[metric]
+            f.seek(data_start + dist_offset + source * 8 * n)
+            f.write(dist_row)
+            f.seek(data_start + next_offset + source * 4 * n)
+            f.write(next_row)
+
+        if workers == 1:
+            _init_worker(graph)
+            for row in map(_table_row, tasks):
+                write_row(*row)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(graph,)) as pool:
+                # Small chunks, so rows waiting to be written stay few
+                chunksize = max(1, min(ROWS_PER_CHUNK, len(tasks) // (4 * (workers or os.cpu_count() or 1))))
+                for row in pool.map(_table_row, tasks, chunksize=chunksize):
+                    write_row(*row)
+    os.replace(tmp_file, table_file)
+
+    logger.info(f"Route table written to {table_file} ({os.path.getsize(table_file)} bytes)")
+    return True
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the all-pairs route table")
+    parser.add_argument("--data", default=DEFAULT_DATA_FILE, help="route data JSON file")
+    parser.add_argument("--output", default=DEFAULT_TABLE_FILE, help="route table file to write")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the table is up to date")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    build_route_table(args.data, args.output, workers=args.workers, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
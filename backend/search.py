@@ -0,0 +1,338 @@
+"""Point-to-point search strategies over the CSR airport graph.
+
+Every strategy takes ``(graph, source, target, metric)`` with node indices
+and returns ``(nodes, edges, settled)``: the node and edge index lists of the
+shortest path (empty if unreachable) and the number of nodes it settled.
+
+- ``dijkstra``: plain Dijkstra.
+- ``astar``: A* with a great-circle heuristic; ``distance`` and ``time`` only.
+- ``bidirectional``: Dijkstra from both ends, stopping when the frontiers meet.
+- ``alt``: A* with landmark (ALT) lower bounds, for any metric.
+- ``ch``: Contraction Hierarchies; needs a hierarchy built by contraction.py.
+"""
+import heapq
+import logging
+import math
+import os
+
+from contraction import ch_search
+from graph import (get_scratch, dijkstra_search, path_totals, reverse_weights, search_counters,
+                   shortest_path_tree)
+from reduce_connections import calculate_distance
+
+logger = logging.getLogger(__name__)
+
+# Number of landmarks picked for ALT lower bounds
+ALT_LANDMARKS = int(os.environ.get("ALT_LANDMARKS", "8"))
+
+# Metrics with a geographic lower bound usable by A*
+ASTAR_METRICS = ("distance", "time")
+
+# Strategy used for each metric when "auto" is requested
+AUTO_STRATEGIES = {"distance": "astar", "time": "astar", "cost": "bidirectional"}
+
+
+def great_circle_scale(graph, metric):
+    """Largest factor k such that k * great-circle distance never exceeds an edge weight.
+
+    Route distances in the data are randomly shortened or lengthened relative
+    to the great-circle distance, so the raw haversine is not admissible; the
+    scaled one is, and stays consistent by the triangle inequality.
+    """
+    key = ("great_circle_scale", metric)
+    if key in graph.derived:
+        return graph.derived[key]
+
+    scale = float("inf")
+    lat, lng = graph.lat, graph.lng
+    weights = graph.weights[metric]
+    for u in range(len(graph)):
+        for e in graph.neighbors(u):
+            v = graph.targets[e]
+            arc = calculate_distance(lat[u], lng[u], lat[v], lng[v])
+            if arc > 0:
+                scale = min(scale, weights[e] / arc)
+            elif math.isnan(arc):
+                # Airports without coordinates make the heuristic unusable
+                scale = 0.0
+    if scale == float("inf"):
+        scale = 0.0
+
+    graph.derived[key] = scale
+    return scale
+
+
+def landmarks(graph, metric):
+    """Distance arrays of ALT landmarks, chosen by farthest-point selection.
+
+    Each landmark has a pair of arrays: distances from it and distances to
+    it. They are the same array unless the graph is directed.
+    """
+    key = ("landmarks", metric)
+    if key in graph.derived:
+        return graph.derived[key]
+
+    n = len(graph)
+    count = min(ALT_LANDMARKS, n)
+    tables = []
+    # Smallest distance from each node to any landmark picked so far
+    closest = [float("inf")] * n
+    node = 0
+    for _ in range(count):
+        from_landmark = to_landmark = shortest_path_tree(graph, node, metric).dist
+        if graph.directed:
+            to_landmark = shortest_path_tree(graph, node, metric, reverse=True).dist
+        tables.append((from_landmark, to_landmark))
+        for v in range(n):
+            closest[v] = min(closest[v], from_landmark[v])
+        # Unreached nodes have infinite distance and are picked first, so
+        # every component ends up with a landmark of its own
+        node = max(range(n), key=closest.__getitem__)
+        if closest[node] == 0:
+            break
+
+    logger.info(f"Selected {len(tables)} ALT landmarks for {metric}")
+    graph.derived[key] = tables
+    return tables
+
+
+def astar_search(graph, source, target, metric, potential):
+    """A* between node indices using a consistent lower bound ``potential(node)``."""
+    scratch = get_scratch(graph)
+    gen = scratch.next_generation()
+    dist = scratch.dist
+    prev = scratch.prev
+    prev_edge = scratch.prev_edge
+    reached = scratch.reached
+    settled = scratch.settled
+
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights[metric]
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+    bounds = {}
+
+    dist[source] = 0.0
+    reached[source] = gen
+    priority_queue = [(potential(source), source)]
+    settled_count = 0
+    pushes = 1
+
+    while priority_queue:
+        _, u = heappop(priority_queue)
+        if settled[u] == gen:
+            continue
+        settled[u] = gen
+        settled_count += 1
+
+        if u == target:
+            break
+
+        current_distance = dist[u]
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            if settled[v] == gen:
+                continue
+            distance = current_distance + weights[e]
+            if reached[v] != gen or distance < dist[v]:
+                reached[v] = gen
+                dist[v] = distance
+                prev[v] = u
+                prev_edge[v] = e
+                bound = bounds.get(v)
+                if bound is None:
+                    bound = bounds[v] = potential(v)
+                heappush(priority_queue, (distance + bound, v))
+                pushes += 1
+
+    search_counters.add(settled_count, pushes)
+    if reached[target] != gen:
+        return [], [], settled_count
+    return _unwind(source, target, prev, prev_edge) + (settled_count,)
+
+
+def astar(graph, source, target, metric):
+    """A* with a scaled great-circle heuristic."""
+    if metric not in ASTAR_METRICS:
+        raise ValueError(f"A* has no geographic heuristic for metric '{metric}'")
+
+    scale = great_circle_scale(graph, metric)
+    lat, lng = graph.lat, graph.lng
+    target_lat, target_lng = lat[target], lng[target]
+
+    def potential(node):
+        return scale * calculate_distance(lat[node], lng[node], target_lat, target_lng)
+
+    return astar_search(graph, source, target, metric, potential)
+
+
+def alt(graph, source, target, metric):
+    """A* with lower bounds from the triangle inequality over landmarks.
+
+    For a landmark L, d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L);
+    on an undirected graph the two combine into |d(L, t) - d(L, v)|.
+    """
+    tables = landmarks(graph, metric)
+    inf = float("inf")
+
+    if not graph.directed:
+        to_target = [(table, table[target]) for table, _ in tables]
+
+        def potential(node):
+            bound = 0.0
+            for table, target_distance in to_target:
+                node_distance = table[node]
+                if node_distance != inf and target_distance != inf:
+                    bound = max(bound, abs(target_distance - node_distance))
+            return bound
+    else:
+        # (distances from L, d(L, t), distances to L, d(t, L)) for each landmark L
+        to_target = [(from_table, from_table[target], to_table, to_table[target])
+                     for from_table, to_table in tables]
+
+        def potential(node):
+            bound = 0.0
+            for from_table, from_target, to_table, target_to in to_target:
+                node_distance = from_table[node]
+                if node_distance != inf and from_target != inf:
+                    bound = max(bound, from_target - node_distance)
+                node_distance = to_table[node]
+                if node_distance != inf and target_to != inf:
+                    bound = max(bound, node_distance - target_to)
+            return bound
+
+    return astar_search(graph, source, target, metric, potential)
+
+
+def bidirectional(graph, source, target, metric):
+    """Dijkstra from both ends, stopping once no shorter meeting point can exist.
+
+    The backward search walks the graph's reverse adjacency, which for an
+    undirected graph is the forward one.
+    """
+    forward = get_scratch(graph, 0)
+    backward = get_scratch(graph, 1)
+    sides = (forward, backward)
+    gens = (forward.next_generation(), backward.next_generation())
+
+    # Adjacency and weights walked by each side
+    adjacency = (
+        (graph.offsets, graph.targets, graph.weights[metric]),
+        (graph.rev_offsets, graph.rev_targets, reverse_weights(graph, metric)),
+    )
+    heappop = heapq.heappop
+    heappush = heapq.heappush
+
+    queues = ([(0.0, source)], [(0.0, target)])
+    for side, gen, node in ((forward, gens[0], source), (backward, gens[1], target)):
+        side.dist[node] = 0.0
+        side.reached[node] = gen
+
+    best = float("inf")
+    meeting = -1
+    settled_count = 0
+    pushes = 2
+
+    while queues[0] and queues[1]:
+        if queues[0][0][0] + queues[1][0][0] >= best:
+            break
+
+        # Expand the side with the smaller frontier
+        i = 0 if len(queues[0]) <= len(queues[1]) else 1
+        side, other = sides[i], sides[1 - i]
+        gen, other_gen = gens[i], gens[1 - i]
+        queue = queues[i]
+
+        current_distance, u = heappop(queue)
+        if side.settled[u] == gen:
+            continue
+        side.settled[u] = gen
+        settled_count += 1
+
+        dist = side.dist
+        reached = side.reached
+        offsets, targets, weights = adjacency[i]
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            distance = current_distance + weights[e]
+            if side.settled[v] != gen and (reached[v] != gen or distance < dist[v]):
+                reached[v] = gen
+                dist[v] = distance
+                side.prev[v] = u
+                side.prev_edge[v] = e
+                heappush(queue, (distance, v))
+                pushes += 1
+            if other.reached[v] == other_gen:
+                total = dist[v] + other.dist[v]
+                if total < best:
+                    best = total
+                    meeting = v
+
+    search_counters.add(settled_count, pushes)
+    if meeting == -1:
+        return [], [], settled_count
+
+    nodes, _ = _unwind(source, meeting, forward.prev, forward.prev_edge)
+    node = meeting
+    while node != target:
+        node = backward.prev[node]
+        nodes.append(node)
+    edges = [graph.edge_index(nodes[i], nodes[i + 1]) for i in range(len(nodes) - 1)]
+    return nodes, edges, settled_count
+
+
+def _unwind(source, target, prev, prev_edge):
+    nodes = [target]
+    edges = []
+    node = target
+    while node != source:
+        edges.append(prev_edge[node])
+        node = prev[node]
+        nodes.append(node)
+    nodes.reverse()
+    edges.reverse()
+    return nodes, edges
+
+
+STRATEGIES = {
+    "dijkstra": dijkstra_search,
+    "astar": astar,
+    "bidirectional": bidirectional,
+    "alt": alt,
+    "ch": ch_search,
+}
+
+
+def resolve_strategy(strategy, metric):
+    """Map ``auto`` to the preferred strategy for ``metric``."""
+    if strategy == "auto":
+        return AUTO_STRATEGIES.get(metric, "dijkstra")
+    return strategy
+
+
+def route(graph, waypoints, metric, strategy):
+    """Shortest route through ``waypoints`` (airport IDs), one search per leg.
+
+    Returns ``(path, total_cost, total_distance, total_time, failed_leg, settled)``.
+    """
+    search = STRATEGIES[resolve_strategy(strategy, metric)]
+    index = graph.index
+    nodes = [index[waypoints[0]]]
+    edges = []
+    settled = 0
+
+    for leg_source, leg_target in zip(waypoints, waypoints[1:]):
+        source, target = index[leg_source], index[leg_target]
+        if source == target:
+            continue
+        leg_nodes, leg_edges, leg_settled = search(graph, source, target, metric)
+        settled += leg_settled
+        if not leg_nodes:
+            return [], 0, 0, 0, (leg_source, leg_target), settled
+        nodes.extend(leg_nodes[1:])
+        edges.extend(leg_edges)
+
+    path = [graph.ids[node] for node in nodes]
+    total_cost, total_distance, total_time = path_totals(graph, edges)
+    return path, total_cost, total_distance, total_time, None, settled
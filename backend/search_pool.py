@@ -0,0 +1,393 @@
+"""Route searches run off the event loop, in a thread or process pool.
+
+In process mode the CSR arrays of each snapshot's graph are copied once into
+named shared memory; after a route update only the arrays it replaced are.
+A task only carries the blocks' small description, and each worker maps the
+blocks and wraps them in a ``Graph`` without copying, so nothing graph-sized
+is pickled per request.
+
+The executor bounds the number of searches queued or running: past that
+limit ``find_route`` raises ``SearchBusy`` straight away rather than letting
+requests pile up behind each other. ``SingleFlight`` sits in front of it so
+identical requests arriving together share one search.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import search
+from contraction import ContractionHierarchy
+from graph import METRICS, Graph, TreeCache, route_via, search_counters
+from search import resolve_strategy
+
+logger = logging.getLogger(__name__)
+
+
+class SearchBusy(Exception):
+    """Raised when the search queue is full."""
+
+
+def find_route(graph, waypoints, metric, strategy):
+    """Search a route through ``waypoints``, returning the 6-tuple of ``search.route``."""
+    strategy = resolve_strategy(strategy, metric)
+    if strategy != "dijkstra":
+        return search.route(graph, waypoints, metric, strategy)
+    # Legs share search trees, so k legs need about k/2 searches
+    trees = TreeCache(graph)
+    result = route_via(graph, waypoints, metric, trees)
+    return (*result, trees.settled())
+
+
+def _graph_arrays(graph):
+    arrays = [("ids", graph.ids), ("offsets", graph.offsets), ("targets", graph.targets)]
+    arrays += [(metric, graph.weights[metric]) for metric in METRICS]
+    arrays += [("lat", graph.lat), ("lng", graph.lng)]
+    if graph.directed:
+        arrays += [("rev_offsets", graph.rev_offsets), ("rev_targets", graph.rev_targets),
+                   ("rev_edges", graph.rev_edges)]
+    return arrays
+
+
+class _Block:
+    """A shared memory block used by one or more ``SharedGraph`` copies.
+
+    It is unlinked when the last of them lets go of it.
+    """
+
+    def __init__(self, size):
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.holders = 1
+        self._lock = threading.Lock()
+
+    def hold(self):
+        with self._lock:
+            self.holders += 1
+
+    def drop(self):
+        with self._lock:
+            self.holders -= 1
+            if self.holders == 0:
+                # Workers keep their mappings until they attach to a newer graph
+                self.shm.close()
+                self.shm.unlink()
+
+
+# Keys telling apart the graphs sent to workers, as graphs may share blocks
+_spec_keys = itertools.count()
+
+
+class SharedGraph:
+    """A graph's arrays copied into shared memory.
+
+    Arrays that are the very same objects as in ``previous`` are not copied
+    again but point into its blocks: a route update that leaves the edges
+    alone shares the ids, CSR arrays and untouched weights, so only the
+    changed weight arrays go into a new block. Blocks are unlinked once every
+    copy using them has been retired and no task still uses it.
+    """
+
+    def __init__(self, graph, previous=None):
+        arrays = _graph_arrays(graph)
+        reused = previous._arrays if previous is not None else {}
+        copied = []
+        layout = []
+        size = 0
+        for name, values in arrays:
+            if name in reused and reused[name][0] is values:
+                layout.append(reused[name][1])
+                continue
+            if name == "ids":
+                raw, typecode, itemsize = "\n".join(values).encode("utf-8"), "B", 1
+            else:
+                # Arrays, or memoryviews of a mapped binary snapshot
+                view = memoryview(values)
+                raw, typecode, itemsize = view.cast("B"), view.format, view.itemsize
+            size = (size + 7) & ~7
+            copied.append((raw, size))
+            layout.append((name, typecode, None, size, len(raw) // itemsize))
+            size += len(raw)
+
+        self.blocks = []
+        if copied:
+            block = _Block(size)
+            for raw, offset in copied:
+                block.shm.buf[offset:offset + len(raw)] = raw
+            layout = [entry if entry[2] is not None else (*entry[:2], block.shm.name, *entry[3:])
+                      for entry in layout]
+            self.blocks.append(block)
+        used = {entry[2] for entry in layout}
+        for block in previous.blocks if previous is not None else []:
+            if block.shm.name in used:
+                block.hold()
+                self.blocks.append(block)
+
+        # Workers map the contraction hierarchy file themselves
+        hierarchy = graph.derived.get("contraction")
+        self.spec = {"key": next(_spec_keys), "blocks": [block.shm.name for block in self.blocks],
+                     "layout": layout, "directed": graph.directed,
+                     "hierarchy": hierarchy.path if hierarchy is not None else None}
+        # Kept while this is the live copy, so the next one can tell what it may reuse
+        self._arrays = {name: (values, entry) for (name, values), entry in zip(arrays, layout)}
+        self.copied_bytes = size if copied else 0
+        self.in_flight = 0
+        self.retired = False
+        self._released = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.retired and self.in_flight == 0:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._drop_if_unused()
+
+    def retire(self):
+        with self._lock:
+            self.retired = True
+            self._arrays = {}
+            self._drop_if_unused()
+
+    def _drop_if_unused(self):
+        if self.retired and self.in_flight == 0 and not self._released:
+            self._released = True
+            for block in self.blocks:
+                block.drop()
+
+
+# Blocks mapped by this worker process by name, and the graph last attached
+_mapped = {}
+_attached = {}
+
+
+def attach_shared_graph(spec):
+    """The ``Graph`` over the shared blocks described by ``spec``, mapped once per process."""
+    key = spec["key"]
+    graph = _attached.get(key)
+    if graph is not None:
+        return graph
+
+    # A new spec means a newer snapshot; let go of the mappings it no longer uses
+    _attached.clear()
+    for name in [name for name in _mapped if name not in spec["blocks"]]:
+        shm = _mapped.pop(name)
+        try:
+            shm.close()
+        except BufferError:
+            # Views are still referenced by a running search; closed on exit instead
+            pass
+    for name in spec["blocks"]:
+        if name not in _mapped:
+            _mapped[name] = shared_memory.SharedMemory(name=name)
+
+    views = {
+        array_name: _mapped[block].buf[offset:offset + length * array(typecode).itemsize].cast(typecode)
+        for array_name, typecode, block, offset, length in spec["layout"]
+    }
+    ids = bytes(views.pop("ids")).decode("utf-8")
+    reverse = None
+    if spec["directed"]:
+        reverse = (views["rev_offsets"], views["rev_targets"], views["rev_edges"])
+    graph = Graph(
+        ids.split("\n") if ids else [],
+        views["offsets"],
+        views["targets"],
+        {metric: views[metric] for metric in METRICS},
+        views["lat"],
+        views["lng"],
+        directed=spec["directed"],
+        reverse=reverse,
+    )
+    if spec["hierarchy"]:
+        graph.derived["contraction"] = ContractionHierarchy(spec["hierarchy"])
+    _attached[key] = graph
+    return graph
+
+
+def _on_shared_graph(spec, fn, *args):
+    """``fn(graph, *args)`` in a worker; also returns the search work it did.
+
+    The counters live in each process, so the work is sent back to be added
+    to the main process's totals.
+    """
+    before = search_counters.totals()
+    result = fn(attach_shared_graph(spec), *args)
+    after = search_counters.totals()
+    return result, {name: after[name] - before[name] for name in after}
+
+
+class SearchExecutor:
+    """Runs route searches in a bounded thread or process pool.
+
+    With ``workers`` > 0 searches run in that many processes against shared
+    memory copies of the graph; with 0 they run in a thread pool, which keeps
+    the event loop free but shares the GIL.
+    """
+
+    def __init__(self, workers=0, max_pending=64, timeout=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._shared = {}
+        self._processes = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+        # Thread mode, and requests still on a snapshot that was swapped out
+        self._threads = ThreadPoolExecutor(thread_name_prefix="search")
+
+    def publish(self, snapshot):
+        """Share ``snapshot``'s graph with the workers and retire older copies."""
+        if self.workers <= 0:
+            return
+        with self._lock:
+            previous = list(self._shared.values())
+        # Arrays a route update left unchanged stay where they are
+        shared = SharedGraph(snapshot.graph, previous[0] if previous else None)
+        with self._lock:
+            self._shared = {snapshot.version: shared}
+        for old in previous:
+            old.retire()
+        logger.info(f"Shared graph {snapshot.version[:12]} with search workers "
+                    f"({shared.copied_bytes} bytes copied)")
+
+    async def find_route(self, snapshot, waypoints, metric, strategy):
+        """Await ``find_route`` for ``snapshot``; raises SearchBusy or asyncio.TimeoutError."""
+        return await self.on_graph(snapshot, find_route, waypoints, metric, strategy)
+
+    async def on_graph(self, snapshot, fn, *args):
+        """Await ``fn(snapshot.graph, *args)``, in a worker process when the graph is shared.
+
+        ``fn`` must be a module-level function that needs nothing but the
+        graph. Raises SearchBusy or asyncio.TimeoutError.
+        """
+        self._reserve()
+        with self._lock:
+            shared = self._shared.get(snapshot.version)
+
+        release = None
+        try:
+            if shared is not None and shared.acquire():
+                release = shared.release
+                future = self._processes.submit(_on_shared_graph, shared.spec, fn, *args)
+            else:
+                future = self._threads.submit(fn, snapshot.graph, *args)
+        except BaseException:
+            self._done(release)
+            raise
+        if release is None:
+            return await self._wait(future, release)
+        result, work = await self._wait(future, release)
+        search_counters.add(work["settled"], work["pushes"], work["searches"])
+        return result
+
+    async def call(self, fn, *args):
+        """Await ``fn(*args)`` in the thread pool, under the same queue limit and timeout.
+
+        Always a thread, even in process mode: callers pass live snapshots,
+        timetables and shared search trees that cannot go to a worker
+        process; searches that only need the graph use ``on_graph``.
+        """
+        self._reserve()
+        try:
+            future = self._threads.submit(fn, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        return await self._wait(future, None)
+
+    def _reserve(self):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise SearchBusy(f"{self.pending} searches already queued")
+            self.pending += 1
+
+    async def _wait(self, future, release):
+        # The slot is freed when the search really ends, even after a timeout
+        future.add_done_callback(lambda _: self._done(release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def _done(self, release):
+        with self._lock:
+            self.pending -= 1
+        if release is not None:
+            release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": "process" if self.workers > 0 else "thread",
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "timeout": self.timeout,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            shared, self._shared = list(self._shared.values()), {}
+        for block in shared:
+            block.retire()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one.
+
+    The first caller for a key starts the call; callers arriving while it
+    runs wait for the same result, or exception, instead of repeating the
+    work. Nothing is remembered once the call finishes; caching is the
+    result cache's job. Used from the event loop only, so needs no lock.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Await ``fn()`` or the call already running for ``key``.
+
+        Returns ``(result, shared)`` where ``shared`` tells whether another
+        caller's call produced the result. A caller that is cancelled stops
+        waiting without cancelling the call for the others.
+        """
+        future = self._calls.get(key)
+        shared = future is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            self.started += 1
+            future.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(future), shared
+
+    def _finished(self, key, future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled():
+            # Mark the exception retrieved even if every caller stopped waiting
+            future.exception()
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,310 @@
+"""Immutable data snapshots and hot reloading of the route data.
+
+A snapshot bundles the airports, routes, graph and precomputed tables built
+from one version of the data file, or from its binary form (see
+binary_snapshot.py) when that is up to date. Request handlers read
+``holder.current`` once and use that snapshot throughout, so a reload that
+swaps in a new snapshot never changes data under a request in flight.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from binary_snapshot import SnapshotFile
+from contraction import ContractionHierarchy
+from graph import Graph
+from route_table import RouteTable, build_route_table, file_sha256
+from timetable import Timetable
+
+logger = logging.getLogger(__name__)
+
+
+class DataSnapshot:
+    """Route data and everything derived from it, never mutated once built."""
+
+    __slots__ = ("_airports", "_routes", "records", "graph", "version", "route_table", "timetable",
+                 "hierarchy", "stale_hierarchy", "changes", "source_file", "file_bytes", "loaded_at",
+                 "build_seconds", "payloads")
+
+    def __init__(self, airports, routes, graph, version, route_table=None, timetable=None,
+                 hierarchy=None, changes=None, source_file=None, file_bytes=0, build_seconds=0.0,
+                 records=None, stale_hierarchy=frozenset()):
+        # With ``records`` (a SnapshotFile) airports and routes may be None and
+        # are decoded from it on first use
+        self._airports = airports
+        self._routes = routes
+        self.records = records
+        self.graph = graph
+        self.version = version
+        self.route_table = route_table
+        self.timetable = timetable
+        self.hierarchy = hierarchy
+        # Metrics whose hierarchy route updates left out of date
+        self.stale_hierarchy = stale_hierarchy
+        # Route updates applied on top of the data file (see updates.py)
+        self.changes = changes
+        self.source_file = source_file
+        self.file_bytes = file_bytes
+        self.loaded_at = time.time()
+        self.build_seconds = build_seconds
+        # Serialized responses derived from this snapshot, filled in lazily
+        self.payloads = {}
+
+    @property
+    def airports(self):
+        if self._airports is None:
+            # Concurrent first readers may both decode; either result is the same
+            self._airports = self.records.decode("airports")
+        return self._airports
+
+    @property
+    def routes(self):
+        if self._routes is None:
+            self._routes = self.records.decode("routes")
+        return self._routes
+
+    def count(self, name):
+        """Number of airports or routes, without decoding them."""
+        loaded = self._airports if name == "airports" else self._routes
+        return len(loaded) if loaded is not None else self.records.counts.get(name, 0)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], Graph.from_routes([], []), "empty")
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "source_file": self.source_file,
+            "file_bytes": self.file_bytes,
+            "airports": self.count("airports"),
+            "routes": self.count("routes"),
+            "graph_edges": self.graph.num_edges,
+            "graph_bytes": self.graph.nbytes(),
+            "route_table": self.route_table is not None,
+            "contraction_hierarchy": self.hierarchy is not None,
+            "contraction_stale": sorted(self.stale_hierarchy),
+            "connections": len(self.timetable) if self.timetable is not None else 0,
+            "route_updates": self.changes.total if self.changes is not None else 0,
+            "loaded_at": self.loaded_at,
+            "build_seconds": self.build_seconds,
+        }
+
+
+def load_snapshot(data_file, route_table_file=None, precompute_routes=False, hierarchy_file=None,
+                  snapshot_file=None):
+    """Parse ``data_file`` and build a snapshot from it.
+
+    When ``snapshot_file`` holds a binary snapshot written from this exact
+    data file (or the data file is gone), it is mapped instead and nothing
+    is parsed. Flight schedules under the optional ``flights`` key become the
+    snapshot's timetable. The route table is attached when ``route_table_file`` holds one built from
+    this exact data file; with ``precompute_routes`` it is (re)built first. The
+    contraction hierarchy in ``hierarchy_file`` is attached on the same condition.
+    """
+    start = time.perf_counter()
+    binary = _open_snapshot_file(snapshot_file, data_file) if snapshot_file else None
+    if binary is not None:
+        airports = routes = None
+        graph = binary.graph()
+        version = binary.source_sha256
+        flights = binary.decode("flights")
+        source_file = snapshot_file
+        logger.info(f"Mapped {len(graph)} airports and {binary.counts.get('routes', 0)} routes "
+                    f"from {snapshot_file}")
+    else:
+        logger.info(f"Attempting to load data from {data_file}")
+        if not os.path.exists(data_file):
+            logger.error(f"Data file not found: {data_file}")
+            raise FileNotFoundError(f"Data file not found: {data_file}")
+
+        with open(data_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        if 'airports' not in data or 'routes' not in data:
+            logger.error(f"Invalid data format in {data_file}: missing 'airports' or 'routes' keys")
+            raise ValueError(f"Invalid data format in {data_file}: missing required keys")
+
+        airports = data['airports']
+        routes = data['routes']
+        flights = data.get('flights')
+        version = file_sha256(data_file)
+        source_file = data_file
+        logger.info(f"Loaded {len(airports)} airports and {len(routes)} routes from {data_file}")
+
+        graph = Graph.from_data(data)
+    logger.info(f"Graph built with {len(graph)} airports and {graph.num_edges} directed edges "
+                f"({graph.nbytes()} bytes)")
+
+    timetable = None
+    if flights:
+        if airports is None:
+            airports = binary.decode("airports")
+        connection_times = {airport['id']: airport['min_connection']
+                            for airport in airports if 'min_connection' in airport}
+        timetable = Timetable.from_flights(graph, flights, connection_times)
+
+    route_table = None
+    if route_table_file:
+        route_table = _load_route_table(data_file, route_table_file, graph, version, precompute_routes)
+
+    hierarchy = None
+    if hierarchy_file:
+        hierarchy = _load_hierarchy(hierarchy_file, graph, version)
+        if hierarchy is not None:
+            graph.derived["contraction"] = hierarchy
+
+    return DataSnapshot(
+        airports, routes, graph, version,
+        route_table=route_table,
+        timetable=timetable,
+        hierarchy=hierarchy,
+        source_file=source_file,
+        file_bytes=os.path.getsize(source_file),
+        build_seconds=time.perf_counter() - start,
+        records=binary,
+    )
+
+
+def _open_snapshot_file(snapshot_file, data_file):
+    if not os.path.exists(snapshot_file):
+        return None
+    try:
+        binary = SnapshotFile(snapshot_file)
+        if os.path.exists(data_file) and file_sha256(data_file) != binary.source_sha256:
+            logger.warning(f"Snapshot {snapshot_file} is out of date, loading {data_file} instead")
+            return None
+        return binary
+    except Exception as e:
+        logger.error(f"Error loading snapshot from {snapshot_file}: {e}")
+        return None
+
+
+def _load_route_table(data_file, route_table_file, graph, version, precompute_routes):
+    try:
+        if precompute_routes:
+            build_route_table(data_file, route_table_file)
+        if not os.path.exists(route_table_file):
+            return None
+
+        table = RouteTable(route_table_file)
+        if not table.matches(graph, version):
+            logger.warning(f"Route table {route_table_file} is out of date, falling back to Dijkstra")
+            return None
+
+        logger.info(f"Using precomputed route table from {route_table_file}")
+        return table
+    except Exception as e:
+        logger.error(f"Error loading route table from {route_table_file}: {e}")
+        return None
+
+
+def _load_hierarchy(hierarchy_file, graph, version):
+    if not os.path.exists(hierarchy_file):
+        return None
+    try:
+        hierarchy = ContractionHierarchy(hierarchy_file)
+        if not hierarchy.matches(graph, version):
+            logger.warning(f"Contraction hierarchy {hierarchy_file} is out of date, ignoring it")
+            return None
+
+        logger.info(f"Using contraction hierarchy from {hierarchy_file}")
+        return hierarchy
+    except Exception as e:
+        logger.error(f"Error loading contraction hierarchy from {hierarchy_file}: {e}")
+        return None
+
+
+class SnapshotHolder:
+    """Holds the current snapshot and rebuilds it in the background on demand."""
+
+    def __init__(self, snapshot, loader):
+        self._snapshot = snapshot
+        self._loader = loader
+        self._reload_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._listeners = []
+        self.status = {"state": "idle", "started_at": None, "finished_at": None,
+                       "build_seconds": None, "error": None}
+
+    @property
+    def current(self):
+        return self._snapshot
+
+    def on_swap(self, listener):
+        """Call ``listener(snapshot)`` after each new snapshot is installed."""
+        self._listeners.append(listener)
+
+    def reload(self, background=True):
+        """Build a new snapshot and swap it in; returns False if a reload is running."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.status = {**self.status, "state": "running", "started_at": time.time(), "error": None}
+        if background:
+            threading.Thread(target=self._reload, name="snapshot-reload", daemon=True).start()
+        else:
+            self._reload()
+        return True
+
+    def update(self, build):
+        """Swap in ``build(current)`` unless it returns None, and return the new snapshot.
+
+        ``build`` runs without any lock held; if a reload swaps in another
+        snapshot meanwhile, it runs again on top of that one.
+        """
+        while True:
+            base = self._snapshot
+            snapshot = build(base)
+            if snapshot is None:
+                return None
+            if self._install(snapshot, expected=base):
+                return snapshot
+
+    def _install(self, snapshot, expected=None):
+        with self._swap_lock:
+            if expected is not None and self._snapshot is not expected:
+                return False
+            # Single reference assignment; readers see either the old or the new snapshot
+            self._snapshot = snapshot
+            # Listeners run in swap order, so they never see an older snapshot last
+            for listener in self._listeners:
+                listener(snapshot)
+            return True
+
+    def _reload(self):
+        try:
+            start = time.perf_counter()
+            snapshot = self._loader()
+            self._install(snapshot)
+            elapsed = time.perf_counter() - start
+            logger.info(f"Reloaded route data in {elapsed:.3f}s: {snapshot.stats()}")
+            self.status = {**self.status, "state": "idle", "finished_at": time.time(),
+                           "build_seconds": elapsed}
+        except Exception as e:
+            logger.error(f"Error reloading route data, keeping the current snapshot: {e}")
+            self.status = {**self.status, "state": "failed", "finished_at": time.time(), "error": str(e)}
+        finally:
+            self._reload_lock.release()
+
+    def watch(self, path, interval=2.0):
+        """Poll ``path`` and reload whenever its modification time or size changes."""
+        def signature():
+            try:
+                stat = os.stat(path)
+                return stat.st_mtime_ns, stat.st_size
+            except OSError:
+                return None
+
+        def poll(last):
+            while True:
+                time.sleep(interval)
+                current = signature()
+                if current is not None and current != last:
+                    logger.info(f"Detected change in {path}, reloading")
+                    if self.reload(background=False):
+                        last = current
+
+        threading.Thread(target=poll, args=(signature(),), name="snapshot-watch", daemon=True).start()
+        logger.info(f"Watching {path} for changes every {interval}s")
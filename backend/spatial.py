@@ -0,0 +1,135 @@
+"""Spatial index over airport coordinates for nearest-airport and radius queries.
+
+Airports are stored as points on the unit sphere in a KD-tree. The straight
+chord between two points grows with their great-circle distance, so nearest
+neighbours by chord are nearest by great-circle distance too, with no special
+cases at the poles or the antimeridian. The index is built once per graph
+and cached in ``graph.derived``.
+"""
+import heapq
+import math
+from array import array
+
+from reduce_connections import EARTH_RADIUS_KM
+
+# Points per leaf; leaves are scanned linearly
+LEAF_SIZE = 8
+
+
+def _unit_vector(lat, lng):
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lng), cos_lat * math.sin(lng), math.sin(lat)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    if km >= math.pi * EARTH_RADIUS_KM:
+        return 2.0
+    return 2 * math.sin(km / (2 * EARTH_RADIUS_KM))
+
+
+class AirportIndex:
+    """KD-tree over the node indices of a graph's airports.
+
+    Airports without coordinates are left out. Points are stored in tree
+    order, and tree nodes are numbered like a binary heap: node ``i`` covers
+    a range of points split at its middle, with children ``2i + 1`` and ``2i + 2``.
+    """
+
+    def __init__(self, lat, lng):
+        nodes = [i for i in range(len(lat)) if not (math.isnan(lat[i]) or math.isnan(lng[i]))]
+        vectors = [_unit_vector(lat[i], lng[i]) for i in nodes]
+        coords = [[v[axis] for v in vectors] for axis in range(3)]
+        order = list(range(len(nodes)))
+
+        self.axis = {}
+        self.split = {}
+        stack = [(0, 0, len(order))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            # Split along the axis the range is most spread over
+            spreads = [max(c[i] for i in order[lo:hi]) - min(c[i] for i in order[lo:hi]) for c in coords]
+            axis = spreads.index(max(spreads))
+            order[lo:hi] = sorted(order[lo:hi], key=coords[axis].__getitem__)
+            mid = (lo + hi) // 2
+            self.axis[node] = axis
+            self.split[node] = coords[axis][order[mid]]
+            stack.append((2 * node + 1, lo, mid))
+            stack.append((2 * node + 2, mid, hi))
+
+        self.x = array("d", (coords[0][i] for i in order))
+        self.y = array("d", (coords[1][i] for i in order))
+        self.z = array("d", (coords[2][i] for i in order))
+        self.nodes = array("i", (nodes[i] for i in order))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _leaves(self, query, bound):
+        """Yield the point ranges of leaves that may hold points within ``bound()``.
+
+        ``bound`` returns the current squared chord limit, which may shrink
+        while the search runs; nearer halves are visited first.
+        """
+        stack = [(0, 0, len(self.nodes), 0.0)]
+        while stack:
+            node, lo, hi, gap = stack.pop()
+            if gap > bound():
+                continue
+            axis = self.axis.get(node)
+            if axis is None:
+                yield lo, hi
+                continue
+            mid = (lo + hi) // 2
+            diff = query[axis] - self.split[node]
+            near, far = ((2 * node + 1, lo, mid), (2 * node + 2, mid, hi)) if diff < 0 else \
+                ((2 * node + 2, mid, hi), (2 * node + 1, lo, mid))
+            stack.append((*far, max(gap, diff * diff)))
+            stack.append((*near, gap))
+
+    def nearest(self, lat, lng, k=1):
+        """The ``k`` nearest airports as ``(distance_km, node)`` pairs, nearest first."""
+        qx, qy, qz = query = _unit_vector(lat, lng)
+        x, y, z, nodes = self.x, self.y, self.z, self.nodes
+        # Max-heap of (-squared chord, node) holding the k best so far
+        best = []
+
+        def bound():
+            return -best[0][0] if len(best) == k else float("inf")
+
+        for lo, hi in self._leaves(query, bound):
+            for i in range(lo, hi):
+                d = (x[i] - qx) ** 2 + (y[i] - qy) ** 2 + (z[i] - qz) ** 2
+                if len(best) < k:
+                    heapq.heappush(best, (-d, nodes[i]))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, nodes[i]))
+        return [(chord_to_km(math.sqrt(-d)), node) for d, node in sorted(best, reverse=True)]
+
+    def within(self, lat, lng, radius_km):
+        """Airports within ``radius_km`` as ``(distance_km, node)`` pairs, nearest first."""
+        qx, qy, qz = query = _unit_vector(lat, lng)
+        x, y, z, nodes = self.x, self.y, self.z, self.nodes
+        limit = km_to_chord(radius_km) ** 2
+        found = []
+        for lo, hi in self._leaves(query, lambda: limit):
+            for i in range(lo, hi):
+                d = (x[i] - qx) ** 2 + (y[i] - qy) ** 2 + (z[i] - qz) ** 2
+                if d <= limit:
+                    found.append((d, nodes[i]))
+        found.sort()
+        return [(chord_to_km(math.sqrt(d)), node) for d, node in found]
+
+
+def airport_index(graph):
+    """The spatial index of ``graph``'s airports, built on first use."""
+    index = graph.derived.get("spatial")
+    if index is None:
+        index = graph.derived["spatial"] = AirportIndex(graph.lat, graph.lng)
+    return index
@@ -0,0 +1,123 @@
+"""Shared fixtures: small seeded route networks and a reference shortest path oracle.
+
+Run from the backend directory with ``python -m pytest``.
+"""
+import heapq
+import json
+import math
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph import AVERAGE_SPEED_KMH, Graph  # noqa: E402
+
+# Airports in the networks most tests search
+NETWORK_SIZE = 60
+
+
+def great_circle_km(a, b):
+    phi1, phi2 = math.radians(a["lat"]), math.radians(b["lat"])
+    d_phi, d_lambda = phi2 - phi1, math.radians(b["lng"] - a["lng"])
+    h = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def random_network(size, seed):
+    """A data file's airports and routes: each airport flies to two earlier ones.
+
+    The last airport has no routes at all, so some pairs have no path.
+    """
+    rng = random.Random(seed)
+    airports = [{"id": f"A{i:03d}", "name": f"Airport {i}", "lat": rng.uniform(8, 32), "lng": rng.uniform(68, 92)}
+                for i in range(size)]
+    routes = []
+    for i in range(1, size - 1):
+        for j in rng.sample(range(i), min(i, 2)):
+            routes.append({"source": airports[i]["id"], "target": airports[j]["id"],
+                           "distance": great_circle_km(airports[i], airports[j]),
+                           "cost": rng.randint(1500, 9000), "direct": True})
+    return {"airports": airports, "routes": routes}
+
+
+def directed_network(size, seed):
+    """``random_network`` with a fare of its own each way, a fifth of routes one-way and a sink.
+
+    Nothing leaves the second to last airport, so it can be reached but not left.
+    """
+    data = random_network(size, seed)
+    rng = random.Random(seed)
+    sink = data["airports"][-2]["id"]
+    routes = []
+    for route in data["routes"]:
+        back = {**route, "source": route["target"], "target": route["source"], "cost": rng.randint(1500, 9000)}
+        for one_way in (route, back) if rng.random() >= 0.2 else (rng.choice((route, back)),):
+            if one_way["source"] != sink:
+                routes.append(one_way)
+    return {"directed": True, "airports": data["airports"], "routes": routes}
+
+
+@pytest.fixture(params=["undirected", "directed"])
+def network(request):
+    """Route data for an undirected and a directed network in turn."""
+    if request.param == "directed":
+        return directed_network(NETWORK_SIZE, seed=7)
+    return random_network(NETWORK_SIZE, seed=7)
+
+
+@pytest.fixture
+def data_file(network, tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(network))
+    return str(path)
+
+
+@pytest.fixture
+def graph(network):
+    return Graph.from_data(network)
+
+
+def route_weights(route):
+    return {"distance": route["distance"], "cost": route["cost"],
+            "time": route["distance"] / AVERAGE_SPEED_KMH}
+
+
+def oracle_distances(data, source, metric):
+    """Distances from airport ID ``source`` by a plain Dijkstra over the route records."""
+    adjacency = {}
+    for route in data["routes"]:
+        weight = route_weights(route)[metric]
+        ends = [(route["source"], route["target"])]
+        if not data.get("directed"):
+            ends.append((route["target"], route["source"]))
+        # As in the graph, a later route record replaces an earlier one
+        for a, b in ends:
+            adjacency.setdefault(a, {})[b] = weight
+    dist = {source: 0.0}
+    queue = [(0.0, source)]
+    while queue:
+        d, u = heapq.heappop(queue)
+        if d > dist[u]:
+            continue
+        for v, weight in adjacency.get(u, {}).items():
+            if d + weight < dist.get(v, float("inf")):
+                dist[v] = d + weight
+                heapq.heappush(queue, (d + weight, v))
+    return dist
+
+
+def path_weight(graph, nodes, metric):
+    """Weight of the path through node indices ``nodes``, checking each hop is an edge."""
+    total = 0.0
+    for u, v in zip(nodes, nodes[1:]):
+        e = graph.edge_index(u, v)
+        assert e >= 0, f"{graph.ids[u]} -> {graph.ids[v]} is not a route"
+        total += graph.weights[metric][e]
+    return total
+
+
+def close(a, b):
+    return abs(a - b) <= 1e-6 * max(1.0, abs(a), abs(b))
@@ -0,0 +1,89 @@
+"""Brandes betweenness against counting shortest routes by brute force."""
+import random
+
+import pytest
+
+from analytics import airport_rows, analyse_sources, route_rows, run_analytics
+from conftest import close
+from graph import Graph
+
+
+def tied_graph(directed, seed=2):
+    """Nine airports with fares of 1 or 2, so most pairs have several equally cheap routes."""
+    rng = random.Random(seed)
+    airports = [{"id": f"A{i}", "lat": 10.0 + i, "lng": 70.0 + (i % 3)} for i in range(9)]
+    routes = []
+    for _ in range(16):
+        a, b = rng.sample(range(9), 2)
+        routes.append({"source": f"A{a}", "target": f"A{b}", "distance": 100.0 * rng.randint(1, 3),
+                       "cost": rng.randint(1, 2)})
+    return Graph.from_routes(airports, routes, directed=directed)
+
+
+def shortest_paths(graph, source, target, metric):
+    """Every cheapest loopless route as a list of edge indices."""
+    found = []
+    best = float("inf")
+    stack = [(source, [source], [], 0.0)]
+    while stack:
+        u, nodes, edges, weight = stack.pop()
+        if weight > best:
+            continue
+        if u == target:
+            if weight < best:
+                best, found = weight, []
+            found.append((nodes, edges))
+            continue
+        for e in graph.neighbors(u):
+            v = graph.targets[e]
+            if v not in nodes:
+                stack.append((v, nodes + [v], edges + [e], weight + graph.weights[metric][e]))
+    return found
+
+
+def brute_force(graph, metric):
+    n = len(graph)
+    node_load = [0.0] * n
+    edge_load = [0.0] * graph.num_edges
+    for s in range(n):
+        for t in range(n):
+            paths = shortest_paths(graph, s, t, metric) if s != t else []
+            for nodes, edges in paths:
+                for v in nodes[1:-1]:
+                    node_load[v] += 1 / len(paths)
+                for e in edges:
+                    edge_load[e] += 1 / len(paths)
+    return node_load, edge_load
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_betweenness_matches_brute_force(directed):
+    graph = tied_graph(directed)
+    for metric in ("cost", "distance"):
+        expected_nodes, expected_edges = brute_force(graph, metric)
+        node_load, edge_load, per_source = analyse_sources(graph, range(len(graph)), metric)
+        assert all(close(a, b) for a, b in zip(node_load, expected_nodes))
+        assert all(close(a, b) for a, b in zip(edge_load, expected_edges))
+        assert any(load > 0 for load in node_load)
+
+
+def test_workers_and_a_full_sample_give_the_exact_figures():
+    graph = tied_graph(directed=True, seed=5)
+    node_load, edge_load, per_source = analyse_sources(graph, range(len(graph)), "cost")
+    for workers, sample in ((2, None), (1, len(graph))):
+        nodes, edges, sources_figures, sources = run_analytics(graph, "cost", workers=workers, sample=sample)
+        assert sources == list(range(len(graph)))
+        assert all(close(a, b) for a, b in zip(nodes, node_load))
+        assert all(close(a, b) for a, b in zip(edges, edge_load))
+        assert sources_figures == per_source
+
+
+def test_tables_cover_every_airport_and_route():
+    graph = tied_graph(directed=False)
+    node_load, edge_load, per_source = analyse_sources(graph, range(len(graph)), "cost")
+    airports = airport_rows(graph, node_load, per_source)
+    assert airports["id"] == graph.ids
+    assert all(0.0 <= value <= 1.0 for value in airports["betweenness"])
+    routes = route_rows(graph, edge_load)
+    # An undirected route is one row for both directions
+    assert len(routes["source"]) == graph.num_edges // 2
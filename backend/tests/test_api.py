@@ -0,0 +1,422 @@
+"""The HTTP API over the bundled route data, through FastAPI's TestClient."""
+import asyncio
+import importlib
+import json
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from cache import ResultCache, SharedStore
+from conftest import close, great_circle_km, oracle_distances
+from contraction import build_hierarchy
+from ratelimit import TokenBuckets
+from search_pool import SearchExecutor
+
+ADMIN_TOKEN = "secret"
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    """The app module; it reads its configuration from the environment on import."""
+    directory = tmp_path_factory.mktemp("api")
+    data_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "data", "reduced_map_data.json")
+    hierarchy_file = str(directory / "contraction.bin")
+    build_hierarchy(data_file, hierarchy_file, workers=1)
+    environment = {
+        # No precomputed tables, so every answer comes from a search
+        "ROUTE_TABLE_FILE": str(directory / "route_table.bin"),
+        "HIERARCHY_FILE": hierarchy_file,
+        "ADMIN_TOKEN": ADMIN_TOKEN,
+        # Route updates are only applied with ?wait=true
+        "ROUTE_UPDATE_INTERVAL": "3600",
+        "PROFILING": "1",
+    }
+    saved = {name: os.environ.get(name) for name in environment}
+    os.environ.update(environment)
+    try:
+        yield importlib.import_module("main")
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture(scope="module")
+def client(main):
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def data(main):
+    with open(main.DATA_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def airport_ids(data):
+    return [airport["id"] for airport in data["airports"]]
+
+
+def test_find_paths_streams_every_request(client, data):
+    airports = airport_ids(data)
+    requests = [{"source": airports[0], "destination": target, "metric": metric}
+                for target in airports[1:10] for metric in ("cost", "distance")]
+    requests.append({"source": "???", "destination": airports[1]})
+    response = client.post("/find-paths", json=requests)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == list(range(len(requests)))
+
+    oracle = {metric: oracle_distances(data, airports[0], metric) for metric in ("cost", "distance")}
+    for line in lines:
+        request = requests[line["index"]]
+        if request["source"] == "???":
+            assert line["error"] and line["path"] == []
+            continue
+        assert line["path"][0] == request["source"] and line["path"][-1] == request["destination"]
+        expected = oracle[request["metric"]][request["destination"]]
+        assert close(line[f"total_{request['metric']}"], expected)
+
+
+def test_find_paths_rejects_oversized_batches(client, main, data):
+    request = {"source": airport_ids(data)[0], "destination": airport_ids(data)[1]}
+    response = client.post("/find-paths", json=[request] * (main.MAX_BATCH_SIZE + 1))
+    assert response.status_code == 413
+
+
+def test_find_path_strategies_agree(client, data):
+    airports = airport_ids(data)
+    for metric in ("cost", "distance"):
+        expected = oracle_distances(data, airports[0], metric)[airports[-1]]
+        for strategy in ("dijkstra", "bidirectional", "alt", "auto") + (("astar",) if metric == "distance" else ()):
+            response = client.post("/find-path", json={"source": airports[0], "destination": airports[-1],
+                                                       "metric": metric, "strategy": strategy})
+            assert response.status_code == 200, strategy
+            assert close(response.json()[f"total_{metric}"], expected), strategy
+
+
+def test_find_path_falls_back_when_the_strategy_cannot_serve_the_metric(client, main, data, monkeypatch):
+    airports = airport_ids(data)
+    request = {"source": airports[0], "destination": airports[1], "metric": "cost"}
+    expected = oracle_distances(data, airports[0], "cost")[airports[1]]
+    response = client.post("/find-path", json={**request, "strategy": "astar"})
+    assert response.status_code == 200 and close(response.json()["total_cost"], expected)
+
+    monkeypatch.setattr(main, "SEARCH_STRATEGY", "astar")
+    response = client.post("/find-path", json=request)
+    assert response.status_code == 200 and close(response.json()["total_cost"], expected)
+
+    hierarchy = main.snapshots.current.hierarchy
+    monkeypatch.setattr(hierarchy, "levels", {k: v for k, v in hierarchy.levels.items() if k != "cost"})
+    response = client.post("/find-path", json={**request, "strategy": "ch"})
+    assert response.status_code == 200 and close(response.json()["total_cost"], expected)
+
+
+def test_pareto_front(client, data):
+    source, destination = airport_ids(data)[0], airport_ids(data)[-1]
+    response = client.post("/find-path/pareto", json={"source": source, "destination": destination})
+    assert response.status_code == 200
+    body = response.json()
+    routes = body["routes"]
+    assert routes and body["error"] is None
+    vectors = [(route["total_cost"], route["total_distance"], route["total_time"]) for route in routes]
+    for route, vector in zip(routes, vectors):
+        assert route["path"][0] == source and route["path"][-1] == destination
+        # No route on the front is beaten on every criterion by another
+        assert not any(other != vector and all(o <= v for o, v in zip(other, vector)) for other in vectors)
+    if not body["truncated"]:
+        cheapest = routes[body["cheapest"]]["total_cost"]
+        assert close(cheapest, oracle_distances(data, source, "cost")[destination])
+    assert client.post("/find-path/pareto", json={"source": "???", "destination": destination}).status_code == 404
+    assert client.post("/find-path/pareto", json={"source": source, "destination": destination,
+                                                  "max_labels": 0}).status_code == 422
+
+
+def test_alternatives_are_distinct_and_ordered(client, data):
+    source, destination = airport_ids(data)[0], airport_ids(data)[-1]
+    response = client.post("/find-path/alternatives", json={"source": source, "destination": destination, "k": 4})
+    assert response.status_code == 200
+    routes = response.json()["routes"]
+    assert 1 <= len(routes) <= 4
+    assert len({tuple(route["path"]) for route in routes}) == len(routes)
+    costs = [route["total_cost"] for route in routes]
+    assert costs == sorted(costs)
+    assert close(costs[0], oracle_distances(data, source, "cost")[destination])
+
+
+@pytest.mark.parametrize("path", ["/find-path/alternatives", "/find-path/pareto"])
+def test_expensive_searches_share_the_search_queue(client, main, data, monkeypatch, path):
+    request = {"source": airport_ids(data)[0], "destination": airport_ids(data)[-1]}
+    monkeypatch.setattr(main, "search_executor", SearchExecutor(max_pending=0))
+    response = client.post(path, json=request)
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+
+def test_repeated_find_path_is_a_cache_hit(client, data):
+    airports = airport_ids(data)
+    request = {"source": airports[2], "destination": airports[-2]}
+    first = client.post("/find-path", json=request).json()
+    hits = client.get("/cache/stats").json()["hits"]
+    second = client.post("/find-path", json=request).json()
+    assert client.get("/cache/stats").json()["hits"] == hits + 1
+    assert second["path"] == first["path"] and second["nodes_settled"] == 0
+
+
+def test_shared_result_store_is_queried_off_the_event_loop(client, main, data, monkeypatch, tmp_path):
+    class RecordingStore(SharedStore):
+        def get(self, version, key):
+            try:
+                asyncio.get_running_loop()
+                calls.append("event loop")
+            except RuntimeError:
+                calls.append("thread")
+            return super().get(version, key)
+
+    calls = []
+    store = RecordingStore(str(tmp_path / "results.db"), 100)
+    monkeypatch.setattr(main, "result_cache", ResultCache(version=main.result_cache.version, store=store))
+    airports = airport_ids(data)
+    response = client.post("/find-path", json={"source": airports[3], "destination": airports[-3]})
+    assert response.status_code == 200 and calls == ["thread"]
+
+
+def test_admin_reload(client):
+    assert client.post("/admin/reload").status_code == 403
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    version = client.get("/admin/reload", headers=headers).json()["snapshot"]["version"]
+    assert client.post("/admin/reload", headers=headers).status_code == 202
+    for _ in range(500):
+        status = client.get("/admin/reload", headers=headers).json()
+        if status["reload"]["state"] != "running":
+            break
+        time.sleep(0.01)
+    assert status["reload"]["state"] == "idle"
+    # The data file is unchanged, and so is its version
+    assert status["snapshot"]["version"] == version
+
+
+@pytest.mark.parametrize("map_format", ["geojson", "topojson"])
+def test_india_map_etag_not_modified(client, map_format):
+    first = client.get("/india-map", params={"format": map_format}, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["Content-Encoding"] == "gzip" and first.headers["Vary"] == "Accept-Encoding"
+    assert first.json()["type"] in ("FeatureCollection", "Topology")
+    etag = first.headers["ETag"]
+    again = client.get("/india-map", params={"format": map_format}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    stale = client.get("/india-map", params={"format": map_format}, headers={"If-None-Match": '"stale"'})
+    assert stale.status_code == 200
+    assert client.get("/india-map", params={"format": "svg"}).status_code == 404
+
+
+@pytest.mark.parametrize("path", ["/airports", "/routes"])
+def test_list_etag_not_modified(client, data, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.json() == data[path[1:]]
+    assert first.headers["X-Total-Count"] == str(len(data[path[1:]]))
+    etag = first.headers["ETag"]
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == etag
+    assert client.get(path, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_airports_page_projection_and_bbox(client, data):
+    response = client.get("/airports", params={"fields": "id,lat", "offset": 2, "limit": 3})
+    assert response.json() == [{"id": a["id"], "lat": a["lat"]} for a in data["airports"][2:5]]
+    assert response.headers["X-Total-Count"] == str(len(data["airports"]))
+    again = client.get("/airports", params={"fields": "id,lat", "offset": 2, "limit": 3},
+                       headers={"If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+    box = (72.0, 18.0, 78.0, 24.0)
+    inside = [a["id"] for a in data["airports"]
+              if box[1] <= a["lat"] <= box[3] and box[0] <= a["lng"] <= box[2]]
+    response = client.get("/airports", params={"bbox": ",".join(map(str, box)), "fields": "id"})
+    assert [a["id"] for a in response.json()] == inside
+    routes = client.get("/routes", params={"bbox": ",".join(map(str, box))}).json()
+    assert routes == [r for r in data["routes"] if r["source"] in inside or r["target"] in inside]
+    assert client.get("/airports", params={"bbox": "1,2,3"}).status_code == 400
+
+
+def test_search_stats_after_a_search(client, data):
+    airports = airport_ids(data)
+    client.post("/find-path", json={"source": airports[3], "destination": airports[-3], "metric": "distance"})
+    stats = client.get("/search/stats").json()
+    assert stats["pending"] == 0 and stats["rejected"] == 0
+    assert stats["mode"] in ("thread", "process") and stats["max_pending"] > 0
+
+
+def test_admin_routes(client, data):
+    route = data["routes"][0]
+    update = [{"source": route["source"], "target": route["target"], "cost": 1.0}]
+    assert client.post("/admin/routes", json=update).status_code == 403
+    assert client.get("/admin/routes").status_code == 403
+
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    before = client.get("/admin/routes", headers=headers).json()
+    # Cached before the update, so the update has to invalidate it
+    client.post("/find-path", json={"source": route["source"], "destination": route["target"]})
+    response = client.post("/admin/routes?wait=true", json=update, headers=headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "applied" and response.json()["updates"]["pending"] == 0
+    assert response.json()["updates"]["applied"] == before["applied"] + 1
+    # The one-fare route is now the cheapest way between its airports
+    path = client.post("/find-path", json={"source": route["source"], "destination": route["target"]}).json()
+    assert path["path"] == [route["source"], route["target"]] and path["total_cost"] == 1.0
+
+    queued = client.post("/admin/routes", json=[{**update[0], "cost": route["cost"]}], headers=headers)
+    assert queued.status_code == 202 and queued.json() == {"status": "queued", "pending": 1}
+    # Restore the fare for the tests that follow
+    client.post("/admin/routes?wait=true", json=[], headers=headers)
+    path = client.post("/find-path", json={"source": route["source"], "destination": route["target"]}).json()
+    assert close(path["total_cost"], oracle_distances(data, route["source"], "cost")[route["target"]])
+
+
+def test_admin_routes_refused_with_several_workers(client, main, data, monkeypatch):
+    monkeypatch.setattr(main, "SERVER_WORKERS", 4)
+    route = data["routes"][0]
+    update = [{"source": route["source"], "target": route["target"], "cost": 1.0}]
+    response = client.post("/admin/routes", json=update, headers={"X-Admin-Token": ADMIN_TOKEN})
+    assert response.status_code == 409 and "single server process" in response.json()["detail"]
+    assert client.get("/admin/routes", headers={"X-Admin-Token": ADMIN_TOKEN}).json()["pending"] == 0
+
+
+def test_metrics(client, data):
+    airports = airport_ids(data)
+    client.post("/find-path", json={"source": airports[0], "destination": airports[5]})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    for name in ("http_requests_total", "http_request_duration_seconds_bucket", "search_queue_depth",
+                 "route_cache_misses_total", "route_data_strong_components", "route_updates_applied_total"):
+        assert f"\n{name}" in text, name
+    assert f"route_data_airports {len(airports)}" in text
+
+
+def test_find_path_profile(client, data):
+    airports = airport_ids(data)
+    request = {"source": airports[1], "destination": airports[6], "metric": "distance"}
+    assert client.post("/find-path?profile=cprofile", json=request).status_code == 403
+    response = client.post("/find-path?profile=cprofile", json=request, headers={"X-Admin-Token": ADMIN_TOKEN})
+    assert response.status_code == 200
+    body = response.json()
+    assert "function calls" in body["profile"]
+    # The report is not cached with the result
+    assert client.post("/find-path", json=request).json()["profile"] is None
+
+
+def test_nearest_airports(client, data):
+    point = {"lat": 21.0, "lng": 78.0}
+    response = client.get("/airports/nearest", params={**point, "k": 5})
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "5"
+    nearest = response.json()
+    expected = sorted(data["airports"], key=lambda airport: great_circle_km(point, airport))[:5]
+    assert [airport["id"] for airport in nearest] == [airport["id"] for airport in expected]
+    for airport in nearest:
+        assert abs(airport["distance_km"] - great_circle_km(point, airport)) < 1e-6
+    assert client.get("/airports/nearest", params={"lat": 91, "lng": 78}).status_code == 422
+
+    within = client.get("/airports/within", params={**point, "radius_km": 800, "limit": 2})
+    inside = [airport for airport in data["airports"] if great_circle_km(point, airport) <= 800]
+    assert within.headers["X-Total-Count"] == str(len(inside))
+    assert [airport["id"] for airport in within.json()] == [airport["id"] for airport in expected[:2]]
+
+
+def test_find_path_from_coordinates(client, data):
+    source, destination = data["airports"][0], data["airports"][-1]
+    by_id = client.post("/find-path", json={"source": source["id"], "destination": destination["id"]}).json()
+    nearby = {"lat": source["lat"] + 0.01, "lng": source["lng"] - 0.01}
+    by_place = client.post("/find-path", json={"source": nearby, "destination": destination["id"]}).json()
+    assert by_place["path"] == by_id["path"]
+
+
+def test_graph_stats(client, data):
+    stats = client.get("/graph/stats").json()
+    assert stats["airports"] == len(data["airports"])
+    assert stats["largest_component"] <= stats["airports"]
+    assert sum(stats["component_sizes"]) <= stats["airports"] and stats["components"] >= 1
+
+
+def test_rate_limit_per_client(client, main, data, monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", TokenBuckets(rate=0.01, burst=2))
+    monkeypatch.setattr(main, "RATE_LIMIT_CLIENT_HEADER", "X-Forwarded-For")
+    airports = airport_ids(data)
+    request = {"source": airports[0], "destination": airports[4]}
+    first = {"X-Forwarded-For": "203.0.113.1"}
+    assert [client.post("/find-path", json=request, headers=first).status_code for _ in range(2)] == [200, 200]
+    limited = client.post("/find-path", json=request, headers=first)
+    assert limited.status_code == 429 and int(limited.headers["Retry-After"]) > 0
+    # Entries the client added itself in front of the proxy's are ignored
+    spoofed = {"X-Forwarded-For": "198.51.100.7, 203.0.113.1"}
+    assert client.post("/find-path", json=request, headers=spoofed).status_code == 429
+    assert client.post("/find-path", json=request, headers={"X-Forwarded-For": "203.0.113.2"}).status_code == 200
+    assert client.get("/search/stats").json()["rate_limit"]["limited"] == 2
+
+    # Behind two trusted proxies the client is the second entry from the right
+    monkeypatch.setattr(main, "RATE_LIMIT_PROXY_DEPTH", 2)
+    behind_two = {"X-Forwarded-For": "198.51.100.7, 203.0.113.1, 10.0.0.1"}
+    assert client.post("/find-path", json=request, headers=behind_two).status_code == 429
+
+
+def test_find_paths_counts_one_search_per_group_against_the_rate_limit(client, main, data, monkeypatch):
+    monkeypatch.setattr(main, "rate_limiter", TokenBuckets(rate=0.01, burst=4))
+    airports = airport_ids(data)
+    # Many destinations from one source are a single search
+    batch = [{"source": airports[0], "destination": target} for target in airports[1:30]]
+    response = client.post("/find-paths", json=batch)
+    assert response.status_code == 200 and len(response.text.splitlines()) == len(batch)
+    groups = [{"source": source, "destination": airports[0]} for source in airports[1:4]]
+    assert client.post("/find-paths", json=groups).status_code == 200
+    assert client.post("/find-paths", json=groups).status_code == 429
+    oversized = client.post("/find-paths", json=[{"source": source, "destination": airports[0]}
+                                                 for source in airports[1:6]])
+    assert oversized.status_code == 413 and "burst of 4" in oversized.json()["detail"]
+
+
+def test_route_update_changes_the_routes_etag(client, data):
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    etag = client.get("/routes").headers["ETag"]
+    route = data["routes"][1]
+    update = {"source": route["source"], "target": route["target"], "cost": route["cost"] + 1}
+    client.post("/admin/routes?wait=true", headers=headers, json=[update])
+    response = client.get("/routes", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    changed = next(r for r in response.json() if (r["source"], r["target"]) == (route["source"], route["target"]))
+    assert changed["cost"] == route["cost"] + 1
+    client.post("/admin/routes?wait=true", headers=headers, json=[{**update, "cost": route["cost"]}])
+
+
+def test_rejected_route_updates_are_counted(client):
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    before = client.get("/admin/routes", headers=headers).json()
+    response = client.post("/admin/routes?wait=true", headers=headers,
+                           json=[{"source": "???", "target": "???", "cost": 1.0}])
+    stats = response.json()["updates"]
+    assert stats["rejected"] == before["rejected"] + 1 and stats["applied"] == before["applied"]
+
+
+def test_ch_falls_back_when_updates_outdate_the_hierarchy(client, data):
+    headers = {"X-Admin-Token": ADMIN_TOKEN}
+    route = data["routes"][2]
+    request = {"source": route["source"], "destination": route["target"], "strategy": "ch"}
+    assert client.post("/find-path", json=request).json()["path"]
+
+    # Fares only change the cost hierarchy; the others still answer
+    update = {"source": route["source"], "target": route["target"], "cost": 1.0}
+    client.post("/admin/routes?wait=true", headers=headers, json=[update])
+    assert client.get("/graph/stats").json()["contraction_stale"] == ["cost"]
+    assert client.post("/find-path", json={**request, "metric": "distance"}).status_code == 200
+    response = client.post("/find-path", json=request)
+    assert response.status_code == 200
+    assert response.json()["path"] == [route["source"], route["target"]] and response.json()["total_cost"] == 1.0
+    client.post("/admin/routes?wait=true", headers=headers, json=[{**update, "cost": route["cost"]}])
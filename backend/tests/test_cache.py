@@ -0,0 +1,87 @@
+"""Result cache versioning, eviction and the shared store."""
+from cache import ResultCache, SharedStore
+
+KEY = ("BOM", "DEL", (), "cost", "dijkstra")
+OTHER = ("BOM", "GOI", (), "cost", "dijkstra")
+
+
+def test_put_and_get_under_the_current_version():
+    cache = ResultCache(maxsize=2, version="v1")
+    cache.put(KEY, {"path": ["BOM", "DEL"]}, "v1")
+    assert cache.get(KEY, "v1") == {"path": ["BOM", "DEL"]}
+    assert cache.get(KEY, "v0") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_results_of_an_older_version_are_never_stored():
+    cache = ResultCache(version="v2")
+    cache.put(KEY, {"path": []}, "v1")
+    assert cache.get(KEY, "v1") is None and cache.stats()["size"] == 0
+
+
+def test_lru_eviction():
+    cache = ResultCache(maxsize=2, version="v1")
+    cache.put(KEY, {}, "v1")
+    cache.put(OTHER, {}, "v1")
+    cache.get(KEY, "v1")
+    cache.put(("DEL", "GOI", (), "cost", "dijkstra"), {}, "v1")
+    assert cache.get(OTHER, "v1") is None and cache.get(KEY, "v1") == {}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = ResultCache(version="v1", ttl=0)
+    cache.put(KEY, {}, "v1")
+    assert cache.get(KEY, "v1") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_reset_drops_everything_on_a_version_bump():
+    cache = ResultCache(version="v1")
+    cache.put(KEY, {}, "v1")
+    cache.reset("v2")
+    assert cache.get(KEY, "v1") is None and cache.get(KEY, "v2") is None
+    # A search that started before the bump cannot store its result
+    cache.put(KEY, {"path": ["BOM"]}, "v1")
+    assert cache.stats()["size"] == 0
+    cache.put(KEY, {"path": ["BOM"]}, "v2")
+    assert cache.get(KEY, "v2") == {"path": ["BOM"]}
+
+
+def test_shared_store_serves_every_worker(tmp_path):
+    path = str(tmp_path / "results.db")
+    first = ResultCache(version="v1", store=SharedStore(path, maxsize=100))
+    second = ResultCache(version="v1", store=SharedStore(path, maxsize=100))
+    first.put(KEY, {"path": ["BOM", "DEL"]}, "v1")
+    assert second.get(KEY, "v1") == {"path": ["BOM", "DEL"]}
+    assert second.get(OTHER, "v1") is None
+    # Rows of another data version are never served
+    assert second.get(KEY, "v2") is None
+
+
+def test_migrate_keeps_results_that_are_not_stale():
+    cache = ResultCache(version="v1")
+    cache.put(KEY, {"path": ["BOM", "DEL"]}, "v1")
+    cache.put(OTHER, {"path": ["BOM", "GOI"]}, "v1")
+    dropped = cache.migrate("v2", lambda key, value: "GOI" in value["path"])
+    assert dropped == 1 and cache.stats()["invalidations"] == 1
+    assert cache.get(KEY, "v2") == {"path": ["BOM", "DEL"]}
+    assert cache.get(OTHER, "v2") is None
+
+
+def test_shared_store_migrates_without_clearing_other_workers_rows(tmp_path):
+    path = str(tmp_path / "results.db")
+    first = ResultCache(version="v1", store=SharedStore(path, maxsize=100))
+    second = ResultCache(version="v1", store=SharedStore(path, maxsize=100))
+    first.put(KEY, {"path": ["BOM", "DEL"]}, "v1")
+    first.put(OTHER, {"path": ["BOM", "GOI"]}, "v1")
+
+    def stale(key, value):
+        return "GOI" in value["path"]
+
+    # The first worker moves on; the second still reads the old version's rows
+    first.migrate("v2", stale)
+    assert second.get(OTHER, "v1") == {"path": ["BOM", "GOI"]}
+    second.migrate("v2", stale)
+    assert second.get(KEY, "v2") == {"path": ["BOM", "DEL"]}
+    assert first.get(OTHER, "v2") is None and second.get(OTHER, "v2") is None
@@ -0,0 +1,104 @@
+"""The CSR graph, Dijkstra and (strongly) connected components against the oracle and brute force."""
+import random
+
+import pytest
+
+from conftest import close, oracle_distances
+from graph import METRICS, Graph, connected_components, dijkstra, strongly_connected_components, unreachable_leg
+
+
+def test_every_route_is_an_edge(network, graph):
+    """Both ways unless the network is directed, which keeps each direction as given."""
+    directed = network.get("directed", False)
+    assert graph.ids == [airport["id"] for airport in network["airports"]]
+    assert graph.num_edges == (1 if directed else 2) * len(network["routes"])
+    for route in network["routes"]:
+        u, v = graph.index[route["source"]], graph.index[route["target"]]
+        for e in (graph.edge_index(u, v),) if directed else (graph.edge_index(u, v), graph.edge_index(v, u)):
+            assert e >= 0
+            assert graph.weights["cost"][e] == route["cost"]
+            assert graph.weights["distance"][e] == route["distance"]
+    # The reverse adjacency lists every edge once, at its head
+    incoming = sorted((graph.rev_targets[i], v) for v in range(len(graph))
+                      for i in range(graph.rev_offsets[v], graph.rev_offsets[v + 1]))
+    assert incoming == sorted((u, graph.targets[e]) for u in range(len(graph)) for e in graph.neighbors(u))
+
+
+def test_later_route_records_replace_earlier_ones():
+    airports = [{"id": "A"}, {"id": "B"}]
+    routes = [{"source": "A", "target": "B", "distance": 100.0, "cost": 900},
+              {"source": "B", "target": "A", "distance": 100.0, "cost": 700}]
+    graph = Graph.from_routes(airports, routes)
+    assert graph.num_edges == 2
+    assert graph.weights["cost"][graph.edge_index(0, 1)] == 700
+
+
+def test_dijkstra_matches_oracle(network, graph):
+    rng = random.Random(0)
+    for metric in METRICS:
+        for _ in range(100):
+            start, end = rng.choice(graph.ids), rng.choice(graph.ids)
+            expected = oracle_distances(network, start, metric).get(end)
+            path, *totals = dijkstra(graph, start, end, metric)
+            if expected is None:
+                assert path == []
+                continue
+            assert path[0] == start and path[-1] == end
+            assert close(totals[("cost", "distance", "time").index(metric)], expected)
+
+
+def test_unknown_airports_have_no_path(graph):
+    assert dijkstra(graph, "???", graph.ids[0], "cost") == ([], 0, 0, 0)
+    assert dijkstra(graph, graph.ids[0], graph.ids[0], "cost") == ([graph.ids[0]], 0, 0, 0)
+
+
+def random_graph(rng, directed):
+    """A sparse random graph, so that it falls apart into several components."""
+    n = rng.randint(1, 25)
+    airports = [{"id": f"A{i:02d}", "lat": 0.0, "lng": 0.0} for i in range(n)]
+    routes = [{"source": f"A{rng.randrange(n):02d}", "target": f"A{rng.randrange(n):02d}",
+               "distance": 100.0, "cost": 1000.0} for _ in range(rng.randint(0, 2 * n))]
+    return Graph.from_routes(airports, routes, directed=directed)
+
+
+def reachable(graph, source):
+    seen = {source}
+    stack = [source]
+    while stack:
+        u = stack.pop()
+        for e in graph.neighbors(u):
+            v = graph.targets[e]
+            if v not in seen:
+                seen.add(v)
+                stack.append(v)
+    return seen
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_components_match_reachability(directed):
+    rng = random.Random(8)
+    for _ in range(40):
+        graph = random_graph(rng, directed)
+        n = len(graph)
+        reach = [reachable(graph, u) for u in range(n)]
+        weak = connected_components(graph)
+        strong = strongly_connected_components(graph)
+        assert sum(strong.sizes) == n and sum(weak.sizes) == n
+        for u in range(n):
+            for v in range(n):
+                assert strong.connected(u, v) == (v in reach[u] and u in reach[v])
+                leg = unreachable_leg(graph, [graph.ids[u], graph.ids[v]])
+                if v in reach[u]:
+                    # Weak components never separate a reachable pair
+                    assert weak.connected(u, v) and leg is None
+                    # Strong components are numbered in topological order
+                    assert strong.labels[u] <= strong.labels[v]
+                elif not directed:
+                    assert not weak.connected(u, v)
+                    assert leg == (graph.ids[u], graph.ids[v])
+
+
+def test_components_are_cached():
+    graph = random_graph(random.Random(1), directed=True)
+    assert strongly_connected_components(graph) is strongly_connected_components(graph)
+    assert connected_components(graph) is graph.derived["components"]
@@ -0,0 +1,103 @@
+"""The streaming ingestion parser and pipeline against loading the whole dump."""
+import io
+import json
+
+import pytest
+
+import ingest
+from benchmarks.bench_ingest import raw_records, write_dumps
+from graph import Graph
+
+
+@pytest.fixture
+def dumps(tmp_path):
+    """The same 300 records as a pretty-printed JSON array and as NDJSON."""
+    return write_dumps(str(tmp_path), 300, 40, seed=3)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 16])
+def test_json_array_parser_matches_json_load(monkeypatch, chunk_size):
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", chunk_size)
+    values = [{"name": "a, [b]", "nested": {"list": [1, 2.5, -3e2]}}, 12345, "ünïcode \"quoted\"",
+              [], {}, True, None, 0.125]
+    text = " \n[ " + ",\n  ".join(json.dumps(value) for value in values) + " ]\n"
+    assert list(ingest._json_array(io.StringIO(text))) == values
+    assert list(ingest._json_array(io.StringIO("[]"))) == []
+    # Numbers cut short at any point by the end of a chunk
+    assert list(ingest._json_array(io.StringIO("[12.75,-1.5e-3,2E+10,6]"))) == [12.75, -1.5e-3, 2E+10, 6]
+
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "[1 2]", "[1, 2", "[12x]", '[{"a": 1}, {"b": ]'])
+def test_json_array_parser_rejects_malformed_input(monkeypatch, text):
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", 3)
+    with pytest.raises(ValueError):
+        list(ingest._json_array(io.StringIO(text)))
+
+
+def test_array_and_ndjson_give_the_same_output(dumps, tmp_path):
+    array_file, ndjson_file = dumps
+    assert ingest.detect_format(array_file) == "array"
+    assert ingest.detect_format(ndjson_file) == "ndjson"
+    outputs = []
+    for path in dumps:
+        output = str(tmp_path / "out.json")
+        counts = ingest.ingest(path, output)
+        assert counts["records"] == counts["routes"] == counts["flights"] == 300
+        with open(output, encoding="utf-8") as f:
+            outputs.append(json.load(f))
+    assert outputs[0] == outputs[1]
+
+    records = list(raw_records(300, 40, seed=3))
+    data = outputs[0]
+    assert [(r["source"], r["target"], r["cost"]) for r in data["routes"]] == \
+        [(r["origin_airport"], r["destination_airport"], r["flight_price_inr"]) for r in records]
+    assert [f["departure"] for f in data["flights"]] == [r["departure_time"] for r in records]
+    airports = {a["id"]: a for a in data["airports"]}
+    assert len(airports) == counts["airports"]
+    for record in records:
+        airport = airports[record["origin_airport"]]
+        assert (airport["lat"], airport["lng"]) == (record["origin_lat"], record["origin_lng"])
+        assert "x" in airport and "y" in airport
+
+
+def test_streamed_reduction_matches_the_batch_reduction(dumps, tmp_path):
+    pytest.importorskip("numpy")
+    from reduce_connections import reduce_network
+
+    array_file, _ = dumps
+    full, reduced = str(tmp_path / "full.json"), str(tmp_path / "reduced.json")
+    ingest.ingest(array_file, full)
+    ingest.ingest(array_file, reduced, reduce_network=True, seed=5)
+    with open(full, encoding="utf-8") as f:
+        data = json.load(f)
+    with open(reduced, encoding="utf-8") as f:
+        streamed = json.load(f)
+
+    expected, _ = reduce_network(data["airports"], data["routes"], seed=5)
+    assert streamed["routes"] == expected
+    assert all("lat" in airport and "lng" in airport for airport in streamed["airports"])
+    # Only flights of routes that survived are kept
+    links = {frozenset((r["source"], r["target"])) for r in expected}
+    assert all(frozenset((f["source"], f["target"])) in links for f in streamed["flights"])
+
+
+def test_directed_output_keeps_each_direction(dumps, tmp_path):
+    array_file, _ = dumps
+    output = str(tmp_path / "directed.json")
+    ingest.ingest(array_file, output, directed=True)
+    with open(output, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["directed"] is True
+    graph = Graph.from_data(data)
+    for route in data["routes"][:50]:
+        assert graph.edge_index(graph.index[route["source"]], graph.index[route["target"]]) >= 0
+    assert graph.num_edges <= len(data["routes"])
+
+
+def test_bad_schedule_time_names_the_record(tmp_path):
+    record = next(raw_records(1, 5, seed=1))
+    record["arrival_time"] = "24:30"
+    path = tmp_path / "raw.ndjson"
+    path.write_text(json.dumps(record) + "\n")
+    with pytest.raises(ValueError, match=record["flight_number"]):
+        ingest.ingest(str(path), str(tmp_path / "out.json"))
@@ -0,0 +1,169 @@
+"""Content negotiation, ETags and the TopoJSON conversion of the India map."""
+import gzip
+import json
+import os
+
+import pytest
+
+from map_assets import StaticAsset, geojson_to_topojson
+
+MAP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "in.json")
+
+
+@pytest.fixture
+def asset():
+    return StaticAsset(b'{"type": "FeatureCollection", "features": []}' * 20)
+
+
+def test_variants_decode_to_the_content(asset):
+    assert gzip.decompress(asset.variants["gzip"]) == asset.variants["identity"]
+    assert len(set(asset.etags.values())) == len(asset.variants)
+
+
+@pytest.mark.parametrize("header, best", [
+    (None, "identity"),
+    ("", "identity"),
+    ("gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("gzip;q=0", "identity"),
+    ("identity;q=0.5, gzip;q=0.4", "identity"),
+    ("identity;q=0.1, gzip;q=0.4", "gzip"),
+    ("gzip;q=oops", "identity"),
+    ("deflate", "identity"),
+])
+def test_negotiate_without_brotli(asset, header, best):
+    asset.variants.pop("br", None)
+    assert asset.negotiate(header) == best
+
+
+@pytest.mark.parametrize("header, best", [
+    ("gzip, br", "br"),
+    ("*", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, *", "gzip"),
+])
+def test_negotiate_prefers_brotli_on_ties(asset, header, best):
+    # The same negotiation whether or not the brotli package is installed
+    asset.variants.setdefault("br", b"")
+    assert asset.negotiate(header) == best
+
+
+def test_matches_any_representation(asset):
+    assert not asset.matches(None)
+    assert asset.matches("*")
+    assert asset.matches(asset.etags["gzip"])
+    assert asset.matches(f'"other", W/{asset.etags["identity"]}')
+    assert not asset.matches('"other"')
+
+
+def square(x, y):
+    return [[x, y], [x + 1, y], [x + 1, y + 1], [x, y + 1], [x, y]]
+
+
+def feature(name, *rings):
+    return {"type": "Feature", "properties": {"name": name},
+            "geometry": {"type": "Polygon", "coordinates": [list(ring) for ring in rings]}}
+
+
+def decode_arcs(topology):
+    """Absolute grid points of every arc, undoing the delta encoding."""
+    arcs = []
+    for deltas in topology["arcs"]:
+        x = y = 0
+        points = []
+        for dx, dy in deltas:
+            x, y = x + dx, y + dy
+            points.append((x, y))
+        arcs.append(points)
+    return arcs
+
+
+def ring_points(arc_ids, arcs):
+    points = []
+    for arc_id in arc_ids:
+        arc = arcs[arc_id] if arc_id >= 0 else arcs[~arc_id][::-1]
+        if points:
+            assert points[-1] == arc[0], "consecutive arcs must join up"
+            arc = arc[1:]
+        points.extend(arc)
+    assert points[0] == points[-1], "a ring must close"
+    return points[:-1]
+
+
+def snapped_ring(ring, transform):
+    """A ring on the quantisation grid with repeated points dropped, as the conversion should store it."""
+    (kx, ky), (x0, y0) = transform["scale"], transform["translate"]
+    points = []
+    for x, y in ring:
+        point = (round((x - x0) / kx), round((y - y0) / ky))
+        if not points or points[-1] != point:
+            points.append(point)
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points if len(points) >= 3 else None
+
+
+def same_cycle(points, expected):
+    if len(points) != len(expected) or points[0] not in expected:
+        return False
+    start = expected.index(points[0])
+    return points == expected[start:] + expected[:start]
+
+
+def check_round_trip(geojson, topology):
+    """Every ring of ``geojson`` comes back from the topology's arcs, in the same direction."""
+    arcs = decode_arcs(topology)
+    geometries = iter(topology["objects"]["states"]["geometries"])
+    for feature_ in geojson["features"]:
+        kind = feature_["geometry"]["type"]
+        polygons = [feature_["geometry"]["coordinates"]] if kind == "Polygon" else feature_["geometry"]["coordinates"]
+        expected = [[r for r in (snapped_ring(ring, topology["transform"]) for ring in polygon) if r]
+                    for polygon in polygons]
+        expected = [polygon for polygon in expected if polygon]
+        if not expected:
+            continue
+        geometry = next(geometries)
+        assert geometry["properties"] == feature_.get("properties")
+        encoded = [geometry["arcs"]] if geometry["type"] == "Polygon" else geometry["arcs"]
+        assert len(encoded) == len(expected)
+        for polygon, rings in zip(encoded, expected):
+            assert len(polygon) == len(rings)
+            for arc_ids, ring in zip(polygon, rings):
+                assert same_cycle(ring_points(arc_ids, arcs), ring)
+
+
+def test_shared_border_is_stored_once():
+    geojson = {"type": "FeatureCollection", "features": [feature("west", square(0, 0)),
+                                                          feature("east", square(1, 0))]}
+    topology = geojson_to_topojson(geojson, quantization=3)
+    check_round_trip(geojson, topology)
+    west, east = (geometry["arcs"][0] for geometry in topology["objects"]["states"]["geometries"])
+    shared = {a if a >= 0 else ~a for a in west} & {a if a >= 0 else ~a for a in east}
+    assert len(shared) == 1
+    # Walked one way by each state, so referenced once as is and once reversed
+    (arc,) = shared
+    assert {arc, ~arc} <= set(west) | set(east)
+    # Two outer borders and the shared one
+    assert len(topology["arcs"]) == 3
+
+
+def test_island_ring_without_junctions_is_one_arc():
+    geojson = {"type": "FeatureCollection", "features": [feature("island", square(0, 0))]}
+    topology = geojson_to_topojson(geojson, quantization=2)
+    check_round_trip(geojson, topology)
+    assert topology["objects"]["states"]["geometries"][0]["arcs"] == [[0]]
+    # Delta encoded: the first point is absolute, the rest are steps
+    assert topology["arcs"][0] == [[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]]
+
+
+def test_india_map_round_trips():
+    with open(MAP_FILE, encoding="utf-8") as f:
+        geojson = json.load(f)
+    topology = geojson_to_topojson(geojson, quantization=10000)
+    check_round_trip(geojson, topology)
+    stored = sum(len(arc) for arc in topology["arcs"])
+    original = sum(len(ring) for f in geojson["features"] for polygon in
+                   ([f["geometry"]["coordinates"]] if f["geometry"]["type"] == "Polygon"
+                    else f["geometry"]["coordinates"]) for ring in polygon)
+    # Shared borders are stored once
+    assert stored < original
@@ -0,0 +1,19 @@
+"""Profiled searches, one at a time."""
+import profiling
+
+
+def test_profiled_reports_the_call():
+    result, report = profiling.profiled("cprofile", sorted, [3, 1, 2])
+    assert result == [1, 2, 3]
+    assert "function calls" in report
+
+
+def test_overlapping_calls_run_unprofiled():
+    def nested():
+        return profiling.profiled("cprofile", sum, [1, 2, 3])
+
+    (result, inner), outer = profiling.profiled("cprofile", nested)
+    assert result == 6 and inner is None
+    assert "function calls" in outer
+    # The lock is released again afterwards
+    assert profiling.profiled("cprofile", sum, [1])[1] is not None
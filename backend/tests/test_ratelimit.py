@@ -0,0 +1,45 @@
+"""Token buckets against a fake clock."""
+import pytest
+
+import ratelimit
+from ratelimit import TokenBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_refill(clock):
+    buckets = TokenBuckets(rate=2, burst=5)
+    assert all(buckets.take("a") == 0.0 for _ in range(5))
+    assert buckets.take("a") == pytest.approx(0.5)
+    # Another client has a bucket of its own
+    assert buckets.take("b", 5) == 0.0
+    clock[0] += 1.0
+    assert buckets.take("a", 2) == 0.0 and buckets.take("a") > 0
+    clock[0] += 60
+    # Refilling stops at the burst size
+    assert buckets.take("a", 5) == 0.0 and buckets.take("a") > 0
+    assert buckets.stats()["allowed"] == 8 and buckets.stats()["limited"] == 3
+
+
+def test_refused_requests_take_nothing(clock):
+    buckets = TokenBuckets(rate=1, burst=4)
+    buckets.take("a", 3)
+    assert buckets.take("a", 2) == pytest.approx(1.0)
+    assert buckets.take("a", 1) == 0.0
+
+
+def test_least_recently_seen_clients_are_dropped(clock):
+    buckets = TokenBuckets(rate=1, burst=1, max_clients=2)
+    buckets.take("a")
+    buckets.take("b")
+    buckets.take("a")
+    buckets.take("c")
+    assert buckets.stats()["clients"] == 2
+    # "b" was dropped and starts again with a full bucket; "c" kept its empty one
+    assert buckets.take("b") == 0.0
+    assert buckets.take("c") > 0
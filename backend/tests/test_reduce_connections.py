@@ -0,0 +1,73 @@
+"""The grid nearest-neighbour search against brute force, and the reduction it drives."""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from reduce_connections import (MIN_CONNECTIONS, count_components, haversine, located_airports,
+                                nearest_neighbours, reduce_network)
+
+
+def airports(count, seed, spread=20.0):
+    rng = random.Random(seed)
+    return [{"id": f"A{i:03d}", "name": f"Airport {i}",
+             "lat": 8 + rng.uniform(0, spread), "lng": 68 + rng.uniform(0, spread)} for i in range(count)]
+
+
+def full_network(airports):
+    """Routes between every pair of airports, as in the unreduced data."""
+    return [{"source": a["id"], "target": b["id"], "distance": 0, "cost": 0, "direct": True}
+            for a in airports for b in airports if a is not b]
+
+
+def coordinates(airports):
+    return (np.array([a["lat"] for a in airports]), np.array([a["lng"] for a in airports]))
+
+
+@pytest.mark.parametrize("count, seed, spread", [(200, 1, 20.0), (150, 2, 0.5), (5, 3, 20.0)])
+def test_nearest_neighbours_match_brute_force(count, seed, spread):
+    lat, lng = coordinates(airports(count, seed, spread))
+    indices, distances = nearest_neighbours(lat, lng, k=8, workers=2)
+    matrix = haversine(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+    np.fill_diagonal(matrix, np.inf)
+    expected = np.sort(matrix, axis=1)[:, :8]
+    # Rows of tiny inputs are padded
+    expected = np.pad(expected, ((0, 0), (0, 8 - expected.shape[1])), constant_values=np.inf)
+    found = np.where(indices >= 0, np.take_along_axis(matrix, np.maximum(indices, 0), axis=1), np.inf)
+    assert np.allclose(found, expected) and np.allclose(distances, expected)
+    assert not (indices == np.arange(count)[:, None]).any()
+
+
+def test_every_airport_ends_up_connected():
+    located = airports(120, seed=4)
+    # Two remote airports far from everything else still get their routes
+    located += [{"id": "R1", "name": "Remote 1", "lat": -40.0, "lng": 170.0},
+                {"id": "R2", "name": "Remote 2", "lat": 60.0, "lng": -30.0}]
+    routes, connections = reduce_network(located, full_network(located), seed=4)
+    ids = {a["id"] for a in located}
+    assert all(count >= MIN_CONNECTIONS for count in connections.values())
+    pairs = [(r["source"], r["target"]) for r in routes]
+    assert len(pairs) == len(set(pairs))
+    for route in routes:
+        assert route["source"] in ids and route["target"] in ids and route["source"] != route["target"]
+        assert route["cost"] > 0 and route["distance"] > 0
+
+
+def test_airports_without_coordinates_are_left_out_of_a_connected_network():
+    network = airports(60, seed=6) + [{"id": "X1", "name": "Unplaced"}]
+    routes, _ = reduce_network(network, full_network(network), seed=6)
+    assert all("X1" not in (route["source"], route["target"]) for route in routes)
+    assert count_components(network, routes) == 2
+    located = located_airports(network)
+    assert [a["id"] for a in located] == [a["id"] for a in network[:-1]]
+    assert count_components(located, routes) == 1
+
+
+def test_seed_makes_the_output_reproducible():
+    located = airports(150, seed=5)
+    first = reduce_network(located, full_network(located), seed=9, workers=1)
+    again = reduce_network(located, full_network(located), seed=9, workers=3)
+    other = reduce_network(located, full_network(located), seed=10)
+    assert first == again
+    assert first[0] != other[0]
@@ -0,0 +1,197 @@
+"""Route searches and the precomputed route table against the reference oracle."""
+import random
+
+import pytest
+
+from alternatives import k_shortest_paths
+from contraction import ContractionHierarchy, build_hierarchy
+from conftest import close, directed_network, oracle_distances, path_weight, random_network
+from graph import METRICS, Graph, TreeCache, route_via
+from pareto import CRITERIA, dominates, pareto_search
+from route_table import RouteTable, build_route_table, file_sha256
+from search import ASTAR_METRICS, STRATEGIES
+
+# Position of each metric's total in a ``dijkstra`` style result
+TOTALS = {"cost": 1, "distance": 2, "time": 3}
+
+# (source, target) pairs checked per network
+PAIRS = 150
+
+
+def sample_pairs(graph, seed=0):
+    rng = random.Random(seed)
+    n = len(graph)
+    return [(rng.randrange(n), rng.randrange(n)) for _ in range(PAIRS)]
+
+
+def attach_hierarchy(graph, data_file, hierarchy_file, **options):
+    build_hierarchy(data_file, hierarchy_file, workers=1, **options)
+    graph.derived["contraction"] = ContractionHierarchy(hierarchy_file)
+    return graph
+
+
+@pytest.fixture
+def hierarchy_graph(graph, data_file, tmp_path):
+    """``graph`` with its contraction hierarchy attached, as the server does."""
+    return attach_hierarchy(graph, data_file, str(tmp_path / "contraction.bin"))
+
+
+@pytest.mark.parametrize("strategy", sorted(STRATEGIES))
+@pytest.mark.parametrize("metric", METRICS)
+def test_strategy_matches_oracle(network, hierarchy_graph, strategy, metric):
+    if strategy == "astar" and metric not in ASTAR_METRICS:
+        pytest.skip("A* has no admissible heuristic for cost")
+    graph = hierarchy_graph
+    search = STRATEGIES[strategy]
+    oracle = {}
+    for source, target in sample_pairs(graph):
+        if source not in oracle:
+            oracle[source] = oracle_distances(network, graph.ids[source], metric)
+        expected = oracle[source].get(graph.ids[target])
+        nodes, _, _ = search(graph, source, target, metric)
+        if expected is None:
+            assert nodes == [], f"{strategy} found a route where there is none"
+            continue
+        assert nodes[0] == source and nodes[-1] == target
+        assert close(path_weight(graph, nodes, metric), expected), \
+            f"{strategy} {graph.ids[source]} -> {graph.ids[target]} by {metric}"
+
+
+
+@pytest.mark.parametrize("metric", METRICS)
+def test_ch_with_a_large_core_matches_oracle(network, graph, data_file, tmp_path, metric):
+    # A low core degree stops contraction early, leaving a core of airports
+    graph = attach_hierarchy(graph, data_file, str(tmp_path / "contraction.bin"), core_degree=4.5)
+    oracle = {}
+    for source, target in sample_pairs(graph, seed=1):
+        if source not in oracle:
+            oracle[source] = oracle_distances(network, graph.ids[source], metric)
+        expected = oracle[source].get(graph.ids[target])
+        nodes, _, _ = STRATEGIES["ch"](graph, source, target, metric)
+        if expected is None:
+            assert nodes == []
+            continue
+        assert close(path_weight(graph, nodes, metric), expected)
+
+
+def test_route_table_matches_oracle(network, graph, data_file, tmp_path):
+    table_file = str(tmp_path / "route_table.bin")
+    assert build_route_table(data_file, table_file, workers=1)
+    table = RouteTable(table_file)
+    assert table.matches(graph, file_sha256(data_file))
+    n = len(graph)
+    for metric in METRICS:
+        for source in range(0, n, 7):
+            expected = oracle_distances(network, graph.ids[source], metric)
+            for target in range(n):
+                want = expected.get(graph.ids[target])
+                result = table.lookup(graph, graph.ids[source], graph.ids[target], metric)
+                if want is None:
+                    assert table.dist[metric][source * n + target] == float("inf")
+                    assert result[0] == []
+                    continue
+                assert close(table.dist[metric][source * n + target], want)
+                assert result[0][0] == graph.ids[source] and result[0][-1] == graph.ids[target]
+                assert close(result[TOTALS[metric]], want)
+
+
+def test_pooled_route_table_build_writes_the_same_file(data_file, tmp_path):
+    serial, pooled = str(tmp_path / "serial.bin"), str(tmp_path / "pooled.bin")
+    build_route_table(data_file, serial, workers=1)
+    build_route_table(data_file, pooled, workers=2)
+    with open(serial, "rb") as a, open(pooled, "rb") as b:
+        assert a.read() == b.read()
+
+
+def test_route_table_is_only_rebuilt_when_the_data_changes(data_file, tmp_path):
+    table_file = str(tmp_path / "route_table.bin")
+    assert build_route_table(data_file, table_file, workers=1)
+    assert not build_route_table(data_file, table_file, workers=1)
+    with open(data_file, "a") as f:
+        f.write("\n")
+    assert build_route_table(data_file, table_file, workers=1)
+
+
+def test_route_via_sums_its_legs(network, graph):
+    rng = random.Random(1)
+    for _ in range(40):
+        waypoints = [rng.choice(graph.ids) for _ in range(rng.randint(2, 5))]
+        path, total_cost, _, _, failed_leg = route_via(graph, waypoints, "cost", TreeCache(graph))
+        legs = [oracle_distances(network, a, "cost").get(b) for a, b in zip(waypoints, waypoints[1:])]
+        if None in legs:
+            first = legs.index(None)
+            assert failed_leg == (waypoints[first], waypoints[first + 1])
+            assert path == []
+            continue
+        assert failed_leg is None
+        assert path[0] == waypoints[0] and path[-1] == waypoints[-1]
+        assert close(total_cost, sum(legs))
+
+
+def test_shared_trees_answer_like_separate_searches(graph):
+    rng = random.Random(2)
+    trees = TreeCache(graph)
+    for _ in range(40):
+        waypoints = [rng.choice(graph.ids) for _ in range(rng.randint(2, 4))]
+        shared = route_via(graph, waypoints, "distance", trees)
+        alone = route_via(graph, waypoints, "distance")
+        assert shared[-1] == alone[-1]
+        assert close(shared[2], alone[2])
+
+
+@pytest.fixture(params=["undirected", "directed"])
+def small_graph(request):
+    """A network small enough to enumerate every simple route."""
+    if request.param == "directed":
+        return Graph.from_data(directed_network(12, seed=3))
+    return Graph.from_data(random_network(12, seed=3))
+
+
+def simple_paths(graph, source, target):
+    """Every loopless route between two node indices, as node lists."""
+    paths = []
+    stack = [[source]]
+    while stack:
+        nodes = stack.pop()
+        if nodes[-1] == target:
+            paths.append(nodes)
+            continue
+        for e in graph.neighbors(nodes[-1]):
+            v = graph.targets[e]
+            if v not in nodes:
+                stack.append(nodes + [v])
+    return paths
+
+
+# Pairs checked on the small graph; airport 11 has no routes and, when directed,
+# nothing leaves airport 10
+SMALL_PAIRS = [(0, 5), (3, 10), (10, 3), (7, 2), (9, 1), (4, 11)]
+
+
+def test_yen_matches_enumeration(small_graph):
+    graph = small_graph
+    for source, target in SMALL_PAIRS:
+        for metric in ("cost", "distance"):
+            weights = sorted(path_weight(graph, nodes, metric) for nodes in simple_paths(graph, source, target))
+            routes, _ = k_shortest_paths(graph, source, target, metric, 8)
+            assert len(routes) == min(8, len(weights))
+            assert len({tuple(nodes) for nodes, _, _ in routes}) == len(routes)
+            for (nodes, _, weight), expected in zip(routes, weights):
+                assert len(set(nodes)) == len(nodes)
+                assert close(path_weight(graph, nodes, metric), weight)
+                assert close(weight, expected)
+
+
+def test_pareto_matches_enumeration(small_graph):
+    graph = small_graph
+    for source, target in SMALL_PAIRS:
+        vectors = [tuple(path_weight(graph, nodes, metric) for metric in CRITERIA)
+                   for nodes in simple_paths(graph, source, target)]
+        front = {tuple(round(x, 6) for x in vector) for vector in vectors
+                 if not any(dominates(other, vector) and other != vector for other in vectors)}
+        routes, _, truncated = pareto_search(graph, source, target, max_labels=1000)
+        assert not truncated
+        assert {tuple(round(x, 6) for x in vector) for _, vector in routes} == front
+        for nodes, vector in routes:
+            assert nodes[0] == source and nodes[-1] == target
+            assert all(close(path_weight(graph, nodes, metric), x) for metric, x in zip(CRITERIA, vector))
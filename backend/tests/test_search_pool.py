@@ -0,0 +1,89 @@
+"""Coalescing of identical concurrent searches, and the search queue's limits."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from search_pool import SearchBusy, SearchExecutor, SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    async def run():
+        flight = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def search(key):
+            calls.append(key)
+            await release.wait()
+            return f"route {key}"
+
+        waiting = [asyncio.ensure_future(flight.do(key, lambda key=key: search(key))) for key in "aaab"]
+        await asyncio.sleep(0)
+        assert flight.stats() == {"in_flight": 2, "started": 2, "coalesced": 2}
+        release.set()
+        results = await asyncio.gather(*waiting)
+        # Finished calls are forgotten; a later caller searches again
+        again = await flight.do("a", lambda: search("a"))
+        return calls, results, again, flight.stats()
+
+    calls, results, again, stats = asyncio.run(run())
+    assert calls == ["a", "b", "a"]
+    assert results == [("route a", False), ("route a", True), ("route a", True), ("route b", False)]
+    assert again == ("route a", False)
+    assert stats["in_flight"] == 0
+
+
+def test_errors_reach_every_caller_and_cancelling_one_spares_the_rest():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise ValueError("no route")
+
+        async def slow():
+            await release.wait()
+            return "route"
+
+        failures = [asyncio.ensure_future(flight.do("x", failing)) for _ in range(3)]
+        first, second = (asyncio.ensure_future(flight.do("y", slow)) for _ in range(2))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        outcomes = await asyncio.gather(*failures, return_exceptions=True)
+        return outcomes, await second, first.cancelled()
+
+    outcomes, second, cancelled = asyncio.run(run())
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert second == ("route", True) and cancelled
+
+
+def test_full_queue_refuses_and_timed_out_searches_free_their_slot():
+    executor = SearchExecutor(max_pending=1, timeout=0.05)
+    gate = threading.Event()
+
+    async def run():
+        first = asyncio.ensure_future(executor.call(gate.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(SearchBusy):
+            await executor.call(gate.wait)
+        with pytest.raises(asyncio.TimeoutError):
+            await first
+
+    try:
+        asyncio.run(run())
+        # The timed out search still holds its slot until it really ends
+        assert executor.stats()["pending"] == 1
+        gate.set()
+        deadline = time.monotonic() + 5
+        while executor.stats()["pending"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = executor.stats()
+        assert stats["pending"] == 0
+        assert stats["rejected"] == 1 and stats["timeouts"] == 1
+    finally:
+        gate.set()
+        executor.shutdown()
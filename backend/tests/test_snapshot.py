@@ -0,0 +1,134 @@
+"""The binary snapshot and searches in worker processes give the same answers as the JSON graph."""
+import asyncio
+import random
+from multiprocessing import shared_memory
+
+import pytest
+
+from alternatives import alternative_routes
+from binary_snapshot import SnapshotFile, write_snapshot
+from contraction import build_hierarchy
+from graph import METRICS
+from pareto import pareto_search
+from search_pool import SearchExecutor, find_route
+from snapshot import load_snapshot
+from updates import apply_updates
+
+
+@pytest.fixture
+def snapshot_file(data_file, tmp_path):
+    path = str(tmp_path / "data.snap")
+    assert write_snapshot(data_file, path)
+    return path
+
+
+def test_snapshot_graph_matches_json(graph, data_file, snapshot_file):
+    mapped = SnapshotFile(snapshot_file).graph()
+    assert mapped.ids == graph.ids
+    assert mapped.directed == graph.directed
+    assert list(mapped.offsets) == list(graph.offsets)
+    assert list(mapped.targets) == list(graph.targets)
+    for metric in METRICS:
+        assert list(mapped.weights[metric]) == list(graph.weights[metric])
+    assert list(mapped.lat) == list(graph.lat) and list(mapped.lng) == list(graph.lng)
+    if graph.directed:
+        assert list(mapped.rev_offsets) == list(graph.rev_offsets)
+        assert list(mapped.rev_edges) == list(graph.rev_edges)
+    # Already current, so not written again
+    assert not write_snapshot(data_file, snapshot_file)
+
+
+def test_snapshot_is_mapped_when_current(network, data_file, snapshot_file):
+    snapshot = load_snapshot(data_file, snapshot_file=snapshot_file)
+    assert snapshot.records is not None and snapshot.source_file == snapshot_file
+    assert snapshot.count("airports") == len(network["airports"])
+    assert snapshot.airports == network["airports"]
+
+    # A changed data file makes the snapshot out of date
+    with open(data_file, "a") as f:
+        f.write("\n")
+    assert load_snapshot(data_file, snapshot_file=snapshot_file).records is None
+
+
+def test_process_workers_match_local_search(data_file, snapshot_file, tmp_path):
+    hierarchy_file = str(tmp_path / "contraction.bin")
+    build_hierarchy(data_file, hierarchy_file, workers=1)
+    snapshot = load_snapshot(data_file, hierarchy_file=hierarchy_file, snapshot_file=snapshot_file)
+    assert snapshot.hierarchy is not None
+    graph = snapshot.graph
+    rng = random.Random(2)
+    queries = [([rng.choice(graph.ids) for _ in range(rng.randint(2, 4))], metric, strategy)
+               for metric in ("cost", "distance")
+               for strategy in ("dijkstra", "bidirectional", "alt", "ch")
+               for _ in range(5)]
+
+    executor = SearchExecutor(workers=1, max_pending=len(queries))
+    try:
+        executor.publish(snapshot)
+
+        async def run():
+            return await asyncio.gather(*(executor.find_route(snapshot, *query) for query in queries))
+
+        results = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert executor.stats()["rejected"] == 0
+    for query, result in zip(queries, results):
+        expected = find_route(graph, *query)
+        # Path and totals; the work counts may differ between processes
+        assert result[:5] == expected[:5], query
+
+
+def test_alternative_and_pareto_searches_run_in_process_workers(data_file, snapshot_file):
+    snapshot = load_snapshot(data_file, snapshot_file=snapshot_file)
+    graph = snapshot.graph
+    source, target = graph.ids[1], graph.ids[-2]
+    executor = SearchExecutor(workers=1)
+    try:
+        executor.publish(snapshot)
+
+        async def run():
+            return await asyncio.gather(
+                executor.on_graph(snapshot, alternative_routes, source, target, "cost", 3),
+                executor.on_graph(snapshot, pareto_search, graph.index[source], graph.index[target], 8))
+
+        alternatives, pareto = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert alternatives[0] == alternative_routes(graph, source, target, "cost", 3)[0]
+    assert pareto[0] == pareto_search(graph, graph.index[source], graph.index[target], 8)[0]
+
+
+def test_fare_updates_share_the_unchanged_arrays_with_workers(data_file, snapshot_file):
+    snapshot = load_snapshot(data_file, snapshot_file=snapshot_file)
+    graph = snapshot.graph
+    executor = SearchExecutor(workers=1)
+    try:
+        executor.publish(snapshot)
+        first = executor._shared[snapshot.version]
+        route = snapshot.routes[0]
+        updated, _ = apply_updates(snapshot, [{**route, "cost": 1.0}])
+        executor.publish(updated)
+        shared = executor._shared[updated.version]
+        # Only the cost weights are copied; the rest stays in the first block
+        assert shared.copied_bytes == 8 * graph.num_edges
+        assert first.blocks[0] in shared.blocks and first.blocks[0].holders == 1
+
+        # The one-fare route is the cheapest only with the new weights
+        queries = [[route["source"], route["target"]]]
+        queries += [[graph.ids[i], graph.ids[-2]] for i in range(0, len(graph) - 2, 5)]
+
+        async def run():
+            return await asyncio.gather(*(executor.find_route(updated, query, "cost", "dijkstra")
+                                          for query in queries))
+
+        results = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert results[0][1] == 1.0
+    # Every block is unlinked once the last copy using it is retired
+    for block in shared.blocks:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=block.shm.name)
+    for query, result in zip(queries, results):
+        assert result[:5] == find_route(updated.graph, query, "cost", "dijkstra")[:5], query
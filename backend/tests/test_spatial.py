@@ -0,0 +1,68 @@
+"""The airport KD-tree against a brute-force scan of great-circle distances."""
+import math
+import random
+
+import pytest
+
+from conftest import great_circle_km
+from spatial import AirportIndex
+
+QUERIES = 200
+
+
+@pytest.fixture(scope="module")
+def points():
+    """Clustered and world-wide airports, a few across the antimeridian and some without coordinates."""
+    rng = random.Random(8)
+    lat = [rng.uniform(8, 32) for _ in range(300)] + [rng.uniform(-89, 89) for _ in range(200)]
+    lng = [rng.uniform(68, 92) for _ in range(300)] + [rng.uniform(-180, 180) for _ in range(200)]
+    lat += [0.0, 0.5, -0.5, math.nan, 10.0]
+    lng += [179.9, -179.9, 180.0, 0.0, math.nan]
+    return lat, lng
+
+
+def distance(point, lat, lng):
+    return great_circle_km({"lat": point[0], "lng": point[1]}, {"lat": lat, "lng": lng})
+
+
+def brute_force(lat, lng, point):
+    found = [(distance(point, lat[i], lng[i]), i) for i in range(len(lat))
+             if not (math.isnan(lat[i]) or math.isnan(lng[i]))]
+    return sorted(found)
+
+
+def queries(seed):
+    rng = random.Random(seed)
+    return [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(QUERIES // 2)] + \
+        [(rng.uniform(8, 32), rng.uniform(68, 92)) for _ in range(QUERIES // 2)]
+
+
+def test_nearest_matches_brute_force(points):
+    lat, lng = points
+    index = AirportIndex(lat, lng)
+    assert len(index) == len(lat) - 2
+    for point in queries(1) + [(0.0, -179.95)]:
+        for k in (1, 7):
+            found = index.nearest(*point, k=k)
+            expected = brute_force(lat, lng, point)[:k]
+            assert [round(d, 6) for d, _ in found] == [round(d, 6) for d, _ in expected], point
+            assert all(math.isclose(found_d, distance(point, lat[node], lng[node]), abs_tol=1e-6)
+                       for found_d, node in found)
+
+
+def test_within_matches_brute_force(points):
+    lat, lng = points
+    index = AirportIndex(lat, lng)
+    for point in queries(2):
+        for radius in (50.0, 400.0, 3000.0):
+            found = index.within(*point, radius)
+            expected = [(d, i) for d, i in brute_force(lat, lng, point) if d <= radius]
+            # Ties at the radius may fall either way by rounding
+            assert {i for _, i in found} ^ {i for _, i in expected} <= \
+                {i for d, i in brute_force(lat, lng, point) if abs(d - radius) < 1e-6}
+            assert [d for d, _ in found] == sorted(d for d, _ in found)
+
+
+def test_empty_index():
+    index = AirportIndex([math.nan], [math.nan])
+    assert len(index) == 0 and index.nearest(10, 10, k=3) == [] and index.within(10, 10, 100) == []
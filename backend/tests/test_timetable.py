@@ -0,0 +1,139 @@
+"""Schedule times and the Connection Scan against a fixpoint over all connections."""
+import random
+
+import pytest
+
+from benchmarks.synthetic import generate_flights, generate_network
+from graph import Graph
+from timetable import SERVICE_DAYS, Timetable, earliest_arrival, format_time, parse_departure, parse_time
+
+
+def network_graph(network):
+    return Graph.from_routes(network["airports"], network["routes"])
+
+
+@pytest.mark.parametrize("value, minutes", [
+    (0, 0), (90, 90), (90.0, 90), ("00:00", 0), ("06:05", 365), (" 23:59 ", 1439), ("7:30", 450),
+    ("01:00+1", 1500), ("00:00+2", 2880),
+])
+def test_parse_time(value, minutes):
+    assert parse_time(value) == minutes
+
+
+@pytest.mark.parametrize("value", [
+    -1, float("inf"), float("nan"), True, "", "0630", "24:00", "12:60", "12:5", "ab:cd",
+    "12:30+", "12:30+x", "-1:30",
+])
+def test_parse_time_rejects(value):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_format_time_round_trips():
+    for minutes in range(0, 3 * 1440, 7):
+        assert parse_time(format_time(minutes)) == minutes
+    assert format_time(1440 + 65) == "01:05+1"
+
+
+def test_departures_beyond_the_schedule_are_rejected():
+    assert parse_departure("23:59+1") == 2 * 1440 - 1
+    assert parse_departure(2 * 1440 - 1) == 2 * 1440 - 1
+    for value in (f"10:00+{SERVICE_DAYS}", "10:00+3", SERVICE_DAYS * 1440):
+        with pytest.raises(ValueError, match=f"cover {SERVICE_DAYS} days"):
+            parse_departure(value)
+
+
+def test_bad_flight_time_names_the_flight():
+    graph = network_graph(generate_network(5, seed=1))
+    flight = {"flight": "AI101", "source": graph.ids[0], "target": graph.ids[1],
+              "departure": "25:00", "arrival": "02:00"}
+    with pytest.raises(ValueError, match="AI101"):
+        Timetable.from_flights(graph, [flight])
+
+
+def oracle_arrival(table, source, target, depart_after):
+    """Earliest arrival at ``target``, by relaxing every connection until nothing changes."""
+    previous_leg = {later: c for c, later in enumerate(table.next_leg) if later >= 0}
+    ready = {source: depart_after}
+    boarded = set()
+    changed = True
+    while changed:
+        changed = False
+        for c in range(len(table)):
+            u, v = table.source[c], table.target[c]
+            if c in boarded or not (ready.get(u, float("inf")) <= table.departure[c]
+                                    or previous_leg.get(c) in boarded):
+                continue
+            boarded.add(c)
+            changed = True
+            if v != target:
+                ready[v] = min(ready.get(v, float("inf")), table.arrival[c] + table.min_connection[v])
+    arrivals = [table.arrival[c] for c in boarded if table.target[c] == target]
+    return min(arrivals) if arrivals else None
+
+
+def check_journey(table, legs, source, target, depart_after):
+    assert table.source[legs[0]] == source and table.target[legs[-1]] == target
+    assert table.departure[legs[0]] >= depart_after
+    for a, b in zip(legs, legs[1:]):
+        node = table.target[a]
+        assert table.source[b] == node
+        if table.next_leg[a] != b:
+            assert table.departure[b] >= table.arrival[a] + table.min_connection[node]
+
+
+def chained_flights(network, seed):
+    """Generated flights with some legs joined into multi-leg flights under one number."""
+    flights = generate_flights(network, flights_per_route=2, seed=seed)
+    rng = random.Random(seed)
+    by_source = {}
+    for flight in flights:
+        by_source.setdefault(flight["source"], []).append(flight)
+    joined = set()
+    for flight in flights:
+        if rng.random() > 0.3 or id(flight) in joined:
+            continue
+        arrival = parse_time(flight["arrival"])
+        if arrival < parse_time(flight["departure"]):
+            continue
+        for onward in by_source.get(flight["target"], []):
+            departure = parse_time(onward["departure"])
+            if id(onward) not in joined and onward["target"] != flight["source"] and arrival <= departure:
+                onward["flight"] = flight["flight"]
+                joined.update((id(flight), id(onward)))
+                break
+    return flights
+
+
+def test_connection_scan_matches_oracle():
+    network = generate_network(15, seed=4)
+    graph = network_graph(network)
+    table = Timetable.from_flights(graph, chained_flights(network, seed=4),
+                                   connection_times={graph.ids[0]: 0, graph.ids[1]: 120})
+    rng = random.Random(4)
+    for _ in range(60):
+        source, target = rng.sample(range(len(graph)), 2)
+        depart_after = rng.randrange(0, 1440)
+        legs, _ = earliest_arrival(table, source, target, depart_after)
+        expected = oracle_arrival(table, source, target, depart_after)
+        if expected is None:
+            assert legs == []
+            continue
+        check_journey(table, legs, source, target, depart_after)
+        assert table.arrival[legs[-1]] == expected
+
+
+def test_staying_on_a_flight_needs_no_connection_time():
+    graph = network_graph(generate_network(5, seed=1))
+    a, b, c = graph.ids[:3]
+    flights = [
+        {"flight": "AI1", "source": a, "target": b, "departure": "08:00", "arrival": "09:00"},
+        {"flight": "AI1", "source": b, "target": c, "departure": "09:10", "arrival": "10:00"},
+        {"flight": "AI2", "source": a, "target": b, "departure": "08:05", "arrival": "09:00"},
+        {"flight": "AI3", "source": b, "target": c, "departure": "09:15", "arrival": "09:50"},
+    ]
+    table = Timetable.from_flights(graph, flights, min_connection=45)
+    legs, _ = earliest_arrival(table, 0, 2, parse_time("07:00"))
+    # AI3 arrives first but leaves only 15 minutes after the AI1 and AI2 landings
+    assert [table.flight_codes[table.flight[c]] for c in legs] == ["AI1", "AI1"]
+    assert table.arrival[legs[-1]] == parse_time("10:00")
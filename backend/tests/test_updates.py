@@ -0,0 +1,155 @@
+"""Live route updates: repaired route table rows and cache invalidation against a rebuild."""
+import os
+import random
+
+import pytest
+
+from conftest import close
+from graph import METRICS, route_via, shortest_path_tree
+import route_table
+from route_table import PatchedRouteTable, build_route_table
+from snapshot import load_snapshot
+from updates import apply_updates
+
+TOTALS = {"cost": 1, "distance": 2, "time": 3}
+
+
+@pytest.fixture
+def snapshot(data_file, tmp_path):
+    table_file = str(tmp_path / "route_table.bin")
+    build_route_table(data_file, table_file, workers=1)
+    snapshot = load_snapshot(data_file, route_table_file=table_file)
+    assert snapshot.route_table is not None
+    return snapshot
+
+
+def random_batch(snapshot, rng, size=6):
+    """Fare and distance changes, new routes and removals, with a few invalid updates."""
+    ids = snapshot.graph.ids
+    routes = snapshot.routes
+    batch = []
+    for _ in range(size):
+        roll = rng.random()
+        route = rng.choice(routes)
+        if roll < 0.5:
+            batch.append({"source": route["source"], "target": route["target"],
+                          "cost": route["cost"] * rng.uniform(0.3, 2.0),
+                          "distance": route["distance"] * rng.uniform(0.5, 1.5)})
+        elif roll < 0.75:
+            a, b = rng.sample(ids, 2)
+            batch.append({"op": "add", "source": a, "target": b,
+                          "cost": rng.uniform(500, 5000), "distance": rng.uniform(100, 1500)})
+        else:
+            batch.append({"op": "remove", "source": route["source"], "target": route["target"]})
+    return batch
+
+
+def cached_results(snapshot, rng, count=80):
+    """/find-path style results by cache key, searched on ``snapshot``."""
+    ids = snapshot.graph.ids
+    results = {}
+    for _ in range(count):
+        source, destination = rng.sample(ids, 2)
+        stops = tuple(rng.sample(ids, rng.randint(0, 1)))
+        metric = rng.choice(METRICS)
+        path, *totals, _ = route_via(snapshot.graph, [source, *stops, destination], metric)
+        results[(source, destination, stops, metric, "dijkstra")] = {
+            "path": path, "total_cost": totals[0], "total_distance": totals[1], "total_time": totals[2]}
+    return results
+
+
+def test_repaired_rows_match_rebuild(snapshot):
+    rng = random.Random(5)
+    for _ in range(8):
+        updated, changes = apply_updates(snapshot, random_batch(snapshot, rng))
+        if updated is None:
+            continue
+        snapshot = updated
+        graph = snapshot.graph
+        for metric in METRICS:
+            for source in range(len(graph)):
+                tree = shortest_path_tree(graph, source, metric)
+                dist, _ = snapshot.route_table.row(metric, source)
+                assert list(snapshot.route_table.column(metric, source)) == \
+                    [snapshot.route_table.row(metric, other)[0][source] for other in range(len(graph))]
+                for target in range(len(graph)):
+                    want = tree.dist[target] if tree.reached(target) else float("inf")
+                    assert close(dist[target], want) if want < float("inf") else dist[target] == want
+            for _ in range(20):
+                start, end = rng.sample(graph.ids, 2)
+                path, *totals = snapshot.route_table.lookup(graph, start, end, metric)
+                expected = route_via(graph, [start, end], metric)
+                assert bool(path) == bool(expected[0])
+                if path:
+                    assert close(totals[TOTALS[metric] - 1], expected[TOTALS[metric]])
+    assert snapshot.changes.total > 0
+
+
+def test_repaired_rows_are_folded_into_a_new_table_file(snapshot, monkeypatch):
+    n = len(snapshot.graph)
+    # Room for a few rows only
+    monkeypatch.setattr(route_table, "PATCHED_ROWS_BYTES", 5 * 12 * n)
+    rng = random.Random(7)
+    compactions = 0
+    for _ in range(12):
+        updated, _ = apply_updates(snapshot, random_batch(snapshot, rng))
+        if updated is None:
+            continue
+        snapshot = updated
+        table = snapshot.route_table
+        if isinstance(table, PatchedRouteTable):
+            assert len(table.rows) <= 5
+        else:
+            compactions += 1
+        for metric in METRICS:
+            for source in range(0, n, 5):
+                tree = shortest_path_tree(snapshot.graph, source, metric)
+                dist, _ = table.row(metric, source)
+                for target in range(n):
+                    want = tree.dist[target] if tree.reached(target) else float("inf")
+                    assert close(dist[target], want) if want < float("inf") else dist[target] == want
+            start, end = rng.sample(snapshot.graph.ids, 2)
+            path, *totals = table.lookup(snapshot.graph, start, end, metric)
+            expected = route_via(snapshot.graph, [start, end], metric)
+            assert bool(path) == bool(expected[0])
+            if path:
+                assert close(totals[TOTALS[metric] - 1], expected[TOTALS[metric]])
+    assert compactions > 0
+    # The copies are unlinked once mapped
+    assert not [name for name in os.listdir(os.path.dirname(table.path)) if ".live-" in name]
+
+
+def test_cache_keeps_only_results_the_changes_cannot_affect(snapshot):
+    rng = random.Random(6)
+    kept = 0
+    for _ in range(8):
+        results = cached_results(snapshot, rng)
+        updated, changes = apply_updates(snapshot, random_batch(snapshot, rng))
+        if updated is None:
+            continue
+        for key, value in results.items():
+            if changes.affects(key, value):
+                continue
+            kept += 1
+            source, destination, stops, metric, _ = key
+            fresh = route_via(updated.graph, [source, *stops, destination], metric)
+            assert bool(value["path"]) == bool(fresh[0]), key
+            assert close(value[f"total_{metric}"], fresh[TOTALS[metric]]), key
+        snapshot = updated
+    # Most results survive a small batch
+    assert kept > 0
+
+
+def test_rejected_updates_are_counted(snapshot):
+    route = snapshot.routes[0]
+    unknown = {"source": "???", "target": route["target"], "cost": 1}
+    missing = {"op": "remove", "source": route["source"], "target": route["source"]}
+    updated, changes = apply_updates(snapshot, [unknown, missing])
+    assert updated is None
+    assert (changes.applied, changes.rejected) == (0, 2)
+
+    updated, changes = apply_updates(snapshot, [unknown, {**route, "cost": route["cost"] + 1}])
+    assert updated is not None and updated.version != snapshot.version
+    assert (changes.applied, changes.rejected) == (1, 1)
+    # The original snapshot is never changed
+    assert snapshot.routes[0]["cost"] == route["cost"]
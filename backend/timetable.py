@@ -0,0 +1,328 @@
+"""Earliest-arrival routing over flight schedules with the Connection Scan Algorithm.
+
+Every scheduled flight leg is a connection: a departure from one airport and
+an arrival at the next. Connections are kept in parallel arrays sorted by
+departure time, and a query scans them once from the first departure at or
+after the requested time, so it needs neither a priority queue nor a
+time-expanded graph. The scan stops at the first departure later than the
+best arrival found at the destination.
+
+Times are minutes from midnight of the first service day. A daily schedule
+is repeated for ``SERVICE_DAYS`` days so evening departures can connect to
+the next morning's flights. Changing flights at an airport needs its minimum
+connection time; staying on the same flight (legs sharing a ``flight``
+number) does not.
+"""
+import bisect
+import logging
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 1440
+
+# Days a daily schedule is repeated for
+SERVICE_DAYS = 2
+
+# Minimum connection time in minutes at airports without their own value
+DEFAULT_MIN_CONNECTION = 45
+
+_UNREACHED = 2 ** 31 - 1
+
+
+def parse_time(value):
+    """Minutes since midnight of the first day, from minutes or an ``"HH:MM"`` string.
+
+    Hours run 0-23; a time on a later day carries a day offset, ``"HH:MM+N"``
+    as ``format_time`` writes it. Raises ValueError naming the bad value.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid time: {value!r}")
+    if isinstance(value, (int, float)):
+        if not 0 <= value < float("inf"):
+            raise ValueError(f"Invalid time {value!r}, minutes must be a non-negative number")
+        return int(value)
+    text, plus, days = str(value).strip().partition("+")
+    hours, separator, minutes = text.partition(":")
+    if (not separator or not hours.isdigit() or not minutes.isdigit() or len(minutes) != 2
+            or (plus and not days.isdigit())):
+        raise ValueError(f"Invalid time {value!r}, expected minutes, HH:MM or HH:MM+N")
+    if int(hours) > 23 or int(minutes) > 59:
+        raise ValueError(f"Invalid time {value!r}, hours must be 0-23 and minutes 0-59")
+    return (int(days) if plus else 0) * MINUTES_PER_DAY + int(hours) * 60 + int(minutes)
+
+
+def parse_departure(value, days=SERVICE_DAYS):
+    """``parse_time`` for a requested departure, which must fall within the timetable's ``days``.
+
+    Later departures would find no flights at all, so they raise ValueError
+    rather than quietly answering with no route.
+    """
+    minutes = parse_time(value)
+    if minutes >= days * MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time {value!r}, schedules only cover {days} days "
+                         f"(up to {format_time(days * MINUTES_PER_DAY - 1)})")
+    return minutes
+
+
+def format_time(minutes):
+    """``"HH:MM"``, with a ``+N`` suffix for times on a later day."""
+    days, minutes = divmod(minutes, MINUTES_PER_DAY)
+    text = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return f"{text}+{days}" if days else text
+
+
+class Timetable:
+    """Flight connections in parallel arrays sorted by departure time.
+
+    Airports share their indices with the route ``Graph``. ``next_leg[c]``
+    is the next connection of the same flight, or -1.
+    """
+
+    __slots__ = ("ids", "index", "departure", "arrival", "source", "target", "trip",
+                 "num_trips", "next_leg", "cost", "distance", "flight", "flight_codes", "min_connection")
+
+    def __len__(self):
+        return len(self.departure)
+
+    @classmethod
+    def from_flights(cls, graph, flights, connection_times=None,
+                     min_connection=DEFAULT_MIN_CONNECTION, days=SERVICE_DAYS):
+        """Build a timetable from flight records.
+
+        Each record has ``source``, ``target``, ``departure`` and ``arrival``
+        and optionally ``flight``, ``cost`` and ``distance``; cost and
+        distance default to those of the matching route. An arrival earlier
+        than its departure lands the next day. ``connection_times`` maps
+        airport IDs to their minimum connection time in minutes.
+        """
+        index = graph.index
+        legs = []
+        skipped = 0
+        for flight in flights:
+            u = index.get(flight["source"])
+            v = index.get(flight["target"])
+            if u is None or v is None or u == v:
+                skipped += 1
+                continue
+            try:
+                departure = parse_time(flight["departure"])
+                arrival = parse_time(flight["arrival"])
+            except ValueError as e:
+                raise ValueError(f"Flight {flight.get('flight') or ''} "
+                                 f"{flight['source']}->{flight['target']}: {e}")
+            if arrival < departure:
+                arrival += MINUTES_PER_DAY
+            edge = graph.edge_index(u, v)
+            cost = flight.get("cost", graph.weights["cost"][edge] if edge >= 0 else 0.0)
+            distance = flight.get("distance", graph.weights["distance"][edge] if edge >= 0 else 0.0)
+            legs.append((departure, arrival, u, v, flight.get("flight"), float(cost), float(distance)))
+        if skipped:
+            logger.warning(f"Skipped {skipped} flights with unknown or identical airports")
+
+        # Repeat the schedule for every service day; legs of one flight on one
+        # day form a trip, and legs without a flight number are trips of their own
+        codes = {}
+        trip_ids = {}
+        connections = []
+        for day in range(days):
+            shift = day * MINUTES_PER_DAY
+            for number, (departure, arrival, u, v, code, cost, distance) in enumerate(legs):
+                if code is None:
+                    trip = len(trip_ids)
+                    trip_ids[(None, day, number)] = trip
+                    code_index = -1
+                else:
+                    trip = trip_ids.setdefault((code, day), len(trip_ids))
+                    code_index = codes.setdefault(code, len(codes))
+                connections.append((departure + shift, arrival + shift, u, v, trip, cost, distance, code_index))
+        connections.sort()
+
+        table = cls()
+        table.ids = graph.ids
+        table.index = index
+        table.departure = array("i", (c[0] for c in connections))
+        table.arrival = array("i", (c[1] for c in connections))
+        table.source = array("i", (c[2] for c in connections))
+        table.target = array("i", (c[3] for c in connections))
+        table.trip = array("i", (c[4] for c in connections))
+        table.cost = array("d", (c[5] for c in connections))
+        table.distance = array("d", (c[6] for c in connections))
+        table.flight = array("i", (c[7] for c in connections))
+        table.flight_codes = list(codes)
+        table.num_trips = len(trip_ids)
+
+        table.next_leg = array("i", [-1]) * len(connections)
+        last_leg = {}
+        for c, trip in enumerate(table.trip):
+            previous = last_leg.get(trip)
+            if previous is not None:
+                table.next_leg[previous] = c
+            last_leg[trip] = c
+
+        table.min_connection = array("i", [min_connection]) * len(graph.ids)
+        for airport_id, minutes in (connection_times or {}).items():
+            node = index.get(airport_id)
+            if node is not None:
+                table.min_connection[node] = int(minutes)
+
+        logger.info(f"Timetable built with {len(table)} connections over {days} days")
+        return table
+
+    def nbytes(self):
+        arrays = [self.departure, self.arrival, self.source, self.target, self.trip,
+                  self.next_leg, self.cost, self.distance, self.flight, self.min_connection]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+class _TripScratch:
+    """Per-thread trip boarding marks, reset in O(1) by bumping a generation."""
+
+    def __init__(self, size):
+        self.size = size
+        self.generation = 0
+        self.stamp = [0] * size
+        self.board = [0] * size
+
+    def next_generation(self):
+        self.generation += 1
+        if self.generation >= 2 ** 32:
+            self.generation = 1
+            self.stamp = [0] * self.size
+        return self.generation
+
+
+_local = threading.local()
+
+
+def _get_scratch(table):
+    scratch = getattr(_local, "trips", None)
+    if scratch is None or scratch.size != table.num_trips:
+        scratch = _local.trips = _TripScratch(table.num_trips)
+    return scratch
+
+
+def earliest_arrival(table, source, target, depart_after):
+    """Connection Scan from node ``source`` leaving at or after ``depart_after``.
+
+    Returns ``(legs, scanned)`` where ``legs`` lists the connection indices
+    of the earliest-arriving journey to ``target`` (empty if there is none)
+    and ``scanned`` counts the connections examined.
+    """
+    arrival = table.arrival
+    targets = table.target
+    min_connection = table.min_connection
+
+    # Earliest time a flight can be boarded at each airport
+    ready = [_UNREACHED] * len(table.ids)
+    ready[source] = depart_after
+    # Connection where each reached trip was boarded, valid where stamped
+    scratch = _get_scratch(table)
+    gen = scratch.next_generation()
+    trip_stamp = scratch.stamp
+    trip_board = scratch.board
+    # Boarding and alighting connection of the best journey into each airport
+    entered = {}
+    best = _UNREACHED
+
+    departure = table.departure
+    position = bisect.bisect_left(departure, depart_after)
+    stop = len(departure)
+    scanned = 0
+    while position < stop:
+        # Scan up to the first departure at or after the best arrival so far;
+        # when that improves, restart with the tighter bound
+        improved = False
+        columns = zip(range(position, stop), memoryview(departure)[position:stop],
+                      memoryview(table.source)[position:stop], memoryview(table.trip)[position:stop])
+        for c, dep, u, trip in columns:
+            # Most connections leave airports not reached yet, so test that first
+            if ready[u] > dep:
+                if trip_stamp[trip] != gen:
+                    continue
+                board = trip_board[trip]
+            elif trip_stamp[trip] == gen:
+                board = trip_board[trip]
+            else:
+                trip_stamp[trip] = gen
+                trip_board[trip] = board = c
+
+            v = targets[c]
+            arr = arrival[c]
+            if v == target:
+                if arr < best:
+                    best = arr
+                    entered[v] = (board, c)
+                    improved = True
+                    break
+            elif arr + min_connection[v] < ready[v]:
+                ready[v] = arr + min_connection[v]
+                entered[v] = (board, c)
+        if not improved:
+            scanned += stop - position
+            break
+        scanned += c + 1 - position
+        position = c + 1
+        stop = min(stop, bisect.bisect_left(departure, best, position))
+
+    if best == _UNREACHED:
+        return [], scanned
+
+    # Walk back through the trips taken, expanding each into its legs
+    journey = []
+    node = target
+    while node != source:
+        board, alight = entered[node]
+        legs = [board]
+        while legs[-1] != alight:
+            legs.append(table.next_leg[legs[-1]])
+        journey.append(legs)
+        node = table.source[board]
+    journey.reverse()
+    return [c for legs in journey for c in legs], scanned
+
+
+def earliest_route(table, waypoints, depart_after):
+    """Earliest-arriving journey through airport IDs ``waypoints`` in order.
+
+    Returns ``(path, total_cost, total_distance, total_time, failed_leg,
+    scanned, legs)`` shaped like a ``shortest_route`` result, where
+    ``total_time`` is the door-to-door time in hours including layovers and
+    ``legs`` describes each flight taken.
+    """
+    index = table.index
+    ready = depart_after
+    connections = []
+    scanned = 0
+    for leg_source, leg_target in zip(waypoints, waypoints[1:]):
+        u, v = index[leg_source], index[leg_target]
+        if u == v:
+            continue
+        legs, searched = earliest_arrival(table, u, v, ready)
+        scanned += searched
+        if not legs:
+            return [], 0, 0, 0, (leg_source, leg_target), scanned, []
+        connections.extend(legs)
+        # Continuing from a requested stop is a change of flights
+        ready = table.arrival[legs[-1]] + table.min_connection[v]
+
+    if not connections:
+        return [waypoints[0]], 0, 0, 0, None, scanned, []
+
+    ids = table.ids
+    path = [ids[table.source[connections[0]]]] + [ids[table.target[c]] for c in connections]
+    legs = [
+        {
+            "flight": table.flight_codes[table.flight[c]] if table.flight[c] >= 0 else None,
+            "source": ids[table.source[c]],
+            "target": ids[table.target[c]],
+            "departure": format_time(table.departure[c]),
+            "arrival": format_time(table.arrival[c]),
+        }
+        for c in connections
+    ]
+    total_cost = sum(table.cost[c] for c in connections)
+    total_distance = sum(table.distance[c] for c in connections)
+    total_time = (table.arrival[connections[-1]] - table.departure[connections[0]]) / 60
+    return path, total_cost, total_distance, total_time, None, scanned, legs
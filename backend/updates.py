@@ -0,0 +1,489 @@
+"""Live route updates: fare and distance changes, added and removed routes.
+
+Updates are queued and applied in batches. Each batch builds a new snapshot
+from the current one without touching it: weight arrays of changed metrics
+are copied and patched, everything else is shared, and the CSR arrays are
+only rebuilt when routes are added or removed.
+
+Rows of the precomputed route table are single-source shortest path trees.
+Instead of recomputing them, each row affected by a batch is repaired in the
+manner of Ramalingam and Reps: nodes whose distance may grow are those below
+an increased edge in the shortest path DAG, and only they are re-derived,
+after which improvements spread from the decreased edges.
+
+``RouteChanges`` tells the result cache which cached results a batch made
+stale, so the rest survive the swap.
+
+On an undirected graph an update changes the route between two airports
+both ways; on a directed graph only the direction from ``source`` to
+``target``.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import threading
+import time
+from array import array
+
+from graph import (AVERAGE_SPEED_KMH, METRICS, Graph, connected_components, reverse_weights,
+                   strongly_connected_components)
+from snapshot import DataSnapshot
+
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ("set", "add", "remove")
+
+
+class UpdateQueueFull(Exception):
+    """Raised when too many route updates are waiting to be applied."""
+
+
+def _pair(a, b, directed=False):
+    """Key of the route from ``a`` to ``b``, shared by both directions unless ``directed``."""
+    return (a, b) if directed or a <= b else (b, a)
+
+
+def _weights(distance, cost):
+    """Edge weights by metric for a route, as ``Graph.from_routes`` derives them."""
+    return {"distance": distance, "cost": cost, "time": distance / AVERAGE_SPEED_KMH}
+
+
+class RouteChanges:
+    """What one batch of updates changed, relative to the snapshot ``base_version``.
+
+    ``pairs`` holds the ``_pair`` keys of the routes that changed, ``lowered`` the
+    metrics where some route got cheaper or was added and ``improved`` maps
+    each metric to the (source, target) pairs whose route table distance
+    changed, or is None without a route table.
+    """
+
+    __slots__ = ("base_version", "pairs", "lowered", "improved", "applied", "rejected",
+                 "rows_repaired", "total", "directed")
+
+    def __init__(self, base_version, pairs, lowered, improved, applied, rejected, rows_repaired, total,
+                 directed=False):
+        self.base_version = base_version
+        self.pairs = pairs
+        self.lowered = lowered
+        self.improved = improved
+        self.applied = applied
+        self.rejected = rejected
+        self.rows_repaired = rows_repaired
+        self.total = total
+        self.directed = directed
+
+    def affects(self, key, value):
+        """Whether the cached /find-path result ``value`` under ``key`` is stale."""
+        source, destination, stops, metric = key[:4]
+        if metric not in METRICS:
+            # Schedule-based results come from the timetable, which is unchanged
+            return False
+        path = value.get("path") or []
+        if any(_pair(a, b, self.directed) in self.pairs for a, b in zip(path, path[1:])):
+            return True
+        if metric not in self.lowered:
+            # Only cheaper or new routes can beat a path that avoids every change
+            return False
+        if self.improved is None:
+            return True
+        waypoints = [source, *stops, destination]
+        return any((a, b) in self.improved[metric] for a, b in zip(waypoints, waypoints[1:]))
+
+
+def _tight(du, weight, dv):
+    """Whether edge u -> v lies on a shortest path, allowing for rounding."""
+    return du != float("inf") and du + weight - dv <= 1e-9 * max(1.0, dv)
+
+
+def repair_row(old_graph, graph, metric, source, dist, hops, increased, decreased):
+    """Repair a single-source row of distances and first hops in place.
+
+    ``increased`` lists directed edges ``(u, v, old_weight)`` of ``old_graph``
+    that got dearer or were removed and ``decreased`` lists ``(u, v,
+    new_weight)`` edges of ``graph`` that got cheaper or were added. The
+    edges entering a node are read from the reverse adjacency, which for an
+    undirected graph is the forward one. Returns the nodes whose distance
+    changed.
+    """
+    inf = float("inf")
+    original = {}
+
+    # Nodes whose distance may grow: everything reachable over tight edges
+    # from the far end of an increased tight edge
+    old_offsets = old_graph.offsets
+    old_targets = old_graph.targets
+    old_weights = old_graph.weights[metric]
+    affected = set()
+    stack = [v for u, v, weight in increased if v != source and _tight(dist[u], weight, dist[v])]
+    while stack:
+        x = stack.pop()
+        if x in affected:
+            continue
+        affected.add(x)
+        dx = dist[x]
+        for e in range(old_offsets[x], old_offsets[x + 1]):
+            y = old_targets[e]
+            if y != source and y not in affected and _tight(dx, old_weights[e], dist[y]):
+                stack.append(y)
+
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights[metric]
+    for v in affected:
+        original[v] = dist[v]
+        dist[v] = inf
+        hops[v] = -1
+
+    # Affected nodes restart from their best unaffected predecessor
+    rev_offsets = graph.rev_offsets
+    rev_targets = graph.rev_targets
+    rev_weights = reverse_weights(graph, metric)
+    queue = []
+    for v in affected:
+        best = inf
+        hop = -1
+        for e in range(rev_offsets[v], rev_offsets[v + 1]):
+            u = rev_targets[e]
+            if u in affected:
+                continue
+            candidate = dist[u] + rev_weights[e]
+            if candidate < best:
+                best = candidate
+                hop = v if u == source else hops[u]
+        if best < inf:
+            dist[v] = best
+            hops[v] = hop
+            queue.append((best, v))
+
+    for u, v, weight in decreased:
+        candidate = dist[u] + weight
+        if candidate < dist[v]:
+            original.setdefault(v, dist[v])
+            dist[v] = candidate
+            hops[v] = v if u == source else hops[u]
+            queue.append((candidate, v))
+
+    # Spread the improvements like Dijkstra, relaxing only what gets shorter
+    heapq.heapify(queue)
+    while queue:
+        d, u = heapq.heappop(queue)
+        if d > dist[u]:
+            continue
+        for e in range(offsets[u], offsets[u + 1]):
+            v = targets[e]
+            candidate = d + weights[e]
+            if candidate < dist[v]:
+                original.setdefault(v, dist[v])
+                dist[v] = candidate
+                hops[v] = v if u == source else hops[u]
+                heapq.heappush(queue, (candidate, v))
+
+    return {v for v, before in original.items() if dist[v] != before}
+
+
+def _repair_table(table, old_graph, graph, metric, increased, decreased):
+    """Repaired route table rows for ``metric`` and the (source, target) pairs they changed.
+
+    Only rows with a changed edge on a shortest path, or that a cheaper edge
+    would shorten, are repaired. They are found from the table columns of the
+    changed edges' endpoints, so untouched rows are never read.
+    """
+    rows = {}
+    improved = set()
+    ids = graph.ids
+    sources = range(len(ids))
+    columns = {}
+
+    def column(node):
+        if node not in columns:
+            columns[node] = table.column(metric, node)
+        return columns[node]
+
+    # _tight and its converse inlined; an unreachable u fails both as inf - inf is nan
+    candidates = set()
+    for u, v, weight in increased:
+        candidates.update(s for s, du, dv in zip(sources, column(u), column(v))
+                          if du + weight - dv <= 1e-9 * max(1.0, dv))
+    for u, v, weight in decreased:
+        candidates.update(s for s, du, dv in zip(sources, column(u), column(v)) if du + weight < dv)
+
+    for source in sorted(candidates):
+        dist, hops = table.row(metric, source)
+        dist = array("d", dist)
+        hops = array("i", hops)
+        changed = repair_row(old_graph, graph, metric, source, dist, hops, increased, decreased)
+        rows[(metric, source)] = (dist, hops)
+        for target in changed:
+            improved.add((ids[source], ids[target]))
+            if not graph.directed:
+                improved.add((ids[target], ids[source]))
+    return rows, improved
+
+
+def apply_updates(snapshot, updates):
+    """Build a new snapshot with ``updates`` applied to ``snapshot``.
+
+    Each update is a dict with ``op`` (``set``, ``add`` or ``remove``),
+    ``source``, ``target`` and, for ``set`` and ``add``, ``cost`` and/or
+    ``distance``. Updates naming unknown airports or missing routes are
+    rejected. Returns ``(snapshot, changes)``: the new snapshot, or None if
+    nothing changed, and the batch's RouteChanges, which count the rejected
+    updates either way.
+    """
+    start = time.perf_counter()
+    graph = snapshot.graph
+    index = graph.index
+    directed = graph.directed
+
+    # Final weights of every pair touched, None for a removed route
+    final = {}
+    rejected = 0
+    for update in updates:
+        source, target = update["source"], update["target"]
+        if source not in index or target not in index or source == target:
+            rejected += 1
+            continue
+        pair = _pair(source, target, directed)
+        if pair in final:
+            current = final[pair]
+        else:
+            e = graph.edge_index(index[source], index[target])
+            current = (graph.weights["distance"][e], graph.weights["cost"][e]) if e >= 0 else None
+
+        op = update.get("op", "set")
+        if current is None and op != "add":
+            rejected += 1
+            continue
+        if op == "remove":
+            final[pair] = None
+            continue
+        # "add" on an existing route updates it like "set"
+        distance, cost = current if current is not None else (None, None)
+        if update.get("distance") is not None:
+            distance = update["distance"]
+        if update.get("cost") is not None:
+            cost = update["cost"]
+        if distance is None or cost is None:
+            rejected += 1
+            continue
+        final[pair] = (float(distance), float(cost))
+
+    # Directed edge changes per metric: (u, v, old weight) and (u, v, new weight)
+    increased = {metric: [] for metric in METRICS}
+    decreased = {metric: [] for metric in METRICS}
+    pairs = set()
+    topology_changed = False
+    for (a, b), new in final.items():
+        u, v = index[a], index[b]
+        e = graph.edge_index(u, v)
+        old = _weights(graph.weights["distance"][e], graph.weights["cost"][e]) if e >= 0 else None
+        new = _weights(*new) if new is not None else None
+        if old == new:
+            continue
+        pairs.add((a, b))
+        topology_changed |= old is None or new is None
+        for metric in METRICS:
+            before = old[metric] if old is not None else None
+            after = new[metric] if new is not None else None
+            if before == after:
+                continue
+            for x, y in ((u, v),) if directed else ((u, v), (v, u)):
+                if before is not None and (after is None or after > before):
+                    increased[metric].append((x, y, before))
+                if after is not None and (before is None or after < before):
+                    decreased[metric].append((x, y, after))
+    previous = snapshot.changes.total if snapshot.changes is not None else 0
+    if not pairs:
+        if rejected:
+            logger.warning(f"Rejected {rejected} route updates for unknown airports or routes")
+        return None, RouteChanges(snapshot.version, set(), set(), None, 0, rejected, 0, previous, directed)
+    changed_metrics = [metric for metric in METRICS if increased[metric] or decreased[metric]]
+
+    # Route records: changed ones are replaced, removed ones dropped
+    routes = []
+    for route in snapshot.routes:
+        pair = _pair(route["source"], route["target"], directed)
+        if pair not in pairs:
+            routes.append(route)
+        elif final[pair] is not None:
+            distance, cost = final[pair]
+            routes.append({**route, "distance": distance, "cost": cost})
+    existing = {_pair(route["source"], route["target"], directed) for route in routes}
+    for pair in pairs:
+        if final[pair] is not None and pair not in existing:
+            distance, cost = final[pair]
+            routes.append({"source": pair[0], "target": pair[1], "distance": distance,
+                           "cost": cost, "direct": True})
+
+    if topology_changed:
+        new_graph = Graph.from_routes(snapshot.airports, routes, directed=directed)
+    else:
+        # Same edges: share the CSR arrays and copy only the changed weights
+        weights = dict(graph.weights)
+        for metric in changed_metrics:
+            weights[metric] = array("d", graph.weights[metric])
+        for a, b in pairs:
+            u, v = index[a], index[b]
+            for metric, weight in _weights(*final[(a, b)]).items():
+                if metric in changed_metrics:
+                    weights[metric][graph.edge_index(u, v)] = weight
+                    if not directed:
+                        weights[metric][graph.edge_index(v, u)] = weight
+        new_graph = Graph(graph.ids, graph.offsets, graph.targets, weights, graph.lat, graph.lng,
+                          directed=directed, reverse=(graph.rev_offsets, graph.rev_targets, graph.rev_edges))
+        # Heuristics of untouched metrics still hold
+        for key, value in graph.derived.items():
+            if isinstance(key, tuple) and key[-1] in METRICS and key[-1] not in changed_metrics:
+                new_graph.derived[key] = value
+
+    # Airports and their coordinates are the same in the new graph
+    if "spatial" in graph.derived:
+        new_graph.derived["spatial"] = graph.derived["spatial"]
+    # Connectivity changes only with the edges; label the new ones before going live
+    if topology_changed:
+        connected_components(new_graph)
+        strongly_connected_components(new_graph)
+    else:
+        for key in ("components", "strong_components"):
+            if key in graph.derived:
+                new_graph.derived[key] = graph.derived[key]
+
+    route_table = snapshot.route_table
+    improved = None
+    rows_repaired = 0
+    if route_table is not None:
+        rows = {}
+        improved = {metric: set() for metric in METRICS}
+        for metric in changed_metrics:
+            metric_rows, improved[metric] = _repair_table(
+                route_table, graph, new_graph, metric, increased[metric], decreased[metric])
+            rows.update(metric_rows)
+        rows_repaired = len(rows)
+        route_table = route_table.patched(rows)
+
+    hierarchy = snapshot.hierarchy
+    stale_hierarchy = snapshot.stale_hierarchy
+    if hierarchy is not None:
+        # Hierarchies of changed metrics are stale; the others stay usable
+        kept = [] if topology_changed else [m for m in hierarchy.levels if m not in changed_metrics]
+        stale_hierarchy = stale_hierarchy | {m for m in hierarchy.levels if m not in kept}
+        hierarchy = hierarchy.restricted(kept)
+        if hierarchy is not None:
+            new_graph.derived["contraction"] = hierarchy
+
+    changes = RouteChanges(
+        base_version=snapshot.version,
+        pairs=pairs,
+        lowered={metric for metric in METRICS if decreased[metric]},
+        improved=improved,
+        applied=len(pairs),
+        rejected=rejected,
+        rows_repaired=rows_repaired,
+        total=previous + len(pairs),
+        directed=directed,
+    )
+    batch = json.dumps(sorted((pair, final[pair]) for pair in pairs))
+    version = hashlib.sha256(f"{snapshot.version}\n{batch}".encode("utf-8")).hexdigest()
+    updated = DataSnapshot(
+        snapshot.airports, routes, new_graph, version,
+        route_table=route_table,
+        timetable=snapshot.timetable,
+        hierarchy=hierarchy,
+        stale_hierarchy=stale_hierarchy,
+        changes=changes,
+        source_file=snapshot.source_file,
+        file_bytes=snapshot.file_bytes,
+        build_seconds=time.perf_counter() - start,
+    )
+    if "airports" in snapshot.payloads:
+        # Route updates never change the airport list
+        updated.payloads["airports"] = snapshot.payloads["airports"]
+    logger.info(f"Applied {len(pairs)} route changes ({rejected} rejected, {rows_repaired} table rows "
+                f"repaired) in {updated.build_seconds:.3f}s")
+    return updated, changes
+
+
+class RouteUpdater:
+    """Queues route updates and applies them in batches, one snapshot per batch.
+
+    Batching keeps the snapshot swaps, and the work done on every swap, to at
+    most one per ``interval`` seconds however fast updates arrive.
+    """
+
+    def __init__(self, holder, interval=1.0, max_pending=100000):
+        self.holder = holder
+        self.interval = interval
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.applied = 0
+        self.rejected = 0
+        self.batches = 0
+        self.last_batch = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, updates):
+        """Queue ``updates``; raises UpdateQueueFull past ``max_pending``."""
+        with self._lock:
+            if len(self._pending) + len(updates) > self.max_pending:
+                raise UpdateQueueFull(f"{len(self._pending)} route updates already queued")
+            self._pending.extend(updates)
+            self.submitted += len(updates)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="route-updates", daemon=True)
+                self._thread.start()
+            return len(self._pending)
+
+    def flush(self):
+        """Apply every queued update now; returns the batch's RouteChanges, or None if none were queued."""
+        with self._apply_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return None
+            # Changes of the last attempt, which a concurrent reload may have repeated
+            outcome = []
+
+            def build(current):
+                updated, changes = apply_updates(current, batch)
+                outcome.append(changes)
+                return updated
+
+            snapshot = self.holder.update(build)
+            changes = outcome[-1]
+            with self._lock:
+                self.batches += 1
+                self.applied += changes.applied
+                self.rejected += changes.rejected
+                self.last_batch = {
+                    "updates": len(batch),
+                    "applied": changes.applied,
+                    "rejected": changes.rejected,
+                    "rows_repaired": changes.rows_repaired,
+                    "build_seconds": snapshot.build_seconds if snapshot is not None else 0.0,
+                }
+            return changes
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error applying route updates, batch dropped: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "interval": self.interval,
+                "submitted": self.submitted,
+                "applied": self.applied,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "last_batch": self.last_batch,
+            }
@@ -38,6 +38,28 @@ export const getRoutes = () => {
   return fetchData('/routes');
 };
 
+/**
+ * Gets the airports nearest to a point
+ * @param {number} lat - Latitude
+ * @param {number} lng - Longitude
+ * @param {number} k - Number of airports to return
+ * @returns {Promise<Array>} Airports with their distance_km, nearest first
+ */
+export const getNearestAirports = (lat, lng, k = 5) => {
+  return fetchData(`/airports/nearest?lat=${lat}&lng=${lng}&k=${k}`);
+};
+
+/**
+ * Gets the airports within a radius of a point
+ * @param {number} lat - Latitude
+ * @param {number} lng - Longitude
+ * @param {number} radiusKm - Radius in kilometers
+ * @returns {Promise<Array>} Airports with their distance_km, nearest first
+ */
+export const getAirportsWithin = (lat, lng, radiusKm) => {
+  return fetchData(`/airports/within?lat=${lat}&lng=${lng}&radius_km=${radiusKm}`);
+};
+
 /**
  * Finds the shortest path between two airports
  * @param {string} sourceId - Source airport ID
@@ -64,5 +86,7 @@ export const findShortestPath = (sourceId, destId, metric = "cost", layoverId =
 export default {
   getAirports,
   getRoutes,
+  getNearestAirports,
+  getAirportsWithin,
   findShortestPath,
 };
\ No newline at end of file